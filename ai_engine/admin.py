@@ -1,3 +1,12 @@
 from django.contrib import admin
+from .models import TrackAnalysis, WaveformPeaks
 
-# Register your models here.
+@admin.register(TrackAnalysis)
+class TrackAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('id', 'track', 'bpm', 'duration_seconds', 'sr', 'updated_at')
+    search_fields = ('content_hash',)
+
+@admin.register(WaveformPeaks)
+class WaveformPeaksAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source_name', 'sr', 'samples', 'size_bytes', 'created_at')
+    search_fields = ('source_name',)
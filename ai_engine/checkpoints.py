@@ -0,0 +1,91 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# numpy is imported where used: web processes import this module (via tasks) to clean up
+CHECKPOINT_STAGES = ('analyze', 'denoise', 'stretch')
+
+
+def job_dir(root, job_id, key):
+    """Checkpoint directory of one job; keyed by the render's cache key so changed inputs never resume."""
+    return os.path.join(root, f'job-{job_id}-{key[:16]}')
+
+
+def discard(root, job_id):
+    for directory in glob.glob(os.path.join(root, f'job-{job_id}-*')):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def sweep(root, ttl_seconds):
+    """Remove checkpoints of jobs that haven't written one for ttl_seconds (killed and never retried)."""
+    cutoff = time.time() - ttl_seconds
+    for directory in glob.glob(os.path.join(root, 'job-*')):
+        try:
+            if os.stat(directory).st_mtime < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+class Checkpoints:
+    """Completed stage outputs of one job, so a retried job resumes after the last stage that finished.
+
+    Dicts are stored as JSON and arrays as .npy; the streaming renderer keeps its stretched
+    signal as raw float32 (.f32). Arrays load memory-mapped copy-on-write. Writes are
+    renamed into place, so a worker killed mid-write leaves no partial checkpoint.
+    """
+
+    def __init__(self, directory, stages=CHECKPOINT_STAGES):
+        self.directory = directory
+        self.stages = stages
+
+    def _path(self, stage, suffix):
+        return os.path.join(self.directory, f'{stage}{suffix}')
+
+    def load(self, stage):
+        """The stage's output, or None if it never completed."""
+        import numpy as np
+
+        path = self._path(stage, '.json')
+        if os.path.exists(path):
+            with open(path) as fh:
+                return json.load(fh)
+        path = self._path(stage, '.npy')
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='c')
+        path = self._path(stage, '.f32')
+        if os.path.exists(path):
+            return np.memmap(path, dtype=np.float32, mode='c')
+        return None
+
+    def save(self, stage, value):
+        import numpy as np
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.part', dir=self.directory)
+        try:
+            if isinstance(value, dict):
+                with os.fdopen(fd, 'w') as fh:
+                    json.dump(value, fh)
+                suffix = '.json'
+            else:
+                with os.fdopen(fd, 'wb') as fh:
+                    np.save(fh, np.asarray(value))
+                suffix = '.npy'
+            os.replace(tmp, self._path(stage, suffix))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def keep_spill(self, stage, spill):
+        """Checkpoint what a SpillBuffer holds, without copying it."""
+        if spill.length:
+            os.makedirs(self.directory, exist_ok=True)
+            spill.persist(self._path(stage, '.f32'))
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import librosa
+import noisereduce as nr
+from scipy.ndimage import convolve1d
+
+DENOISE_MODES = ('accurate', 'fast')
+DENOISE_EXECUTORS = ('threads', 'processes')
+
+# Chunk geometry is fixed, not per-worker configuration: it shapes the output, which must not
+# depend on how many jobs a worker runs. Each chunk is denoised with PAD of context on both
+# sides and crossfaded into its neighbours over FADE (which must stay within the context).
+DENOISE_CHUNK_SECONDS = 15.0
+DENOISE_PAD_SECONDS = 2.5
+DENOISE_FADE_SECONDS = 1.0
+
+# Stationary gate ('fast'), driven by an analysis noise profile (see AudioProcessor.estimate_noise_profile)
+GATE_N_FFT = 2048  # the profile's resolution
+GATE_HOP = 512
+GATE_MARGIN_DB = 10.0  # above the profile's 10th-percentile floor, roughly noisereduce's mean + 1.5 std
+GATE_SLOPE = 0.5  # per dB; soft knee around the threshold
+GATE_SMOOTH_HZ = 500
+GATE_SMOOTH_MS = 50
+
+
+def chunk_spans(n, sr):
+    """Core (start, stop) of each chunk: near-equal splits of about DENOISE_CHUNK_SECONDS."""
+    count = max(1, int(round(n / (DENOISE_CHUNK_SECONDS * sr))))
+    bounds = [n * i // count for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def smoothing_filters(sr):
+    """Normalised triangular kernels over GATE_SMOOTH_HZ (frequency) and GATE_SMOOTH_MS (time).
+
+    Applied one axis at a time: the same as convolving with their 2-D outer product, at a fraction of the cost.
+    """
+    n_freq = max(1, int(GATE_SMOOTH_HZ / (sr / GATE_N_FFT)))
+    n_time = max(1, int(GATE_SMOOTH_MS / 1000 * sr / GATE_HOP))
+    freq, time = np.bartlett(2 * n_freq + 1)[1:-1], np.bartlett(2 * n_time + 1)[1:-1]
+    return (freq / freq.sum()).astype(np.float32), (time / time.sum()).astype(np.float32)
+
+
+def gate_stationary(y, sr, strength, noise_profile):
+    """Spectral gate against a fixed per-bin threshold: one STFT, no per-bin time smoothing."""
+    spec = librosa.stft(y, n_fft=GATE_N_FFT, hop_length=GATE_HOP)
+    mag_db = librosa.amplitude_to_db(np.abs(spec), top_db=None)
+    thresh = np.asarray(noise_profile, dtype=np.float32)[:, None] + GATE_MARGIN_DB
+    mask = 1.0 / (1.0 + np.exp(-GATE_SLOPE * (mag_db - thresh)))
+    freq, time = smoothing_filters(sr)
+    mask = convolve1d(convolve1d(mask, freq, axis=0, mode='constant'), time, axis=1, mode='constant')
+    mask = (1.0 - strength * (1.0 - mask)).astype(np.float32, copy=False)  # keep the STFT complex64
+    return librosa.istft(spec * mask, hop_length=GATE_HOP, length=len(y)).astype(y.dtype, copy=False)
+
+
+def gate_nonstationary(y, sr, strength, noise_clip):
+    # chunk_size covers the whole input: chunking is done here, with overlap, not by noisereduce
+    return nr.reduce_noise(y=y, y_noise=noise_clip, sr=sr, prop_decrease=strength, stationary=False,
+                           chunk_size=max(len(y), 1))
+
+
+def denoise_chunk(y, sr, strength, mode, noise_clip, noise_profile):
+    if mode == 'fast':
+        return gate_stationary(y, sr, strength, noise_profile)
+    return gate_nonstationary(y, sr, strength, noise_clip)
+
+
+class DenoiseEngine:
+    """Spectral-gate denoiser that splits long signals into overlapping chunks and runs them in parallel.
+
+    'accurate' is noisereduce's non-stationary gate (the original behaviour); 'fast' gates
+    against a stored noise profile. Output depends only on the signal and mode, never on
+    `jobs` or the executor. Like the stage executor it is configured once per worker.
+    """
+
+    def __init__(self, jobs=1, executor='threads'):
+        self.jobs = jobs
+        self.executor = executor
+        self._pool = None
+
+    def configure(self, jobs=None, executor=None):
+        if executor is not None:
+            if executor not in DENOISE_EXECUTORS:
+                raise ValueError(f'Unknown denoise executor: {executor}')
+            self.executor = executor
+        if jobs is not None:
+            self.jobs = jobs or os.cpu_count() or 1
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def pool(self):
+        if self._pool is None:
+            if self.executor == 'processes' and not multiprocessing.current_process().daemon:
+                # spawn: forking from a stage thread while other threads run isn't safe
+                self._pool = ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                # daemonic processes (Celery prefork children) can't have children; FFTs release the GIL anyway
+                self._pool = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix='denoise')
+        return self._pool
+
+    def reduce_noise(self, y, sr, strength, mode='accurate', noise_clip=None, noise_profile=None):
+        if mode not in DENOISE_MODES:
+            raise ValueError(f'Unknown denoise mode: {mode}')
+        if mode == 'fast' and noise_profile is None:
+            raise ValueError("'fast' denoising needs a noise profile")
+        spans = chunk_spans(len(y), sr)
+        if len(spans) == 1:
+            return denoise_chunk(y, sr, strength, mode, noise_clip, noise_profile)
+
+        pad, half = int(DENOISE_PAD_SECONDS * sr), int(DENOISE_FADE_SECONDS * sr) // 2
+        windows = [(max(0, start - pad), min(len(y), stop + pad)) for start, stop in spans]
+        args = [(np.asarray(y[a:b]), sr, strength, mode, noise_clip, noise_profile) for a, b in windows]
+        if self.jobs > 1:
+            chunks = self.pool().map(denoise_chunk, *zip(*args))
+        else:
+            chunks = (denoise_chunk(*a) for a in args)
+
+        # Overlap-add with complementary linear ramps centred on each chunk boundary
+        out = np.zeros(len(y), dtype=np.float32)
+        ramp = (np.arange(2 * half, dtype=np.float32) + 0.5) / (2 * half)
+        for (start, stop), (a, _), chunk in zip(spans, windows, chunks):
+            lo = start - half if start else 0
+            hi = stop + half if stop < len(y) else len(y)
+            part = np.array(chunk[lo - a:hi - a], dtype=np.float32)
+            if start:
+                part[:2 * half] *= ramp
+            if stop < len(y):
+                part[-2 * half:] *= ramp[::-1]
+            out[lo:hi] += part
+        return out.astype(y.dtype, copy=False)
@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import uuid
+
+# numpy is imported where used: web processes read the index to build result-cache keys
+INDEX_NAME = 'index.json'
+SOURCE_BPM_RE = re.compile(r'_(\d+(?:\.\d+)?)bpm$', re.IGNORECASE)
+
+
+def variant_path(root, style, sr, bpm):
+    return os.path.join(root, style, str(int(sr)), f'{bpm:.2f}.npy')
+
+
+def variant_info(path):
+    """(sr, bpm) of a variant file: <root>/<style>/<sr>/<bpm>.npy."""
+    return int(os.path.basename(os.path.dirname(path))), float(os.path.basename(path)[:-len('.npy')])
+
+
+def is_variant(path):
+    return path.endswith('.npy')
+
+
+def source_bpm(path):
+    """Tempo from a source loop's name (house_124bpm.wav), or None."""
+    match = SOURCE_BPM_RE.search(os.path.splitext(os.path.basename(path))[0])
+    return float(match.group(1)) if match else None
+
+
+def bpm_grid(low, high, step_percent):
+    """Geometric BPM grid: neighbours are step_percent apart, so the worst residual is half that at any tempo."""
+    grid, bpm = [], float(low)
+    while bpm < high:
+        grid.append(round(bpm, 2))
+        bpm *= 1 + step_percent / 100
+    grid.append(round(float(high), 2))
+    return grid
+
+
+def read_index(root):
+    try:
+        with open(os.path.join(root, INDEX_NAME)) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def build_id(root):
+    """Identifies the current build, so renders with styled drums are re-rendered after a rebuild."""
+    index = read_index(root) if root else None
+    return index['build_id'] if index else 'none'
+
+
+def write_variant(root, style, sr, bpm, y):
+    import numpy as np
+
+    path = variant_path(root, style, sr, bpm)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.part', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as fh:
+        np.save(fh, np.ascontiguousarray(y, dtype=np.float32))
+    os.replace(tmp, path)  # workers mapping the old file keep reading it
+    return path
+
+
+def write_index(root, styles):
+    """`styles` is {style: {'source': name, 'source_bpm': bpm, 'variants': {sr: [bpm, ...]}}}."""
+    index = {'build_id': uuid.uuid4().hex[:12], 'styles': styles}
+    fd, tmp = tempfile.mkstemp(suffix='.part', dir=root)
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(index, fh, indent=1)
+    os.replace(tmp, os.path.join(root, INDEX_NAME))
+    return index
+
+
+class DrumBank:
+    """Per-style drum loops pre-rendered on a BPM grid by `manage.py build_drum_bank`.
+
+    Variants are float32 .npy files, memory-mapped when used. The index is re-read when it
+    changes on disk, so a rebuilt bank is picked up without restarting workers.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def configure(self, root=None):
+        if root is not None:
+            self.root = root or None  # '' disables the bank
+            self._index = self._mtime = None
+
+    def index(self):
+        if not self.root:
+            return None
+        try:
+            mtime = os.stat(os.path.join(self.root, INDEX_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if mtime != self._mtime:
+                self._index, self._mtime = read_index(self.root), mtime
+            return self._index
+
+    def styles(self):
+        index = self.index()
+        return sorted(index['styles']) if index else []
+
+    def nearest(self, style, sr, bpm=None):
+        """Path of the variant closest to `bpm` (the source tempo if None), preferring `sr`; None if not banked."""
+        index = self.index()
+        entry = index and index['styles'].get(style)
+        if not entry or not entry['variants']:
+            return None
+        rates = sorted(int(rate) for rate in entry['variants'])
+        # Same rate, else the lowest above it (downsampling keeps the full band), else the highest
+        variant_sr = next((rate for rate in rates if rate >= sr), rates[-1])
+        grid = entry['variants'][str(variant_sr)]
+        bpm = bpm or entry['source_bpm']
+        best = min(grid, key=lambda candidate: abs(candidate / bpm - 1))
+        return variant_path(self.root, style, variant_sr, best)
+
+    @staticmethod
+    def load(path):
+        """(y, sr, bpm) of a variant; y is a read-only memmap."""
+        import numpy as np
+
+        sr, bpm = variant_info(path)
+        return np.load(path, mmap_mode='r'), sr, bpm
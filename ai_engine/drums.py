@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class DrumLoopCache:
+    """Process-wide LRU of decoded, tempo-matched drum loops, ready to tile.
+
+    Keyed on (asset path, mtime, sr, target bpm, stretch engine) so replacing an asset on
+    disk invalidates its entries. `loader(sr, target_bpm, loop_path, engine)` does the actual
+    decode/beat-track/stretch and returns an array or None if the asset is missing.
+    """
+
+    def __init__(self, loader, max_entries=16, max_bytes=256 * 1024 * 1024):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(sr, target_bpm, loop_path, engine='phase_vocoder'):
+        try:
+            mtime = os.stat(loop_path).st_mtime_ns
+        except OSError:
+            return None
+        bpm = round(float(target_bpm), 2) if target_bpm else None
+        return os.path.abspath(loop_path), mtime, int(sr), bpm, engine
+
+    def get(self, sr, target_bpm, loop_path, engine='phase_vocoder'):
+        key = self.make_key(sr, target_bpm, loop_path, engine)
+        if key is None:
+            return None
+        with self._lock:
+            drum_y = self._entries.get(key)
+            if drum_y is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return drum_y
+            self.misses += 1
+
+        drum_y = self.loader(sr, target_bpm, loop_path, engine)
+        if drum_y is None:
+            return None
+        drum_y = np.ascontiguousarray(drum_y, dtype=np.float32)
+        drum_y.setflags(write=False)
+        self._store(key, drum_y)
+        return drum_y
+
+    def warm(self, specs, loop_path):
+        """Pre-render loops for an iterable of (sr, target_bpm) pairs."""
+        for sr, target_bpm in specs:
+            self.get(sr, target_bpm, loop_path)
+
+    def configure(self, max_entries=None, max_bytes=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, drum_y):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = drum_y
+            self._bytes += drum_y.nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.nbytes
+
+
+def parse_warm_specs(value):
+    """Parse 'sr:bpm,sr:bpm' (bpm may be empty for the loop's native tempo) into (sr, bpm) pairs."""
+    specs = []
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        sr, _, bpm = item.partition(':')
+        specs.append((int(sr), float(bpm) if bpm else None))
+    return specs
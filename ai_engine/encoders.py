@@ -0,0 +1,138 @@
+import os
+import shutil
+import subprocess
+import threading
+import numpy as np
+import soundfile as sf
+from pydub.utils import get_encoder_name
+from .params import SUPPORTED_FORMATS, normalize_format  # noqa: F401  (re-exported)
+
+ENCODE_CHUNK_FRAMES = 64 * 1024
+
+# export_format -> (ffmpeg muxer, codec); WAV is written by libsndfile directly
+FFMPEG_FORMATS = {
+    'mp3': ('mp3', 'libmp3lame'),
+    'ogg': ('ogg', 'libvorbis'),
+    'opus': ('opus', 'libopus'),
+}
+DEFAULT_BITRATES = {'mp3': '192k', 'opus': '128k'}  # Vorbis uses VBR quality instead
+VORBIS_QUALITY = '5'
+
+
+def _to_float32(y):
+    y = np.asarray(y)
+    if y.dtype == np.int16:
+        return y.astype(np.float32) / 32768.0
+    return y.astype(np.float32, copy=False)
+
+
+class PCMEncoder:
+    """Encodes mono PCM chunks straight into `target` (a path or a binary file-like object).
+
+    WAV goes through libsndfile; MP3/OGG/Opus are piped as raw float32 into ffmpeg's
+    stdin, so nothing is staged in an intermediate WAV and at most one chunk is held.
+    """
+
+    def __init__(self, target, sr, export_format='mp3', bitrate=None):
+        self.target = target
+        self.sr = int(sr)
+        self.export_format = normalize_format(export_format)
+        self.bitrate = bitrate or DEFAULT_BITRATES.get(self.export_format)
+        self.frames = 0
+        self._sf = None
+        self._proc = None
+        self._pump = None
+        self._pump_error = None
+        self._closed = False
+        if self.export_format == 'wav':
+            self._sf = sf.SoundFile(target, 'w', samplerate=self.sr, channels=1, subtype='PCM_16', format='WAV')
+        else:
+            self._start_ffmpeg()
+
+    def _start_ffmpeg(self):
+        muxer, codec = FFMPEG_FORMATS[self.export_format]
+        encoder = shutil.which(get_encoder_name()) or get_encoder_name()
+        to_path = isinstance(self.target, (str, os.PathLike))
+        cmd = [
+            encoder, '-y', '-loglevel', 'error',
+            '-f', 'f32le', '-ar', str(self.sr), '-ac', '1', '-i', 'pipe:0',
+            '-c:a', codec,
+            *(['-b:a', self.bitrate] if self.bitrate else ['-q:a', VORBIS_QUALITY]),
+            '-f', muxer,
+            os.fspath(self.target) if to_path else 'pipe:1',
+        ]
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL if to_path else subprocess.PIPE,
+        )
+        if not to_path:
+            self._pump = threading.Thread(target=self._copy_stdout, daemon=True)
+            self._pump.start()
+
+    def _copy_stdout(self):
+        try:
+            for chunk in iter(lambda: self._proc.stdout.read(ENCODE_CHUNK_FRAMES), b''):
+                self.target.write(chunk)
+        except Exception as e:  # surfaced from close()
+            self._pump_error = e
+
+    def write(self, y):
+        y = _to_float32(y)
+        for start in range(0, len(y), ENCODE_CHUNK_FRAMES):
+            chunk = y[start:start + ENCODE_CHUNK_FRAMES]
+            if self._sf is not None:
+                self._sf.write(chunk)
+            else:
+                try:
+                    self._proc.stdin.write(np.ascontiguousarray(chunk).tobytes())
+                except BrokenPipeError:
+                    raise RuntimeError(f'ffmpeg exited with status {self._proc.wait()} encoding {self.export_format}')
+            self.frames += len(chunk)
+
+    def close(self):
+        if self._closed:
+            return self.target
+        self._closed = True
+        if self._sf is not None:
+            self._sf.close()
+            return self.target
+        self._proc.stdin.close()
+        code = self._proc.wait()
+        if self._pump is not None:
+            self._pump.join()
+            self._proc.stdout.close()
+        if code != 0:
+            raise RuntimeError(f'ffmpeg exited with status {code} encoding {self.export_format}')
+        if self._pump_error is not None:
+            raise self._pump_error
+        return self.target
+
+    def abort(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._sf is not None:
+            self._sf.close()
+        else:
+            self._proc.kill()
+            self._proc.wait()
+            if self._pump is not None:
+                self._pump.join()
+                self._proc.stdout.close()
+        if isinstance(self.target, (str, os.PathLike)) and os.path.exists(self.target):
+            os.remove(self.target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def encode_pcm(y, sr, target, export_format='mp3', bitrate=None):
+    with PCMEncoder(target, sr, export_format, bitrate) as encoder:
+        encoder.write(y)
+    return target
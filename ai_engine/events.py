@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('ai_engine.events')
+
+TERMINAL_STATUSES = ('succeeded', 'failed')
+
+# Rough share of a render done once each stage starts; stages overlap, so progress only ever moves up
+STAGE_PROGRESS = {
+    'decode': 10, 'scan': 12, 'load': 15, 'analyze': 20, 'drum_loop': 25, 'denoise': 30, 'stretch': 55,
+    'spill': 70, 'drums': 75, 'encode': 85, 'peaks': 95,
+}
+
+# Job progress events, published by the worker as a job moves through its stages and read by
+# the /jobs/<id>/events/ stream, so watching a render costs one DB read rather than one per poll.
+# An event is {'job_id', 'status', 'progress', 'stage'?, 'message'?, 'result_url'?}; status is the
+# API status (queued/running/succeeded/failed). Backends keep each job's latest event, so a
+# subscriber starts from the current state, and coalesce: a slow reader skips to the newest.
+# `subscribe` is for WSGI streams (gevent workers) and `asubscribe` for ASGI ones, which wait on
+# the event loop instead of holding a worker each.
+
+
+class LocalBroker:
+    """In-process pub/sub: for tests, eager Celery and single-process dev servers."""
+
+    MAX_JOBS = 1000
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = OrderedDict()  # job id -> (sequence, event)
+        self._seq = 0
+
+    def publish(self, job_id, event):
+        with self._cond:
+            self._seq += 1
+            self._latest.pop(job_id, None)
+            self._latest[job_id] = (self._seq, event)
+            while len(self._latest) > self.MAX_JOBS:
+                self._latest.popitem(last=False)
+            self._cond.notify_all()
+
+    def latest(self, job_id):
+        with self._cond:
+            entry = self._latest.get(job_id)
+        return entry[1] if entry else None
+
+    def subscribe(self, job_id):
+        return LocalSubscription(self, job_id)
+
+    async def asubscribe(self, job_id):
+        return AsyncLocalSubscription(self.subscribe(job_id))
+
+
+class LocalSubscription:
+    def __init__(self, broker, job_id):
+        self.broker = broker
+        self.job_id = job_id
+        with broker._cond:
+            entry = broker._latest.get(job_id)
+            self._seen = entry[0] if entry else 0
+
+    def get(self, timeout):
+        """The next event, or None after `timeout` seconds without one."""
+        broker = self.broker
+
+        def newer():
+            entry = broker._latest.get(self.job_id)
+            return entry if entry and entry[0] > self._seen else None
+
+        with broker._cond:
+            entry = broker._cond.wait_for(newer, timeout)
+        if not entry:
+            return None
+        self._seen = entry[0]
+        return entry[1]
+
+    def close(self):
+        pass
+
+
+class AsyncLocalSubscription:
+    """A LocalSubscription for the event loop; it polls, which is fine for tests and dev servers."""
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+
+    async def latest(self):
+        return self.subscription.broker.latest(self.subscription.job_id)
+
+    async def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            event = self.subscription.get(0)
+            remaining = deadline - time.monotonic()
+            if event is not None or remaining <= 0:
+                return event
+            await asyncio.sleep(min(self.POLL_SECONDS, remaining))
+
+    async def close(self):
+        self.subscription.close()
+
+
+class RedisBroker:
+    """Redis pub/sub on one channel per job; the latest event is also stored (for LATEST_TTL seconds)."""
+
+    LATEST_TTL = 24 * 3600
+
+    def __init__(self, url=None, prefix='ai_engine:job'):
+        import redis
+
+        self.url = url or settings.AI_ENGINE_EVENTS_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.prefix = prefix
+
+    def channel(self, job_id):
+        return f'{self.prefix}:{job_id}'
+
+    def publish(self, job_id, event):
+        data = json.dumps(event)
+        pipe = self.client.pipeline()
+        pipe.set(f'{self.channel(job_id)}:latest', data, ex=self.LATEST_TTL)
+        pipe.publish(self.channel(job_id), data)
+        pipe.execute()
+
+    def latest(self, job_id):
+        data = self.client.get(f'{self.channel(job_id)}:latest')
+        return json.loads(data) if data else None
+
+    def subscribe(self, job_id):
+        return RedisSubscription(self.client, self.channel(job_id))
+
+    async def asubscribe(self, job_id):
+        subscription = AsyncRedisSubscription(self.url, self.channel(job_id))
+        try:
+            await subscription.pubsub.subscribe(subscription.channel)
+        except Exception:
+            await subscription.close()
+            raise
+        return subscription
+
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class AsyncRedisSubscription:
+    """RedisSubscription on redis.asyncio, with a client of its own (asyncio connections belong to one loop)."""
+
+    def __init__(self, url, channel):
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.channel = channel
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+
+    async def latest(self):
+        data = await self.client.get(f'{self.channel}:latest')
+        return json.loads(data) if data else None
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+@lru_cache(maxsize=None)
+def broker():
+    """The AI_ENGINE_EVENTS_BACKEND instance (a dotted class path), built once per process."""
+    return import_string(settings.AI_ENGINE_EVENTS_BACKEND)()
+
+
+def job_event(job, **extra):
+    """The event describing a job's current state, as stored in the DB."""
+    event = {'job_id': job.id, 'status': job.api_status, 'progress': job.progress}
+    if job.api_status in TERMINAL_STATUSES:
+        event['message'] = job.last_message
+    if job.api_status == 'succeeded' and job.output_file:
+        event['result_url'] = job.output_file.url
+    event.update(extra)
+    return event
+
+
+def publish(job_id, event):
+    """Publish one event; like metrics, a failing backend never fails the job."""
+    try:
+        broker().publish(job_id, event)
+    except Exception:
+        logger.warning('Could not publish event for job %s', job_id, exc_info=True)
+
+
+def publish_job(job, **extra):
+    publish(job.id, job_event(job, **extra))
+
+
+class JobProgress:
+    """StageTimer listener that publishes a running job's progress as its render enters each stage."""
+
+    def __init__(self, job):
+        self.job = job
+        self.progress = job.progress
+        self._lock = threading.Lock()
+
+    def __call__(self, stage):
+        with self._lock:
+            progress = STAGE_PROGRESS.get(stage, self.progress)
+            if progress <= self.progress:
+                return  # streaming renders re-enter stages block after block
+            self.progress = progress
+        publish(self.job.id, {'job_id': self.job.id, 'status': 'running', 'progress': progress, 'stage': stage})
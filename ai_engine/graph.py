@@ -0,0 +1,116 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+STAGE_MODES = ('serial', 'threads')
+
+
+class StageGraph:
+    """A small DAG of named pipeline stages.
+
+    `add(name, fn, after=(...))` registers fn, which is called with the results of the
+    stages named in `after`, in that order. Stages must be added after their dependencies,
+    so insertion order is always a valid serial schedule.
+
+    With `checkpoints` (see checkpoints.Checkpoints), the outputs of its stages are saved as
+    they complete, and a stage whose checkpoint exists is restored instead of run.
+    """
+
+    def __init__(self, timer=None, checkpoints=None):
+        self.timer = timer
+        self.checkpoints = checkpoints
+        self._stages = {}
+        self._results = {}
+
+    def add(self, name, fn, after=()):
+        missing = [dep for dep in after if dep not in self._stages and dep not in self._results]
+        if missing:
+            raise ValueError(f'Stage {name!r} depends on unknown stages {missing}')
+        if self._checkpointed(name):
+            restored = self.checkpoints.load(name)
+            if restored is not None:
+                self._results[name] = restored
+                return
+        self._stages[name] = (fn, tuple(after))
+
+    def provide(self, name, value):
+        """Register an already-known result (e.g. a stored analysis) under a stage name."""
+        self._results[name] = value
+
+    def _checkpointed(self, name):
+        return self.checkpoints is not None and name in self.checkpoints.stages
+
+    def _call(self, name):
+        fn, after = self._stages[name]
+        args = [self._results[dep] for dep in after]
+        with self.timer.stage(name) if self.timer else nullcontext():
+            result = fn(*args)
+        if self._checkpointed(name):
+            with self.timer.stage('checkpoint') if self.timer else nullcontext():
+                self.checkpoints.save(name, result)
+        return result
+
+    def _needed(self, targets):
+        """Stages that must run to produce `targets`; dependencies already known (e.g. restored) cut the walk."""
+        if targets is None:
+            return dict(self._stages)
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name in needed or name in self._results:
+                continue
+            needed.add(name)
+            stack.extend(self._stages[name][1])
+        return {name: stage for name, stage in self._stages.items() if name in needed}
+
+    def run(self, mode='serial', max_workers=None, targets=None):
+        """Run the stages and return {name: result}.
+
+        'serial' runs in insertion order on the calling thread. 'threads' starts each
+        stage as soon as its dependencies finish; numpy/FFT/resampling work releases the
+        GIL, so independent stages overlap. Results are identical in both modes. With
+        `targets`, only the stages those results depend on run.
+        """
+        if mode not in STAGE_MODES:
+            raise ValueError(f'Unknown stage mode: {mode}')
+        stages = self._needed(targets)
+        if mode == 'serial' or len(stages) < 2:
+            for name in stages:
+                self._results[name] = self._call(name)
+            return self._results
+
+        pending = stages
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage') as pool:
+            while pending or running:
+                for name in [n for n, (_, after) in pending.items() if all(d in self._results for d in after)]:
+                    del pending[name]
+                    running[pool.submit(self._call, name)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self._results[name] = future.result()
+                    except BaseException:
+                        for other in running:
+                            other.cancel()
+                        raise
+        return self._results
+
+
+class StageExecutor:
+    """Process-wide choice of how StageGraphs run; configured per worker like the drum cache."""
+
+    def __init__(self, mode='threads', max_workers=2):
+        self.mode = mode
+        self.max_workers = max_workers
+
+    def configure(self, mode=None, max_workers=None):
+        if mode is not None:
+            if mode not in STAGE_MODES:
+                raise ValueError(f'Unknown stage mode: {mode}')
+            self.mode = mode
+        if max_workers is not None:
+            self.max_workers = max_workers
+
+    def run(self, graph, targets=None):
+        return graph.run(self.mode, self.max_workers, targets)
@@ -0,0 +1,28 @@
+import hashlib
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file):
+    """Hex SHA-256 of a Django File/FieldFile, read in chunks."""
+    digest = hashlib.sha256()
+    file.open('rb')
+    try:
+        for chunk in file.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    finally:
+        file.close()
+    return digest.hexdigest()
+
+
+def track_content_hash(track):
+    """SHA-256 of track.original_file, hashed once and then kept on the track.
+
+    Reads the whole upload on a miss, so call it from workers, not web requests.
+    """
+    if not track.content_hash:
+        track.content_hash = file_sha256(track.original_file)
+        # Unless the upload was replaced meanwhile
+        type(track).objects.filter(pk=track.pk, original_file=track.original_file.name).update(
+            content_hash=track.content_hash)
+    return track.content_hash
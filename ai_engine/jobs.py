@@ -0,0 +1,218 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from django.core.files import File as DjangoFile
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from music.models import JobEvent, ProcessingJob, Track
+from . import events, results, waveforms
+from .hashing import track_content_hash
+from .models import TrackAnalysis
+from .params import ProcessParams, normalize_format
+
+
+@dataclass
+class JobPlan:
+    """Everything needed to render one job, resolved from the DB up front."""
+    job: ProcessingJob
+    params: ProcessParams
+    content_hash: str
+    cache_key: str
+    analysis: TrackAnalysis | None
+    output_name: str
+
+    @property
+    def input_path(self):
+        return self.job.track.original_file.path
+
+    @property
+    def analysis_dict(self):
+        return self.analysis.as_dict() if self.analysis else None
+
+
+def plan_job(job):
+    params = ProcessParams(**job.params)
+    content_hash = track_content_hash(job.track)
+    cache_key = results.cache_key_for(params, content_hash)
+    return JobPlan(
+        job=job,
+        params=params,
+        content_hash=content_hash,
+        cache_key=cache_key,
+        analysis=TrackAnalysis.lookup(job.track, content_hash, params.tempo_mode, params.analysis_sr),
+        output_name=results.result_name(cache_key, normalize_format(params.export_format)),
+    )
+
+
+def record_render(plan, meta):
+    """Persist what a finished render learned: the track analysis, the result-cache entry, peaks and any profile."""
+    peak_data = meta.pop('peaks', None)
+    if peak_data:
+        waveforms.store(plan.job.output_file.name, peak_data)
+    stats = meta.pop('profile_stats', None)
+    if stats:
+        plan.job.profile_file.save(f'{plan.job.id}.prof', ContentFile(stats), save=False)
+    if plan.analysis is None and meta.get('analysis'):
+        TrackAnalysis.store(plan.job.track, plan.content_hash, meta['analysis'])
+    results.store(plan.cache_key, plan.content_hash, plan.params, plan.job.output_file.name, meta)
+
+
+def _local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def stage_path(storage, name):
+    """Scratch file to render into; on local storage it sits next to the final name so publishing is a rename."""
+    path = _local_path(storage, name)
+    directory = None
+    if path is not None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+    fd, staged = tempfile.mkstemp(suffix='.part', dir=directory)
+    os.close(fd)
+    return staged
+
+
+def publish_output(job, name, staged):
+    """Move a finished staged render into storage as job.output_file (not saved)."""
+    storage = job.output_file.storage
+    path = _local_path(storage, name)
+    if path is not None:
+        os.replace(staged, path)
+        job.output_file.name = name
+    else:
+        with open(staged, 'rb') as fh:
+            job.output_file.name = storage.save(name, DjangoFile(fh))
+        os.remove(staged)
+
+
+@contextmanager
+def open_job_output(job, name):
+    """Yield a binary file that becomes job.output_file under `name`.
+
+    Writes go to a staged file that is renamed into place, so concurrent renders
+    of the same cache key never expose a partial file.
+    """
+    staged = stage_path(job.output_file.storage, name)
+    try:
+        with open(staged, 'wb') as fh:
+            yield fh
+        publish_output(job, name, staged)
+    except BaseException:
+        if os.path.exists(staged):
+            os.remove(staged)
+        raise
+    job.save(update_fields=['output_file'])
+
+
+class JobEventLog:
+    """Buffers JobEvent rows and inserts them with bulk_create every `flush_every` events (0 = only on flush).
+
+    Each event is a new row, so a log line costs the same however long the job's log already is.
+    """
+
+    def __init__(self, flush_every=100):
+        self.flush_every = flush_every
+        self._events = []
+        self._lock = threading.Lock()  # stages may run on the render's worker threads
+
+    def add(self, job, message, level=JobEvent.Level.INFO, stage='', metrics=None):
+        with self._lock:
+            self._events.append(JobEvent(job=job, message=str(message), level=level, stage=stage, metrics=metrics or {}))
+            full = self.flush_every and len(self._events) >= self.flush_every
+        if full:
+            self.flush()
+
+    def add_status(self, job, level=JobEvent.Level.INFO, metrics=None):
+        """The job's last_message as an event (see ProcessingJob.set_message)."""
+        self.add(job, job.last_message, level=level, metrics=metrics)
+
+    def add_timings(self, job):
+        """One event per pipeline stage of a finished render, with its timings as metrics."""
+        for entry in job.timings:
+            metrics = {name: value for name, value in entry.items() if name != 'stage'}
+            self.add(job, f"{entry['stage']}: {entry['wall_seconds']:.2f}s", stage=entry['stage'], metrics=metrics)
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if events:
+            JobEvent.objects.bulk_create(events)
+
+
+class JobStageLog:
+    """StageTimer listener that logs a render's first entry into each stage and writes it at once,
+    so a job's /log/ follows it stage by stage rather than filling in when it ends.
+
+    `then(stage)`, if given, is called too (e.g. events.JobProgress).
+    """
+
+    def __init__(self, job, log, then=None):
+        self.job = job
+        self.log = log
+        self.then = then
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._thread = threading.get_ident()
+
+    def __call__(self, stage):
+        with self._lock:
+            first = stage not in self._seen  # streaming renders re-enter stages block after block
+            self._seen.add(stage)
+        if first:
+            self.log.add(self.job, f'{stage} started', stage=stage)
+            self.log.flush()
+            if threading.get_ident() != self._thread:
+                connection.close()  # stage threads are pooled; don't leave a connection open in each
+        if self.then is not None:
+            self.then(stage)
+
+
+class JobStateBuffer:
+    """Collects finished/failed jobs and writes them with bulk_update every `flush_every` jobs."""
+
+    def __init__(self, flush_every=20):
+        self.flush_every = flush_every
+        self._done = []
+        self._failed = []
+        self.log = JobEventLog(flush_every=0)  # written with the job states
+
+    def done(self, job, meta, message='Processing completed successfully.'):
+        job.apply_done(meta, message)
+        self.log.add_timings(job)
+        self.log.add_status(job)
+        self._done.append(job)
+        self._maybe_flush()
+
+    def failed(self, job, error):
+        job.apply_failed(error)
+        self.log.add_status(job, level=JobEvent.Level.ERROR)
+        self._failed.append(job)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._done) + len(self._failed) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        done, failed = self._done, self._failed
+        self._done, self._failed = [], []
+        with transaction.atomic():
+            if done:
+                ProcessingJob.objects.bulk_update(done, ProcessingJob.DONE_FIELDS)
+                tracks = [job.track for job in done if not job.is_preview]
+                if tracks:
+                    Track.objects.bulk_update(tracks, ProcessingJob.TRACK_DONE_FIELDS)
+            if failed:
+                ProcessingJob.objects.bulk_update(failed, ProcessingJob.FAILED_FIELDS)
+                tracks = [job.track for job in failed if not job.is_preview]
+                if tracks:
+                    Track.objects.bulk_update(tracks, ['status'])
+            self.log.flush()
+        for job in done + failed:
+            events.publish_job(job)
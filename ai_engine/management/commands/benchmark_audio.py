@@ -0,0 +1,359 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from ai_engine.tests.fixtures import (
+    DENOISE_AGREEMENT_DB, DENOISE_FAST_MAX_LOSS_DB, MIXER_AGREEMENT_DB, OCTAVE_FACTORS,
+    noisy_fixture, snr_db, synth_groove, tempo_agrees, tiled_mix,
+)
+
+TEMPO_CORPUS_BPMS = (72, 85, 90, 98, 105, 110, 118, 124, 128, 135, 140, 150, 160, 174)
+
+NOISE_FIXTURES = ('white', 'hum', 'swell')
+
+STRETCH_TARGET_BPMS = (96, 114, 120.2, 126, 150)  # from a 120 bpm groove; 120.2 is within the skip tolerance
+
+# Drum mixing may allocate the output plus this much (the loop table, some slack) at peak
+MIXER_MAX_EXTRA_BYTES = 4 * 1024 * 1024
+
+# Fixture length per suite when --seconds isn't given
+SUITE_SECONDS = {'stretch': 240.0, 'mixer': 900.0}
+DEFAULT_SECONDS = 30.0
+
+# Web processes must boot without these; only Celery workers load the audio engine
+HEAVY_MODULES = ('numpy', 'scipy', 'numba', 'librosa', 'noisereduce', 'pydub', 'soundfile')
+WEB_BOOT_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import backend.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns  # what the first request would import
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': sorted(m for m in %r if m in sys.modules),
+}))
+''' % (HEAVY_MODULES,)
+
+
+def traced(fn, *args, **kwargs):
+    """(result, seconds, peak bytes allocated while fn ran)."""
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        return result, elapsed, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def first_jobs(path, warm, jobs=2):
+    """Run in a fresh interpreter: import time, optional warm-up, then latency of successive renders."""
+    start = time.perf_counter()
+    from ai_engine.params import ProcessParams
+    from ai_engine.services import AudioProcessor
+    from ai_engine.warmup import warm_audio_stack
+    imported = time.perf_counter() - start
+
+    warmup = 0.0
+    if warm:
+        start = time.perf_counter()
+        warm_audio_stack()
+        warmup = time.perf_counter() - start
+
+    params = ProcessParams(target_bpm=126, export_format='wav', streaming=False)
+    latencies = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        with tempfile.TemporaryFile() as out:
+            AudioProcessor.process(path, out, params)
+        latencies.append(time.perf_counter() - start)
+    return imported, warmup, latencies
+
+
+class Command(BaseCommand):
+    help = 'Benchmark audio engine stages on synthetic fixtures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=['tempo', 'warmup', 'webimport', 'stages', 'denoise', 'analysis',
+                                                  'stretch', 'mixer'])
+        parser.add_argument('--seconds', type=float, help='Fixture length in seconds (default: 240 for stretch, '
+                                                          '900 for mixer, else 30).')
+        parser.add_argument('--sr', type=int, default=44100)
+        parser.add_argument('--rounds', type=int, default=3, help='Fresh processes per variant (warmup, webimport); '
+                                                                     'repetitions per mode (stages).')
+        parser.add_argument('--max-rss-mb', type=float, help='Fail webimport if peak RSS exceeds this.')
+        parser.add_argument('--jobs', type=int, default=0, help='Parallel denoise chunks (denoise); 0 = one per core.')
+        parser.add_argument('--executor', choices=['threads', 'processes'], default='threads')
+        parser.add_argument('--analysis-sr', type=int, default=22050, help='Analysis rate to compare with native (analysis).')
+
+    def handle(self, *args, **options):
+        options['seconds'] = options['seconds'] or SUITE_SECONDS.get(options['suite'], DEFAULT_SECONDS)
+        getattr(self, f"bench_{options['suite']}")(options)
+
+    def bench_tempo(self, options):
+        """Agreement and speed of estimate_bpm's 'fast' mode against 'accurate' (beat_track)."""
+        from ai_engine.services import AudioProcessor
+
+        AudioProcessor.estimate_bpm(*synth_groove(120, options['sr'], 5.0), mode='accurate')  # JIT warm-up
+        AudioProcessor.estimate_bpm(*synth_groove(120, options['sr'], 5.0), mode='fast')
+        self.stdout.write(f"{'true':>6} {'accurate':>9} {'fast':>9} {'t_acc':>7} {'t_fast':>7}  agree")
+        strict = octave = 0
+        totals = {'accurate': 0.0, 'fast': 0.0}
+        for bpm in TEMPO_CORPUS_BPMS:
+            y, sr = synth_groove(bpm, options['sr'], options['seconds'], seed=bpm)
+            result = {}
+            for mode in totals:
+                start = time.perf_counter()
+                result[mode] = AudioProcessor.estimate_bpm(y, sr, mode=mode)
+                totals[mode] += time.perf_counter() - start
+            same = tempo_agrees(result['fast'], result['accurate'])
+            same_octave = tempo_agrees(result['fast'], result['accurate'], OCTAVE_FACTORS)
+            strict += same
+            octave += same_octave
+            self.stdout.write(
+                f"{bpm:>6} {result['accurate']:>9.2f} {result['fast']:>9.2f} "
+                f"{totals['accurate']:>7.2f} {totals['fast']:>7.2f}  "
+                f"{'yes' if same else 'octave' if same_octave else 'NO'}"
+            )
+        n = len(TEMPO_CORPUS_BPMS)
+        speedup = totals['accurate'] / totals['fast'] if totals['fast'] else float('inf')
+        self.stdout.write(
+            f'agreement {strict}/{n} exact, {octave}/{n} up to octave; fast mode {speedup:.1f}x faster')
+        if octave < n:
+            raise CommandError('fast and accurate tempo estimates disagree beyond octave errors')
+
+    def bench_warmup(self, options):
+        """First-job latency of a freshly started worker process, with and without warm_audio_stack at boot."""
+        import soundfile as sf
+
+        y, sr = synth_groove(120, options['sr'], options['seconds'])
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        sf.write(path, y, sr)
+        try:
+            self.stdout.write(f"{'variant':>8} {'import':>7} {'warmup':>7} {'job 1':>7} {'job 2':>7}")
+            first = {}
+            for warm in (False, True):
+                variant = 'warm' if warm else 'cold'
+                first[variant] = []
+                for _ in range(options['rounds']):
+                    # spawn, not fork: the child must start with nothing imported or compiled
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                        imported, warmup, (job1, job2) = pool.submit(first_jobs, path, warm).result()
+                    first[variant].append(job1)
+                    self.stdout.write(f'{variant:>8} {imported:>7.2f} {warmup:>7.2f} {job1:>7.2f} {job2:>7.2f}')
+        finally:
+            os.remove(path)
+        cold, warm = np.median(first['cold']), np.median(first['warm'])
+        self.stdout.write(f'median first-job latency: cold {cold:.2f}s, warm {warm:.2f}s ({cold / warm:.1f}x)')
+
+    def bench_webimport(self, options):
+        """Boot time and peak RSS of `backend.wsgi` plus URLconf in a fresh interpreter; fails if audio modules load."""
+        runs = []
+        for _ in range(options['rounds']):
+            proc = subprocess.run([sys.executable, '-c', WEB_BOOT_SCRIPT], capture_output=True, text=True,
+                                  cwd=os.getcwd(), env=os.environ.copy())
+            if proc.returncode:
+                raise CommandError(proc.stderr.strip().splitlines()[-1])
+            run = json.loads(proc.stdout.strip().splitlines()[-1])
+            runs.append(run)
+            self.stdout.write(f"boot {run['seconds']:.2f}s  peak RSS {run['rss_mb']:.0f} MB  "
+                              f"heavy modules: {', '.join(run['heavy']) or 'none'}")
+        seconds = np.median([run['seconds'] for run in runs])
+        rss = max(run['rss_mb'] for run in runs)
+        self.stdout.write(f'median boot {seconds:.2f}s, peak RSS {rss:.0f} MB')
+        heavy = sorted({m for run in runs for m in run['heavy']})
+        if heavy:
+            raise CommandError(f"web boot imported {', '.join(heavy)}")
+        if options['max_rss_mb'] and rss > options['max_rss_mb']:
+            raise CommandError(f"web boot peak RSS {rss:.0f} MB exceeds {options['max_rss_mb']:.0f} MB")
+
+    def bench_stages(self, options):
+        """Whole-track render wall time with the stage graph run serially vs on threads; outputs must match."""
+        import io
+        import soundfile as sf
+        from ai_engine.params import ProcessParams
+        from ai_engine.services import AudioProcessor, stage_executor
+
+        y, sr = synth_groove(120, options['sr'], options['seconds'])
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        sf.write(path, y, sr)
+        params = ProcessParams(target_bpm=126, export_format='wav', streaming=False)
+        mode = stage_executor.mode
+        try:
+            AudioProcessor.process(path, io.BytesIO(), params)  # JIT warm-up
+            walls, outputs = {}, {}
+            for stage_mode in ('serial', 'threads'):
+                stage_executor.configure(mode=stage_mode)
+                walls[stage_mode] = []
+                for _ in range(options['rounds']):
+                    out = io.BytesIO()
+                    start = time.perf_counter()
+                    meta = AudioProcessor.process(path, out, params)
+                    walls[stage_mode].append(time.perf_counter() - start)
+                    outputs[stage_mode] = out.getvalue()
+                stages = ', '.join(f"{t['stage']} {t['wall_seconds']:.2f}" for t in meta['timings'])
+                self.stdout.write(f'{stage_mode:>8}: median {np.median(walls[stage_mode]):.2f}s  ({stages})')
+        finally:
+            stage_executor.configure(mode=mode)
+            os.remove(path)
+        serial, threads = np.median(walls['serial']), np.median(walls['threads'])
+        self.stdout.write(f'threads vs serial: {serial / threads:.2f}x')
+        if outputs['serial'] != outputs['threads']:
+            raise CommandError('threaded stage graph changed the rendered output')
+
+    def bench_denoise(self, options):
+        """Speed and output SNR of the denoise engine's modes against the single noisereduce call, per noise fixture."""
+        import noisereduce as nr
+        from ai_engine.services import AudioProcessor, denoiser
+
+        jobs, executor = denoiser.jobs, denoiser.executor
+        denoiser.configure(jobs=options['jobs'], executor=options['executor'])
+        strength = 0.6
+        try:
+            AudioProcessor.reduce_noise(*noisy_fixture('white', options['sr'], 5.0)[1:], strength, mode='fast')  # warm-up
+            self.stdout.write(f'{denoiser.jobs} job(s) on {denoiser.executor}')
+            self.stdout.write(f"{'fixture':>8} {'input':>6} {'single':>14} {'accurate':>14} {'fast':>14} {'agree':>6}")
+            totals = {'single': 0.0, 'accurate': 0.0, 'fast': 0.0}
+            failures = []
+            for seed, kind in enumerate(NOISE_FIXTURES):
+                clean, noisy, sr = noisy_fixture(kind, options['sr'], options['seconds'], seed)
+                profile = AudioProcessor.estimate_noise_profile(noisy, sr)  # stored with the analysis in production
+                runs = {
+                    'single': lambda: nr.reduce_noise(y=noisy, y_noise=noisy[:int(0.5 * sr)], sr=sr,
+                                                      prop_decrease=strength, stationary=False),
+                    'accurate': lambda: AudioProcessor.reduce_noise(noisy, sr, strength),
+                    'fast': lambda: AudioProcessor.reduce_noise(noisy, sr, strength, mode='fast', noise_profile=profile),
+                }
+                outputs, cells = {}, []
+                for name, run in runs.items():
+                    start = time.perf_counter()
+                    outputs[name] = run()
+                    elapsed = time.perf_counter() - start
+                    totals[name] += elapsed
+                    cells.append(f'{snr_db(clean, outputs[name]):>6.1f}dB {elapsed:>5.2f}s')
+                agree = snr_db(outputs['single'], outputs['accurate'])
+                self.stdout.write(f"{kind:>8} {snr_db(clean, noisy):>4.1f}dB {' '.join(cells)} {agree:>4.0f}dB")
+                if agree < DENOISE_AGREEMENT_DB:
+                    failures.append(f'{kind}: chunked accurate differs from the single call ({agree:.0f} dB)')
+                if snr_db(clean, outputs['fast']) < snr_db(clean, outputs['single']) - DENOISE_FAST_MAX_LOSS_DB:
+                    failures.append(f'{kind}: fast mode loses more than {DENOISE_FAST_MAX_LOSS_DB} dB SNR')
+        finally:
+            denoiser.configure(jobs=jobs, executor=executor)
+        self.stdout.write(f"accurate {totals['single'] / totals['accurate']:.2f}x, "
+                          f"fast {totals['single'] / totals['fast']:.2f}x vs the single call")
+        if failures:
+            raise CommandError('; '.join(failures))
+
+    def bench_analysis(self, options):
+        """Per-stage cost of analyze() at the native rate vs on a copy at --analysis-sr, and tempo accuracy of both."""
+        from ai_engine.profiling import StageTimer
+        from ai_engine.services import AudioProcessor
+
+        analysis_sr = options['analysis_sr']
+        AudioProcessor.analyze(*synth_groove(120, options['sr'], 5.0))  # JIT warm-up
+        AudioProcessor.analyze(*synth_groove(120, options['sr'], 5.0), analysis_sr=analysis_sr)
+        timers = {'native': StageTimer(), 'low': StageTimer()}
+        correct = {'native': 0, 'low': 0}
+        for bpm in TEMPO_CORPUS_BPMS:
+            y, sr = synth_groove(bpm, options['sr'], options['seconds'], seed=bpm)
+            for variant, rate in (('native', None), ('low', analysis_sr)):
+                timer = timers[variant]
+                with timer.stage('downsample'):
+                    y_a, sr_a = AudioProcessor.analysis_copy(y, sr, rate)
+                with timer.stage('beat_track'):
+                    correct[variant] += tempo_agrees(AudioProcessor.estimate_bpm(y_a, sr_a), bpm, OCTAVE_FACTORS)
+                with timer.stage('tempo_fast'):
+                    AudioProcessor.estimate_bpm(y_a, sr_a, mode='fast')
+                with timer.stage('noise_profile'):
+                    AudioProcessor.estimate_noise_profile(y, sr)  # always native: it drives the render-rate gate
+                with timer.stage('analyze'):
+                    AudioProcessor.analyze(y, sr, analysis_sr=rate)
+        native = {t['stage']: t['wall_seconds'] for t in timers['native'].as_list()}
+        low = {t['stage']: t['wall_seconds'] for t in timers['low'].as_list()}
+        self.stdout.write(f"{'stage':>14} {options['sr']:>8} {analysis_sr:>8} {'speedup':>8}")
+        for stage in native:
+            speedup = f'{native[stage] / low[stage]:.2f}x' if low[stage] and native[stage] else '-'
+            self.stdout.write(f'{stage:>14} {native[stage]:>7.2f}s {low[stage]:>7.2f}s {speedup:>8}')
+        n = len(TEMPO_CORPUS_BPMS)
+        self.stdout.write(f"beat_track tempo correct (up to octave) on {correct['native']}/{n} at {options['sr']} Hz, "
+                          f"{correct['low']}/{n} at {analysis_sr} Hz")
+        if correct['low'] < correct['native']:
+            raise CommandError(f'analysis at {analysis_sr} Hz is less accurate than at the native rate')
+
+    def bench_stretch(self, options):
+        """Stretch engines on a track-length groove: wall time, exact output length and the tempo that comes out."""
+        from ai_engine.stretch import STRETCH_ENGINES, stretch_rate, time_stretch
+        from ai_engine.services import AudioProcessor
+
+        y, sr = synth_groove(120, options['sr'], options['seconds'])
+        for engine in STRETCH_ENGINES:
+            time_stretch(y[:5 * sr], sr, 1.05, engine)  # JIT warm-up
+        self.stdout.write(f"{options['seconds']:.0f}s groove at 120 bpm")
+        self.stdout.write(f"{'target':>7} " + ' '.join(f'{engine:>22}' for engine in STRETCH_ENGINES))
+        totals = dict.fromkeys(STRETCH_ENGINES, 0.0)
+        failures = []
+        for bpm in STRETCH_TARGET_BPMS:
+            rate = stretch_rate(120, bpm)
+            cells = []
+            for engine in STRETCH_ENGINES:
+                start = time.perf_counter()
+                out = time_stretch(y, sr, rate, engine)
+                elapsed = time.perf_counter() - start
+                totals[engine] += elapsed
+                detected = AudioProcessor.estimate_bpm(np.asarray(out[:30 * sr]), sr)
+                cells.append(f'{elapsed:>6.2f}s {detected:>6.1f} bpm')
+                if len(out) != int(round(len(y) / rate)):
+                    failures.append(f'{engine} at {bpm} bpm: {len(out)} samples, expected {int(round(len(y) / rate))}')
+                if not tempo_agrees(detected, 120 * rate, OCTAVE_FACTORS):
+                    failures.append(f'{engine} at {bpm} bpm: detected {detected:.1f} bpm')
+            skipped = ' (skipped)' if rate == 1.0 else ''
+            self.stdout.write(f"{bpm:>7} {' '.join(f'{cell:>22}' for cell in cells)}{skipped}")
+        self.stdout.write(f"wsola {totals['phase_vocoder'] / totals['wsola']:.2f}x vs phase_vocoder")
+        if failures:
+            raise CommandError('; '.join(failures))
+
+    def bench_mixer(self, options):
+        """Peak allocation and time of the drum mix on a long track, against the old tile-and-normalise version."""
+        from ai_engine.services import AudioProcessor
+
+        sr = options['sr']
+        y = synth_groove(120, sr, options['seconds'])[0]
+        drum_y = synth_groove(120, sr, 8.0, seed=1)[0]  # a 4-bar loop
+        mb = 1024 ** 2
+        self.stdout.write(f"{options['seconds']:.0f}s track, {len(y) * 4 / mb:.0f} MB as float32")
+        reference, ref_seconds, ref_peak = traced(tiled_mix, y, drum_y)
+        mixed, seconds, peak = traced(AudioProcessor.mix_drum_loop, y, drum_y)
+        out = np.empty(len(y), dtype=np.float32)
+        _, pre_seconds, pre_peak = traced(AudioProcessor.mix_drum_loop, y, drum_y, out=out)
+        for name, elapsed, allocated in (('tiled float64', ref_seconds, ref_peak), ('loop mixer', seconds, peak),
+                                         ('into buffer', pre_seconds, pre_peak)):
+            self.stdout.write(f'{name:>14}: {elapsed:>5.2f}s  peak {allocated / mb:>7.1f} MB '
+                              f'({allocated / (len(y) * 4):.2f}x the output)')
+        agree = snr_db(reference, mixed)
+        self.stdout.write(f'{ref_seconds / seconds:.2f}x faster, {ref_peak / peak:.1f}x less memory, '
+                          f'agreement {agree:.0f} dB')
+        failures = []
+        if peak > mixed.nbytes + MIXER_MAX_EXTRA_BYTES:
+            failures.append(f'mixing allocated {peak / mb:.1f} MB, bound is the output plus '
+                            f'{MIXER_MAX_EXTRA_BYTES / mb:.0f} MB')
+        if pre_peak > MIXER_MAX_EXTRA_BYTES:
+            failures.append(f'mixing into a preallocated buffer allocated {pre_peak / mb:.1f} MB')
+        if mixed.dtype != np.float32:
+            failures.append(f'mixer returned {mixed.dtype}')
+        if agree < MIXER_AGREEMENT_DB:
+            failures.append(f'mixer differs from the reference ({agree:.0f} dB)')
+        if failures:
+            raise CommandError('; '.join(failures))
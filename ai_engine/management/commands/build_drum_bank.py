@@ -0,0 +1,78 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ai_engine.drumbank import bpm_grid, read_index, source_bpm, write_index, write_variant
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.aif', '.aiff', '.ogg', '.mp3')
+
+
+def find_sources(source_dir):
+    """{style: path} for loops named <style>.wav or <style>_<bpm>bpm.wav."""
+    sources = {}
+    for name in sorted(os.listdir(source_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in AUDIO_EXTENSIONS:
+            sources.setdefault(stem.split('_')[0].lower(), os.path.join(source_dir, name))
+    return sources
+
+
+class Command(BaseCommand):
+    help = 'Pre-render per-style drum loops on a BPM grid into the drum bank (AI_ENGINE_DRUM_BANK_DIR).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*', metavar='STYLE=PATH',
+                            help='Source loops; overrides/extends those found in --source-dir.')
+        parser.add_argument('--source-dir', help='Directory of <style>[_<bpm>bpm].wav loops '
+                                                 '(default: ai_engine/assets/drums).')
+        parser.add_argument('--out', help='Bank directory (default: AI_ENGINE_DRUM_BANK_DIR).')
+        parser.add_argument('--sr', default='44100,48000', help='Comma-separated sample rates to render.')
+        parser.add_argument('--bpm-min', type=float, default=60.0)
+        parser.add_argument('--bpm-max', type=float, default=200.0)
+        parser.add_argument('--step-percent', type=float, default=1.5,
+                            help='Spacing of the tempo grid; the engine resamples at most half of it.')
+
+    def handle(self, *args, **options):
+        import librosa
+        from ai_engine.services import ASSETS_DIR, AudioProcessor
+
+        out = options['out'] or settings.AI_ENGINE_DRUM_BANK_DIR
+        if not out:
+            raise CommandError('No bank directory: pass --out or set AI_ENGINE_DRUM_BANK_DIR')
+        source_dir = options['source_dir'] or os.path.join(ASSETS_DIR, 'drums')
+        sources = find_sources(source_dir) if os.path.isdir(source_dir) else {}
+        for item in options['sources']:
+            style, sep, path = item.partition('=')
+            if not sep or not os.path.exists(path):
+                raise CommandError(f'Expected STYLE=PATH to an existing file, got {item!r}')
+            sources[style.lower()] = path
+        if not sources:
+            raise CommandError(f'No source loops in {source_dir} and none given')
+
+        rates = [int(rate) for rate in options['sr'].split(',') if rate]
+        grid = bpm_grid(options['bpm_min'], options['bpm_max'], options['step_percent'])
+        os.makedirs(out, exist_ok=True)
+        previous = read_index(out)
+        styles = dict(previous['styles']) if previous else {}
+
+        for style, path in sources.items():
+            start = time.perf_counter()
+            native_bpm, variants, size = source_bpm(path), {}, 0
+            for sr in rates:
+                loop, _ = librosa.load(path, sr=sr, mono=True)
+                if native_bpm is None:
+                    native_bpm = AudioProcessor.estimate_bpm(loop, sr)
+                # The loop's own tempo is always banked, unstretched
+                tempos = sorted({*grid, round(native_bpm, 2)})
+                for bpm in tempos:
+                    rate = bpm / native_bpm
+                    y = loop if abs(rate - 1.0) < 1e-4 else librosa.effects.time_stretch(loop, rate=rate)
+                    size += os.path.getsize(write_variant(out, style, sr, bpm, y))
+                variants[str(sr)] = tempos
+            styles[style] = {'source': os.path.basename(path), 'source_bpm': round(native_bpm, 2), 'variants': variants}
+            self.stdout.write(f'{style}: {os.path.basename(path)} at {native_bpm:.1f} bpm -> '
+                              f'{sum(map(len, variants.values()))} variants, {size / 1024 ** 2:.1f} MB '
+                              f'in {time.perf_counter() - start:.1f}s')
+
+        index = write_index(out, styles)
+        self.stdout.write(f"drum bank {index['build_id']} at {out}: {', '.join(sorted(styles))}")
@@ -0,0 +1,60 @@
+import logging
+import socket
+from functools import lru_cache
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('ai_engine.metrics')
+
+
+class LogSink:
+    """One structured line per sample on the ai_engine.metrics logger."""
+
+    def record(self, name, value, tags):
+        labels = ' '.join(f'{k}={v}' for k, v in sorted(tags.items()))
+        logger.info('%s=%.3f %s', name, value, labels)
+
+
+class StatsdSink:
+    """Fire-and-forget StatsD gauges over UDP to AI_ENGINE_STATSD_ADDR, with DogStatsD-style tags."""
+
+    DROP_TAGS = {'job'}  # per-job ids would explode tag cardinality
+
+    def __init__(self, addr=None, prefix='ai_engine'):
+        host, _, port = (addr or settings.AI_ENGINE_STATSD_ADDR).rpartition(':')
+        self.addr = (host or 'localhost', int(port))
+        self.prefix = prefix
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, name, value, tags):
+        line = f'{self.prefix}.{name}:{value:.6g}|g'
+        tags = {k: v for k, v in tags.items() if k not in self.DROP_TAGS}
+        if tags:
+            line += '|#' + ','.join(f'{k}:{v}' for k, v in sorted(tags.items()))
+        self.sock.sendto(line.encode(), self.addr)
+
+
+@lru_cache(maxsize=None)
+def sinks():
+    """Sink instances from AI_ENGINE_METRICS_SINKS (dotted class paths), built once per process."""
+    return tuple(import_string(path)() for path in settings.AI_ENGINE_METRICS_SINKS)
+
+
+def record(name, value, **tags):
+    """Send one metric sample to every configured sink; a failing sink never fails the caller."""
+    if value is None:
+        return
+    for sink in sinks():
+        try:
+            sink.record(name, value, tags)
+        except Exception:
+            logger.warning('Metrics sink %s failed for %s', type(sink).__name__, name, exc_info=True)
+
+
+def record_stages(timings, **tags):
+    """Emit a StageTimer breakdown (see profiling.StageTimer.as_list) as per-stage samples."""
+    for entry in timings or ():
+        stage = entry['stage']
+        record('stage_wall_seconds', entry['wall_seconds'], stage=stage, **tags)
+        record('stage_cpu_seconds', entry['cpu_seconds'], stage=stage, **tags)
+        record('stage_peak_rss_delta_mb', entry['peak_rss_delta_mb'], stage=stage, **tags)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('music', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('bpm', models.FloatField()),
+                ('beat_frames', models.JSONField(default=list)),
+                ('duration_seconds', models.FloatField()),
+                ('sr', models.PositiveIntegerField()),
+                ('noise_profile', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('track', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis', to='music.track')),
+            ],
+        ),
+    ]
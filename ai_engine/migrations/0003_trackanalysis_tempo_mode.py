@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0002_processedresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackanalysis',
+            name='tempo_mode',
+            field=models.CharField(default='accurate', max_length=16),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0003_trackanalysis_tempo_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaveformPeaks',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(max_length=255, unique=True)),
+                ('peaks_file', models.FileField(max_length=255, upload_to='peaks/')),
+                ('sr', models.PositiveIntegerField()),
+                ('samples', models.BigIntegerField()),
+                ('level_spp', models.JSONField(default=list)),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0004_waveformpeaks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackanalysis',
+            name='analysis_sr',
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
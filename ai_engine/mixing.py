@@ -0,0 +1,61 @@
+import numpy as np
+
+# Loop repeats are mixed in runs of at least this many samples, so short loops don't mean a Python step per bar
+MIX_BLOCK = 1 << 16
+HEADROOM = 0.9  # mixed output peaks here
+
+
+def peak(y):
+    """max(|y|) without the full-length temporary np.abs would allocate."""
+    if not len(y):
+        return 0.0
+    return max(float(np.max(y)), -float(np.min(y)))
+
+
+class LoopMixer:
+    """Mixes a signal with a drum loop repeated under it, in float32, without tiling the loop.
+
+    Both inputs are peak-normalised by the gains (1 - mix) / y_max and mix / drum_max. Blocks are
+    written into caller-provided or preallocated output, and the mix peak is tracked as they go,
+    so normalising the result is one more in-place pass. Memory beyond the output is the loop
+    itself, pre-scaled and repeated to about MIX_BLOCK samples. An empty loop mixes in nothing:
+    the signal just gets its gain.
+    """
+
+    def __init__(self, drum_y, mix, y_max, drum_max):
+        self.mix = mix
+        self.gain = np.float32((1 - mix) / (y_max or 1.0))
+        drum = np.asarray(drum_y, dtype=np.float32) * np.float32(mix / (drum_max or 1.0))
+        self.loop_len = len(drum)
+        self._drums = np.tile(drum, max(1, MIX_BLOCK // len(drum))) if len(drum) else None
+        self.peak = 0.0
+
+    def mix_into(self, out, y, start=0):
+        """out[:] = mixed y, where y begins `start` samples into the track; returns out."""
+        if self._drums is None:
+            np.multiply(y, self.gain, out=out, casting='same_kind')
+            self.peak = max(self.peak, peak(out))
+            return out
+        n, pos = len(y), 0
+        while pos < n:
+            phase = (start + pos) % self.loop_len
+            stop = min(n, pos + len(self._drums) - phase)
+            seg = out[pos:stop]
+            np.multiply(y[pos:stop], self.gain, out=seg, casting='same_kind')
+            seg += self._drums[phase:phase + len(seg)]
+            self.peak = max(self.peak, peak(seg))
+            pos = stop
+        return out
+
+
+def mix_loop(y, drum_y, mix=0.4, out=None):
+    """Whole-signal mix of `y` with `drum_y` looped under it, normalised to HEADROOM; float32.
+
+    `out` (float32, len(y)) may be preallocated, or be `y` itself to mix in place.
+    """
+    n = len(y)
+    mixer = LoopMixer(drum_y, mix, peak(y), peak(drum_y[:n]))
+    out = np.empty(n, dtype=np.float32) if out is None else out
+    mixer.mix_into(out, y)
+    out *= np.float32(HEADROOM / (mixer.peak or 1.0))
+    return out
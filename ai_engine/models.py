@@ -1,3 +1,88 @@
 from django.db import models
+from django.utils import timezone
+from music.models import Track
 
-# Create your models here.
+
+class TrackAnalysis(models.Model):
+    """Tempo/noise analysis of a track's original_file, reused across reprocessing jobs."""
+
+    track = models.OneToOneField(Track, on_delete=models.CASCADE, related_name='analysis')
+    content_hash = models.CharField(max_length=64, db_index=True)
+    bpm = models.FloatField()
+    beat_frames = models.JSONField(default=list)
+    duration_seconds = models.FloatField()
+    sr = models.PositiveIntegerField()
+    noise_profile = models.JSONField(default=list)  # per-bin dB, n_fft=2048
+    tempo_mode = models.CharField(max_length=16, default='accurate')
+    analysis_sr = models.PositiveIntegerField(null=True)  # rate tempo was analysed at; null = sr (older rows)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    ANALYSIS_FIELDS = ('bpm', 'beat_frames', 'duration_seconds', 'sr', 'noise_profile', 'tempo_mode', 'analysis_sr')
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.ANALYSIS_FIELDS}
+
+    @classmethod
+    def lookup(cls, track, content_hash, tempo_mode='accurate', analysis_sr=None):
+        # An accurate analysis can serve fast-mode jobs, not the other way round
+        qs = cls.objects.filter(track=track, content_hash=content_hash)
+        if tempo_mode != 'fast':
+            qs = qs.filter(tempo_mode='accurate')
+        # Tempo must have been analysed at the requested rate (capped at the track's own)
+        native = models.Q(analysis_sr=None) | models.Q(analysis_sr=models.F('sr'))
+        if analysis_sr:
+            qs = qs.filter(models.Q(analysis_sr=analysis_sr) | native & models.Q(sr__lte=analysis_sr))
+        else:
+            qs = qs.filter(native)
+        return qs.first()
+
+    @classmethod
+    def store(cls, track, content_hash, analysis):
+        defaults = {name: analysis[name] for name in cls.ANALYSIS_FIELDS if name in analysis}
+        obj, _ = cls.objects.update_or_create(track=track, defaults={'content_hash': content_hash, **defaults})
+        return obj
+
+    def __str__(self):
+        return f'Analysis of {self.track_id} ({self.bpm:.1f} bpm)'
+
+
+class ProcessedResult(models.Model):
+    """Rendered output for one (content hash, normalised params, processor version) key."""
+
+    cache_key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    params = models.JSONField(default=dict)
+    processor_version = models.CharField(max_length=32)
+    output_file = models.FileField(upload_to='processed/', max_length=255)
+    meta = models.JSONField(default=dict)  # duration_seconds, bpm, sr
+    size_bytes = models.BigIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def touch(self):
+        self.hits += 1
+        self.last_used_at = timezone.now()
+        ProcessedResult.objects.filter(pk=self.pk).update(hits=models.F('hits') + 1, last_used_at=self.last_used_at)
+
+    def __str__(self):
+        return f'{self.cache_key[:12]} -> {self.output_file.name}'
+
+
+class WaveformPeaks(models.Model):
+    """Min/max peak pyramid (ai_engine.peaks format) of one stored audio file, keyed by its storage name.
+
+    Processed outputs are content-addressed, so tracks sharing a cached render share its peaks.
+    """
+
+    source_name = models.CharField(max_length=255, unique=True)
+    peaks_file = models.FileField(upload_to='peaks/', max_length=255)
+    sr = models.PositiveIntegerField()
+    samples = models.BigIntegerField()
+    level_spp = models.JSONField(default=list)  # samples per peak at each level, finest first
+    size_bytes = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Peaks of {self.source_name}'
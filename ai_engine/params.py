@@ -0,0 +1,73 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+
+# Bump whenever a change to the processing chain alters rendered output;
+# it is part of every result-cache key.
+PROCESSOR_VERSION = '5'
+
+DRUM_MIX_BY_INTENSITY = {'soft': 0.25, 'medium': 0.4, 'hard': 0.6}
+DEFAULT_NOISE_REDUCTION = 0.6
+DEFAULT_ANALYSIS_SR = 22050
+SUPPORTED_FORMATS = ('wav', 'mp3', 'ogg', 'opus')
+
+
+def normalize_format(export_format):
+    fmt = (export_format or 'mp3').lower()
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f'Unsupported export format: {export_format}')
+    return fmt
+
+
+@dataclass
+class ProcessParams:
+    noise_reduction_strength: float = DEFAULT_NOISE_REDUCTION
+    add_drums: bool = True
+    drum_mix: float = 0.4  # 0..1
+    drum_style: str | None = None  # a drum bank style (e.g. 'house'); None = the default loop
+    target_bpm: float | None = None
+    export_format: str = 'mp3'  # 'mp3', 'wav', 'ogg' or 'opus'
+    streaming: bool | None = None  # None = auto, based on input duration
+    tempo_mode: str = 'accurate'  # 'accurate' (beat_track) or 'fast' (decimated autocorrelation)
+    tempo_max_seconds: float | None = None  # analyse only the first N seconds for tempo
+    analysis_sr: int | None = DEFAULT_ANALYSIS_SR  # tempo analysis runs on a copy at this rate; None = native
+    denoise_mode: str = 'accurate'  # 'accurate' (non-stationary gate) or 'fast' (stationary, from the noise profile)
+    stretch_engine: str = 'phase_vocoder'  # 'phase_vocoder' or 'wsola' (time-domain, faster, crisper drums)
+    preview: bool = False  # render a short window around the loudest section only
+    preview_seconds: float = 30.0
+    preview_sr: int = 22050
+
+    @classmethod
+    def from_request(cls, data, **overrides):
+        """Map validated ProcessTrackRequestSerializer data onto engine params; `overrides` are deployment settings."""
+        return cls(**{**dict(
+            noise_reduction_strength=DEFAULT_NOISE_REDUCTION if data.get('denoise', True) else 0.0,
+            add_drums=bool(data.get('add_beats', True)),
+            drum_mix=DRUM_MIX_BY_INTENSITY.get(data.get('intensity') or 'medium', 0.4),
+            drum_style=data.get('style') if data.get('style') not in (None, '', 'none') else None,
+            target_bpm=float(data['tempo']) if data.get('tempo') else None,
+            denoise_mode=data.get('denoise_mode') or 'accurate',
+            stretch_engine=data.get('stretch_engine') or 'phase_vocoder',
+            preview=bool(data.get('preview', False)),
+        ), **overrides})
+
+    def normalized(self):
+        """Canonical dict used for cache keys: floats rounded, format lowercased."""
+        data = asdict(self)
+        for name, value in data.items():
+            if isinstance(value, float):
+                data[name] = round(value, 4)
+        data['export_format'] = (self.export_format or 'mp3').lower()
+        if not data['noise_reduction_strength']:
+            data['denoise_mode'] = None  # irrelevant without denoising
+        if not data['target_bpm'] and not data['add_drums']:
+            data['stretch_engine'] = None  # nothing is stretched
+        if not data['add_drums']:
+            data['drum_mix'] = data['drum_style'] = None  # irrelevant without drums
+        if not data['preview']:
+            data['preview_seconds'] = data['preview_sr'] = None
+        return data
+
+    def cache_key(self, content_hash, version=PROCESSOR_VERSION):
+        payload = json.dumps([content_hash, self.normalized(), version], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
@@ -0,0 +1,166 @@
+import glob
+import os
+import tempfile
+import threading
+
+# numpy/soundfile are imported where used: web processes import this module to invalidate entries
+PCM_SUFFIX = '.npy'
+DECODE_BLOCK_FRAMES = 1024 * 1024
+# Formats libsndfile reads as plain PCM; caching them would only duplicate the upload
+UNCOMPRESSED_EXTENSIONS = ('.wav', '.wave', '.aif', '.aiff', '.flac')
+
+
+def is_pcm(path):
+    return isinstance(path, str) and path.endswith(PCM_SUFFIX)
+
+
+def pcm_sr(path):
+    # <content hash>_<sr>.npy
+    return int(os.path.basename(path)[:-len(PCM_SUFFIX)].rpartition('_')[2])
+
+
+def load_pcm(path):
+    """Map a cached decode read-only; (y, sr) with y a float32 memmap, so nothing is copied until sliced into math."""
+    import numpy as np
+    return np.load(path, mmap_mode='r'), pcm_sr(path)
+
+
+def pcm_info(path):
+    y, sr = load_pcm(path)
+    return sr, len(y)
+
+
+class PCMCache:
+    """Decoded mono float32 PCM of uploads, keyed by content hash, as .npy files under `root`.
+
+    A changed upload hashes differently, so stale entries are never served; they age out
+    through the size-bounded LRU (file mtime is bumped on every use). Entries are written
+    to a temp file and renamed, and unlinking a file another process has mapped is safe,
+    so concurrent workers need no locking.
+    """
+
+    def __init__(self, decoder=None, root=None, max_bytes=20 * 1024 ** 3, block_decode_seconds=None):
+        self.decoder = decoder  # decoder(path) -> (y, sr), e.g. AudioProcessor.load_audio
+        self.block_decode_seconds = block_decode_seconds
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def configure(self, root=None, max_bytes=None):
+        if root is not None:
+            self.root = root or None  # '' disables the cache
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+    def _shard(self, content_hash):
+        return os.path.join(self.root, content_hash[:2])
+
+    def lookup(self, content_hash):
+        """Path of the cached decode, or None."""
+        if not self.root or not content_hash:
+            return None
+        for path in glob.glob(os.path.join(self._shard(content_hash), f'{content_hash}_*{PCM_SUFFIX}')):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue  # evicted under us
+            return path
+        return None
+
+    def source(self, input_path, content_hash):
+        """What the pipeline should read: the cached decode, decoding and storing it on a miss.
+
+        Falls back to `input_path` when the cache is disabled, no hash is known, or the
+        upload is already uncompressed.
+        """
+        if not self.root or not content_hash or is_pcm(input_path):
+            return input_path
+        if os.path.splitext(input_path)[1].lower() in UNCOMPRESSED_EXTENSIONS:
+            return input_path
+        return self.lookup(content_hash) or self.store(content_hash, input_path)
+
+    def store(self, content_hash, input_path):
+        """Decode input_path into the cache.
+
+        Normally through `decoder`, so the cached PCM is exactly what a direct load returns
+        (MP3 decoding isn't bit-stable across different read patterns). Inputs of at least
+        `block_decode_seconds` that libsndfile can read are decoded block-wise instead, in
+        bounded memory, as the streaming path would read them anyway.
+        """
+        import numpy as np
+        from .streaming import audio_info
+
+        shard = self._shard(content_hash)
+        os.makedirs(shard, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.part', dir=shard)
+        os.close(fd)
+        try:
+            decoded = False
+            if self.block_decode_seconds is not None:
+                try:
+                    sr, frames = audio_info(input_path)
+                except RuntimeError:
+                    frames = 0
+                if frames and frames >= self.block_decode_seconds * sr:
+                    decoded = self._decode_blocks(input_path, tmp, frames)
+            if not decoded:
+                y, sr = self.decoder(input_path)
+                with open(tmp, 'wb') as fh:
+                    np.save(fh, np.ascontiguousarray(y, dtype=np.float32))
+            path = os.path.join(shard, f'{content_hash}_{int(sr)}{PCM_SUFFIX}')
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict(keep=path)
+        return path
+
+    @staticmethod
+    def _decode_blocks(input_path, tmp, frames):
+        """Stream-decode into a .npy memmap; False if the header's frame count was wrong (possible for VBR MP3)."""
+        import numpy as np
+        from .streaming import iter_blocks
+
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(frames,))
+        pos = 0
+        for block in iter_blocks(input_path, DECODE_BLOCK_FRAMES):
+            if pos + len(block) > frames:
+                break
+            out[pos:pos + len(block)] = block
+            pos += len(block)
+        else:
+            out.flush()
+        del out
+        return pos == frames
+
+    def discard(self, content_hash):
+        if not self.root or not content_hash:
+            return
+        for path in glob.glob(os.path.join(self._shard(content_hash), f'{content_hash}_*{PCM_SUFFIX}')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep=None):
+        """Drop least-recently-used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for path in glob.glob(os.path.join(self.root, '*', f'*{PCM_SUFFIX}')):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
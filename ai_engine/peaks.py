@@ -0,0 +1,118 @@
+import struct
+
+# numpy is imported where used: web processes read peak files to serve them
+MAGIC = b'WPK1'
+SLICE_MAGIC = b'WPKS'
+BASE_SAMPLES_PER_PEAK = 256
+LEVEL_FACTOR = 4
+MAX_LEVELS = 6  # 256 .. 262144 samples per peak
+
+# magic, sr, samples, base samples-per-peak, level factor, level count; then one uint64 peak count per level
+HEADER = struct.Struct('<4sIQIHH')
+LEVEL_COUNT = struct.Struct('<Q')
+# magic, sr, samples per peak, first peak index, peak count; then int8 (min, max) pairs
+SLICE_HEADER = struct.Struct('<4sIIQQ')
+
+
+class PeakBuilder:
+    """Builds a min/max peak pyramid from PCM pushed in blocks of any size.
+
+    Level 0 holds one (min, max) pair per BASE_SAMPLES_PER_PEAK samples; each further
+    level reduces the one below by LEVEL_FACTOR. Values are stored as int8 (x * 127),
+    so a 10-minute 44.1 kHz track is ~280 KB for all levels.
+    """
+
+    def __init__(self, sr, samples_per_peak=BASE_SAMPLES_PER_PEAK, factor=LEVEL_FACTOR, max_levels=MAX_LEVELS):
+        self.sr = int(sr)
+        self.samples_per_peak = samples_per_peak
+        self.factor = factor
+        self.max_levels = max_levels
+        self.samples = 0
+        self._carry = None
+        self._mins = []
+        self._maxs = []
+
+    def push(self, y):
+        import numpy as np
+
+        y = np.asarray(y, dtype=np.float32)
+        self.samples += len(y)
+        if self._carry is not None and len(self._carry):
+            y = np.concatenate([self._carry, y])
+        n = len(y) // self.samples_per_peak * self.samples_per_peak
+        if n:
+            frames = y[:n].reshape(-1, self.samples_per_peak)
+            self._mins.append(frames.min(axis=1))
+            self._maxs.append(frames.max(axis=1))
+        self._carry = y[n:].copy()
+
+    def levels(self):
+        """[(mins, maxs), ...] as float32 arrays, finest level first."""
+        import numpy as np
+
+        mins, maxs = list(self._mins), list(self._maxs)
+        if self._carry is not None and len(self._carry):
+            mins.append(self._carry.min(keepdims=True))
+            maxs.append(self._carry.max(keepdims=True))
+        lo = np.concatenate(mins) if mins else np.zeros(0, dtype=np.float32)
+        hi = np.concatenate(maxs) if maxs else np.zeros(0, dtype=np.float32)
+        levels = [(lo, hi)]
+        while len(levels) < self.max_levels and len(lo) > 1:
+            pad = -len(lo) % self.factor
+            lo = np.pad(lo, (0, pad), constant_values=np.inf).reshape(-1, self.factor).min(axis=1)
+            hi = np.pad(hi, (0, pad), constant_values=-np.inf).reshape(-1, self.factor).max(axis=1)
+            levels.append((lo, hi))
+        return levels
+
+    def to_bytes(self):
+        import numpy as np
+
+        levels = self.levels()
+        parts = [HEADER.pack(MAGIC, self.sr, self.samples, self.samples_per_peak, self.factor, len(levels))]
+        parts += [LEVEL_COUNT.pack(len(lo)) for lo, _ in levels]
+        for lo, hi in levels:
+            pairs = np.empty((len(lo), 2), dtype=np.float32)
+            pairs[:, 0], pairs[:, 1] = lo, hi
+            parts.append(np.clip(np.round(pairs * 127), -128, 127).astype(np.int8).tobytes())
+        return b''.join(parts)
+
+
+def build_peaks(y, sr):
+    builder = PeakBuilder(sr)
+    builder.push(y)
+    return builder.to_bytes()
+
+
+def read_header(fh):
+    """Parse a peak file header: dict with sr, samples, level_spp (samples per peak) and level_counts."""
+    magic, sr, samples, spp, factor, n_levels = HEADER.unpack(fh.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('Not a waveform peaks file')
+    counts = [LEVEL_COUNT.unpack(fh.read(LEVEL_COUNT.size))[0] for _ in range(n_levels)]
+    return {
+        'sr': sr,
+        'samples': samples,
+        'level_spp': [spp * factor ** i for i in range(n_levels)],
+        'level_counts': counts,
+        'data_offset': HEADER.size + LEVEL_COUNT.size * n_levels,
+    }
+
+
+def pick_level(header, start, end, width):
+    """Coarsest level that still gives at least `width` peaks between start and end (seconds)."""
+    seconds = max(0.0, end - start)
+    for level in reversed(range(len(header['level_spp']))):
+        if seconds * header['sr'] / header['level_spp'][level] >= width:
+            return level
+    return 0
+
+
+def read_slice(fh, header, level, start=0.0, end=None):
+    """Peaks of one level between start and end (seconds), as a SLICE_HEADER-prefixed blob."""
+    spp = header['level_spp'][level]
+    count = header['level_counts'][level]
+    first = min(count, int(start * header['sr']) // spp)
+    last = count if end is None else min(count, -(-int(end * header['sr']) // spp))
+    n = max(0, last - first)
+    fh.seek(header['data_offset'] + 2 * (sum(header['level_counts'][:level]) + first))
+    return SLICE_HEADER.pack(SLICE_MAGIC, header['sr'], spp, first, n) + fh.read(2 * n)
@@ -0,0 +1,71 @@
+import cProfile
+import marshal
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # KiB on Linux
+
+
+def cpu_seconds():
+    # Includes reaped children, so the ffmpeg encoder is charged to the stage that waits on it
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class StageTimer:
+    """Accumulates wall time, CPU time and peak-RSS growth per named pipeline stage.
+
+    A stage entered several times (e.g. once per streaming block) is summed. Peak RSS is a
+    process high-water mark, so its delta is how far the stage raised it, not what it allocated.
+    `on_enter(name)`, if given, is called as each stage starts (e.g. to report progress).
+    """
+
+    def __init__(self, on_enter=None):
+        self._stages = {}
+        self._lock = threading.Lock()
+        self.on_enter = on_enter
+
+    @contextmanager
+    def stage(self, name):
+        # Safe to use from concurrent stages, but CPU and RSS are process-wide, so
+        # stages that overlap in time are each charged for the other's work
+        if self.on_enter is not None:
+            self.on_enter(name)
+        wall, cpu, rss = time.perf_counter(), cpu_seconds(), peak_rss_bytes()
+        try:
+            yield
+        finally:
+            wall, cpu, rss = time.perf_counter() - wall, cpu_seconds() - cpu, peak_rss_bytes() - rss
+            with self._lock:
+                entry = self._stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rss': 0})
+                entry['calls'] += 1
+                entry['wall'] += wall
+                entry['cpu'] += cpu
+                entry['rss'] += rss
+
+    def as_list(self):
+        return [
+            {
+                'stage': name,
+                'calls': entry['calls'],
+                'wall_seconds': round(entry['wall'], 4),
+                'cpu_seconds': round(entry['cpu'], 4),
+                'peak_rss_delta_mb': round(entry['rss'] / (1024 * 1024), 1),
+            }
+            for name, entry in self._stages.items()
+        ]
+
+
+def run_profiled(fn, *args, **kwargs):
+    """Call fn under cProfile; returns (result, stats) with stats in .prof (pstats) format."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    profiler.create_stats()
+    return result, marshal.dumps(profiler.stats)
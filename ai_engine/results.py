@@ -0,0 +1,78 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Sum
+from django.utils import timezone
+from . import drumbank, waveforms
+from .models import ProcessedResult
+from .params import PROCESSOR_VERSION
+
+
+def cache_key_for(params, content_hash):
+    """Result-cache key of a render; with a drum style it also covers the drum bank build."""
+    version = PROCESSOR_VERSION
+    if params.add_drums and params.drum_style:
+        version = f'{version}:{drumbank.build_id(settings.AI_ENGINE_DRUM_BANK_DIR)}'
+    return params.cache_key(content_hash, version)
+
+
+def result_name(cache_key, export_format):
+    return f'processed/{cache_key[:2]}/{cache_key}.{export_format}'
+
+
+def lookup(cache_key):
+    """Return the cached result for a key, or None if missing or its file is gone."""
+    result = ProcessedResult.objects.filter(cache_key=cache_key).first()
+    if result is None:
+        return None
+    if not result.output_file or not result.output_file.storage.exists(result.output_file.name):
+        result.delete()
+        return None
+    result.touch()
+    return result
+
+
+def store(cache_key, content_hash, params, output_name, meta):
+    storage = ProcessedResult._meta.get_field('output_file').storage
+    result, _ = ProcessedResult.objects.update_or_create(
+        cache_key=cache_key,
+        defaults={
+            'content_hash': content_hash,
+            'params': params.normalized(),
+            'processor_version': PROCESSOR_VERSION,
+            'output_file': output_name,
+            'meta': {k: meta[k] for k in ('duration_seconds', 'bpm', 'sr') if k in meta},
+            'size_bytes': storage.size(output_name),
+            'last_used_at': timezone.now(),
+        },
+    )
+    return result
+
+
+def evict(max_bytes=None, max_age=None):
+    """Drop results older than max_age, then least-recently-used ones until under max_bytes.
+
+    Scheduled by CELERY_BEAT_SCHEDULE['evict-results'] rather than run after every job.
+    """
+    from music.models import ProcessingJob, Track
+    if max_bytes is None:
+        max_bytes = settings.AI_ENGINE_RESULT_CACHE_MAX_MB * 1024 * 1024
+    if max_age is None:
+        max_age = timedelta(days=settings.AI_ENGINE_RESULT_CACHE_MAX_AGE_DAYS)
+
+    # Output files still serving as a track's current processed_file are never evicted
+    pinned = Track.objects.filter(processed_file=OuterRef('output_file'))
+    candidates = ProcessedResult.objects.filter(~Exists(pinned)).order_by('last_used_at')
+    total = ProcessedResult.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    cutoff = timezone.now() - max_age
+    evicted = []
+    for result in candidates.iterator():
+        if result.last_used_at >= cutoff and total <= max_bytes:
+            break
+        name = result.output_file.name
+        result.output_file.storage.delete(name)
+        ProcessingJob.objects.filter(output_file=name).update(output_file='')
+        result.delete()
+        total -= result.size_bytes
+        evicted.append(name)
+    waveforms.discard(evicted)
+    return evicted
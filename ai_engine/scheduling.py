@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from music.models import ProcessingJob
+from . import metrics
+
+# Jobs are created held back (dispatched_at unset) and sent to Celery by dispatch(), which keeps
+# each user to a few jobs in the broker at a time. One artist's bulk upload then queues up in the
+# database instead of in front of everyone else's jobs; the rest go out as theirs finish.
+
+
+def route(user, preview):
+    """Celery queue for a job: previews, then paid full renders, then free ones (give each its own workers)."""
+    if preview:
+        return settings.AI_ENGINE_PREVIEW_QUEUE
+    if getattr(user, 'plan', None) == get_user_model().Plan.PAID:
+        return settings.AI_ENGINE_PAID_QUEUE
+    return settings.AI_ENGINE_FULL_QUEUE
+
+
+def user_limit(preview):
+    """Jobs of one kind a user may have in Celery at once; 0 = no limit."""
+    return settings.AI_ENGINE_USER_MAX_ACTIVE_PREVIEWS if preview else settings.AI_ENGINE_USER_MAX_ACTIVE
+
+
+def dispatch(user_id):
+    """Send a user's held-back jobs to Celery, oldest first, up to their free slots; returns the job ids sent.
+
+    Previews and full renders have separate limits, so a preview isn't stuck behind the user's
+    own long renders. The user row is locked while slots are counted, so concurrent submissions
+    and completions can't hand out the same slot twice.
+    """
+    from .tasks import process_track_task
+
+    now = timezone.now()
+    with transaction.atomic():
+        get_user_model().objects.select_for_update().filter(pk=user_id).first()
+        active = ProcessingJob.objects.filter(created_by_id=user_id, state__in=ProcessingJob.ACTIVE_STATES)
+        chosen = []
+        for preview in (True, False):
+            held = active.filter(is_preview=preview, dispatched_at__isnull=True).order_by('created_at')
+            limit = user_limit(preview)
+            if limit:
+                in_flight = active.filter(is_preview=preview, dispatched_at__isnull=False).count()
+                held = held[:max(0, limit - in_flight)]
+            chosen += held.values_list('id', 'queue', 'created_at')
+        ProcessingJob.objects.filter(id__in=[job_id for job_id, _, _ in chosen]).update(dispatched_at=now)
+
+    for job_id, queue, created_at in chosen:
+        try:
+            task = process_track_task.apply_async((job_id,), queue=queue or None)
+        except Exception:
+            ProcessingJob.objects.filter(id=job_id).update(dispatched_at=None)  # held again for the next dispatch
+            raise
+        ProcessingJob.objects.filter(id=job_id).update(celery_task_id=task.id or '')
+        metrics.record('fair_share_wait_seconds', (now - created_at).total_seconds(), job=job_id, queue=queue)
+    if chosen:
+        record_queue_depths()
+    return [job_id for job_id, _, _ in chosen]
+
+
+def release(job):
+    """A job left the active states: its owner has a free slot."""
+    if not dispatch(job.created_by_id):
+        record_queue_depths()
+
+
+def dispatch_all():
+    """Dispatch for every user with held-back jobs (e.g. from a periodic task, should a release be missed)."""
+    users = (ProcessingJob.objects.filter(state__in=ProcessingJob.ACTIVE_STATES, dispatched_at__isnull=True)
+             .values_list('created_by_id', flat=True).distinct())
+    return sum(len(dispatch(user_id)) for user_id in users)
+
+
+def queue_stats():
+    """Per Celery queue: jobs held back by fair share, waiting in the broker, running, and the oldest wait."""
+    now = timezone.now()
+    rows = (ProcessingJob.objects.filter(state__in=ProcessingJob.ACTIVE_STATES)
+            .values('queue')
+            .annotate(
+                held=Count('id', filter=Q(dispatched_at__isnull=True)),
+                waiting=Count('id', filter=Q(dispatched_at__isnull=False, state=ProcessingJob.State.QUEUED)),
+                running=Count('id', filter=Q(state=ProcessingJob.State.RUNNING)),
+                oldest=Min('created_at', filter=Q(state=ProcessingJob.State.QUEUED)),
+                users=Count('created_by', distinct=True),
+            )
+            .order_by('queue'))
+    return [
+        {
+            'queue': row['queue'],
+            'held': row['held'],
+            'waiting': row['waiting'],
+            'running': row['running'],
+            'users': row['users'],
+            'oldest_wait_seconds': (now - row['oldest']).total_seconds() if row['oldest'] else 0.0,
+        }
+        for row in rows
+    ]
+
+
+def record_queue_depths():
+    for row in queue_stats():
+        for name in ('held', 'waiting', 'running'):
+            metrics.record(f'queue_{name}', row[name], queue=row['queue'])
+        metrics.record('queue_oldest_wait_seconds', row['oldest_wait_seconds'], queue=row['queue'])
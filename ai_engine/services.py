@@ -1,110 +1,550 @@
 import os
-from dataclasses import dataclass
+from contextlib import nullcontext
 import numpy as np
 import librosa
-import soundfile as sf
-import noisereduce as nr
-from pydub import AudioSegment
+from .checkpoints import Checkpoints
+from .denoise import DenoiseEngine
+from .drumbank import DrumBank, is_variant
+from .drums import DrumLoopCache
+from .encoders import PCMEncoder, encode_pcm
+from .graph import StageExecutor, StageGraph
+from .mixing import HEADROOM, LoopMixer, mix_loop, peak
+from .pcm import PCMCache, is_pcm, load_pcm
+from .peaks import PeakBuilder, build_peaks
+from .params import ProcessParams
+from .profiling import StageTimer, run_profiled
+from .streaming import OverlapJoiner, SpillBuffer, audio_info, iter_blocks, read_excerpt
+from .stretch import stretch_rate, time_stretch
 
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), 'assets')
-DEFAULT_DRUM_LOOP = os.path.join(ASSETS_DIR, 'drum_loop_120bpm.wav')  
+DEFAULT_DRUM_LOOP = os.path.join(ASSETS_DIR, 'drum_loop_120bpm.wav')
+# Drum bank variants this close to the target tempo are varispeed-resampled instead of phase-vocoded
+DRUM_BANK_MAX_RESIDUAL = 0.02
 
-@dataclass
-class ProcessParams:
-    noise_reduction_strength: float = 0.6
-    add_drums: bool = True
-    drum_mix: float = 0.4  # 0..1
-    target_bpm: float | None = None
-    export_format: str = 'mp3'  # 'mp3' or 'wav'
+# Streaming mode: inputs at least this long are processed block by block
+STREAM_MIN_SECONDS = 10 * 60
+STREAM_BLOCK_SECONDS = 30.0
+STREAM_OVERLAP_SECONDS = 2.0
+STREAM_SPLICE_SECONDS = 0.05  # crossfade between stretched blocks, mid-overlap (see OverlapJoiner)
+STREAM_ANALYSIS_SECONDS = 120.0
+
+# Fast tempo mode: onset envelope of a decimated signal; same frame rate as beat_track at 22.05 kHz
+FAST_TEMPO_SR = 11025
+FAST_TEMPO_HOP = 256
+
+# Preview renders: a short window around the loudest section, at a reduced rate
+PREVIEW_SCAN_HOP_SECONDS = 0.5
+PREVIEW_FADE_SECONDS = 0.05
+
+NOISE_PROFILE_N_FFT = 2048
+
+# Analysis copies only feed onset detection, so a cheaper resampler than the render path's is fine
+ANALYSIS_RES_TYPE = 'soxr_mq'
+NOISE_PROFILE_PERCENTILE = 10
 
 class AudioProcessor:
     @staticmethod
     def load_audio(path):
+        if is_pcm(path):
+            return load_pcm(path)  # read-only memmap of a cached decode
         y, sr = librosa.load(path, sr=None, mono=True)
         return y, sr
 
     @staticmethod
-    def estimate_bpm(y, sr):
+    def load_window(path, sr, offset, duration):
+        """`duration` seconds from `offset`, resampled to `sr` (what librosa.load(offset=, duration=) does)."""
+        if not is_pcm(path):
+            y, sr = librosa.load(path, sr=sr, mono=True, offset=offset, duration=duration)
+            return y, sr
+        y, native_sr = load_pcm(path)
+        start = int(round(offset * native_sr))
+        y = np.array(y[start:start + int(round(duration * native_sr))])
+        if sr and sr != native_sr:
+            y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type='soxr_hq')
+        return y, sr or native_sr
+
+    @staticmethod
+    def estimate_bpm(y, sr, mode='accurate', max_seconds=None):
+        if max_seconds:
+            y = y[:int(max_seconds * sr)]
+        if mode == 'fast':
+            return AudioProcessor.estimate_bpm_fast(y, sr)
         tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        return float(tempo)
+        return float(np.atleast_1d(tempo)[0])
+
+    @staticmethod
+    def estimate_bpm_fast(y, sr):
+        if sr > FAST_TEMPO_SR:
+            y = librosa.resample(y, orig_sr=sr, target_sr=FAST_TEMPO_SR, res_type='soxr_qq')
+            sr = FAST_TEMPO_SR
+        env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=FAST_TEMPO_HOP)
+        if not env.any():
+            return 0.0  # silence
+        # Autocorrelation tempogram + log-normal prior; no dynamic-programming beat tracking
+        tempo = librosa.feature.tempo(onset_envelope=env, sr=sr, hop_length=FAST_TEMPO_HOP)
+        return float(np.atleast_1d(tempo)[0])
+
+    @staticmethod
+    def estimate_noise_profile(y, sr, max_seconds=STREAM_ANALYSIS_SECONDS):
+        # Per-bin magnitude (dB) of the quietest frames in the opening section
+        y = y[:int(max_seconds * sr)]
+        spec = np.abs(librosa.stft(y, n_fft=NOISE_PROFILE_N_FFT))
+        profile = librosa.amplitude_to_db(np.percentile(spec, NOISE_PROFILE_PERCENTILE, axis=1))
+        return np.round(profile, 2).tolist()
+
+    @staticmethod
+    def analysis_copy(y, sr, analysis_sr=None):
+        """(y, sr) downsampled to analysis_sr for tempo analysis; never upsampled, and the render path keeps y."""
+        if not analysis_sr or analysis_sr >= sr:
+            return y, sr
+        return librosa.resample(np.asarray(y), orig_sr=sr, target_sr=analysis_sr, res_type=ANALYSIS_RES_TYPE), analysis_sr
 
     @staticmethod
-    def reduce_noise(y, sr, strength):
-        # basic spectral gating
-        # Estimate noise profile using the first 0.5 seconds
-        n_samples = int(0.5 * sr)
-        noise_clip = y[:max(1, n_samples)]
-        reduced = nr.reduce_noise(y=y, y_noise=noise_clip, sr=sr, prop_decrease=strength, stationary=False)
-        return reduced
+    def analyze(y, sr, duration_seconds=None, tempo_mode='accurate', tempo_max_seconds=None, analysis_sr=None):
+        """Tempo, beats and noise profile of a native-rate signal.
+
+        Tempo and beats are found on a copy at `analysis_sr` (beat_frames are converted back to
+        hop-512 frames at `sr`). The noise profile stays at the native rate: it sets the
+        thresholds of the render-rate spectral gate, including the band above the analysis Nyquist.
+        """
+        if duration_seconds is None:
+            duration_seconds = len(y) / float(sr)
+        y_tempo = y[:int(tempo_max_seconds * sr)] if tempo_max_seconds else y
+        y_tempo, tempo_sr = AudioProcessor.analysis_copy(y_tempo, sr, analysis_sr)
+        if tempo_mode == 'fast':
+            bpm, beats = AudioProcessor.estimate_bpm_fast(y_tempo, tempo_sr), []  # no beat tracking in fast mode
+        else:
+            tempo, beats = librosa.beat.beat_track(y=y_tempo, sr=tempo_sr)
+            bpm = float(np.atleast_1d(tempo)[0])
+        return {
+            'bpm': bpm,
+            'beat_frames': [int(round(b * sr / tempo_sr)) for b in beats],
+            'duration_seconds': duration_seconds,
+            'sr': sr,
+            'noise_profile': AudioProcessor.estimate_noise_profile(y, sr),
+            'tempo_mode': tempo_mode,
+            'analysis_sr': tempo_sr,
+        }
 
     @staticmethod
-    def time_stretch_to_bpm(y, sr, current_bpm, target_bpm):
-        if not target_bpm or current_bpm <= 0:
+    def analyze_file(input_path, params: ProcessParams, content_hash=None):
+        """analyze() of a stored file as a full render with `params` would run it (on the opening excerpt of long inputs).
+
+        Decodes through the PCM cache when `content_hash` is given, so the first job skips the decode too.
+        """
+        source = pcm_cache.source(input_path, content_hash)
+        options = dict(tempo_mode=params.tempo_mode, tempo_max_seconds=params.tempo_max_seconds,
+                       analysis_sr=params.analysis_sr)
+        if AudioProcessor.use_streaming(source, params):
+            excerpt, sr = read_excerpt(source, STREAM_ANALYSIS_SECONDS)
+            return AudioProcessor.analyze(excerpt, sr, duration_seconds=audio_info(source)[1] / float(sr), **options)
+        y, sr = AudioProcessor.load_audio(source)
+        return AudioProcessor.analyze(y, sr, **options)
+
+    @staticmethod
+    def reduce_noise(y, sr, strength, mode='accurate', noise_clip=None, noise_profile=None):
+        """Spectral gating. 'fast' gates against `noise_profile` (estimated from y when not given)."""
+        if strength <= 0:
             return y
-        rate = target_bpm / current_bpm
-        return librosa.effects.time_stretch(y, rate)
+        if noise_clip is None:
+            # Noise reference for the non-stationary gate: the first 0.5 seconds
+            noise_clip = y[:max(1, int(0.5 * sr))]
+        if mode == 'fast' and noise_profile is None:
+            noise_profile = AudioProcessor.estimate_noise_profile(y, sr)
+        return denoiser.reduce_noise(y, sr, strength, mode=mode, noise_clip=noise_clip, noise_profile=noise_profile)
+
+    @staticmethod
+    def stored_noise_profile(analysis, sr):
+        """The analysis' noise profile if it is usable at `sr` (profile bins are sr-relative)."""
+        if isinstance(analysis, dict) and analysis.get('noise_profile') and analysis.get('sr') == sr:
+            return analysis['noise_profile']
+        return None
+
+    @staticmethod
+    def time_stretch_to_bpm(y, sr, current_bpm, target_bpm, engine='phase_vocoder'):
+        return time_stretch(y, sr, stretch_rate(current_bpm, target_bpm), engine)
+
+    @staticmethod
+    def prepare_drum_loop(sr, target_bpm, loop_path=DEFAULT_DRUM_LOOP, style=None, engine='phase_vocoder'):
+        # A banked style starts from its nearest pre-rendered tempo; otherwise the single default loop
+        if style:
+            loop_path = drum_bank.nearest(style, sr, target_bpm) or loop_path
+        return drum_loop_cache.get(sr, target_bpm, loop_path, engine)
 
     @staticmethod
-    def add_drum_loop(y, sr, target_bpm, mix=0.4, loop_path=DEFAULT_DRUM_LOOP):
+    def render_drum_loop(sr, target_bpm, loop_path=DEFAULT_DRUM_LOOP, engine='phase_vocoder'):
         if not os.path.exists(loop_path):
-            return y  # fail silently if missing asset
+            return None
+        if is_variant(loop_path):
+            return AudioProcessor.fit_drum_variant(*DrumBank.load(loop_path), sr, target_bpm, engine)
 
         drum_y, drum_sr = librosa.load(loop_path, sr=sr, mono=True)
         drum_bpm = AudioProcessor.estimate_bpm(drum_y, sr)
-        if target_bpm:
-            rate = target_bpm / drum_bpm if drum_bpm > 0 else 1.0
-            drum_y = librosa.effects.time_stretch(drum_y, rate)
+        return AudioProcessor.time_stretch_to_bpm(drum_y, sr, drum_bpm, target_bpm, engine)
+
+    @staticmethod
+    def fit_drum_variant(drum_y, variant_sr, variant_bpm, sr, target_bpm, engine='phase_vocoder'):
+        """Bring a drum bank variant to `target_bpm` at `sr`.
 
-        # Tile drum to cover track duration
-        times = int(np.ceil(len(y) / len(drum_y)))
-        drum_tiled = np.tile(drum_y, times)[:len(y)]
+        Within DRUM_BANK_MAX_RESIDUAL the residual is a single resample, which also converts the
+        rate. That is varispeed, so pitch moves with tempo by 1200 * log2(rate) cents: about 13
+        cents for the worst residual of the default 1.5% grid, and up to about 34 cents at the 2%
+        cap. Further away, e.g. outside the grid, it falls back to a pitch-preserving stretch with
+        `engine`.
+        """
+        rate = stretch_rate(variant_bpm, target_bpm)
+        if abs(rate - 1.0) > DRUM_BANK_MAX_RESIDUAL:
+            drum_y = time_stretch(np.asarray(drum_y), variant_sr, rate, engine)
+            rate = 1.0
+        if rate == 1.0 and variant_sr == sr:
+            return drum_y  # the memmap itself
+        return librosa.resample(np.asarray(drum_y), orig_sr=variant_sr, target_sr=sr / rate, res_type='soxr_hq')
 
-        # Mix with given ratio
-        y_max = np.max(np.abs(y)) or 1.0
-        drum_max = np.max(np.abs(drum_tiled)) or 1.0
-        y_norm = y / y_max
-        drum_norm = drum_tiled / drum_max
-        mixed = (1 - mix) * y_norm + mix * drum_norm
+    @staticmethod
+    def add_drum_loop(y, sr, target_bpm, mix=0.4, loop_path=DEFAULT_DRUM_LOOP, engine='phase_vocoder'):
+        drum_y = AudioProcessor.prepare_drum_loop(sr, target_bpm, loop_path, engine=engine)
+        return AudioProcessor.mix_drum_loop(y, drum_y, mix)
 
-        # Normalize to prevent clipping
-        mixed = mixed / (np.max(np.abs(mixed)) or 1.0) * 0.9
-        return mixed
+    @staticmethod
+    def mix_drum_loop(y, drum_y, mix=0.4, out=None):
+        if drum_y is None:
+            return y  # fail silently if missing asset
+        # Loop read by modular index into one float32 buffer; peak-normalised inputs, output at 0.9 peak
+        return mix_loop(y, drum_y, mix, out=out)
 
     @staticmethod
-    def export_audio(y, sr, output_path, export_format='mp3'):
-        if export_format.lower() == 'wav':
-            sf.write(output_path, y, sr)
-            return output_path
+    def export_audio(y, sr, output, export_format='mp3'):
+        # `output` is a path or a binary file-like object; PCM is encoded in chunks (MP3/OGG/Opus need ffmpeg)
+        return encode_pcm(y, sr, output, export_format)
 
-        # Export mp3 via pydub (requires ffmpeg installed)
-        tmp_wav = output_path.replace('.mp3', '.wav')
-        sf.write(tmp_wav, y, sr)
-        seg = AudioSegment.from_wav(tmp_wav)
-        seg.export(output_path, format='mp3', bitrate='192k')
-        os.remove(tmp_wav)
-        return output_path
+    @staticmethod
+    def use_streaming(input_path, params: ProcessParams):
+        if params.streaming is not None:
+            return bool(params.streaming)
+        try:
+            sr, frames = audio_info(input_path)
+        except RuntimeError:
+            return False  # not readable block-wise (e.g. m4a), decode whole
+        return frames >= STREAM_MIN_SECONDS * sr
 
     @staticmethod
-    def process(input_path, output_path, params: ProcessParams):
-        y, sr = AudioProcessor.load_audio(input_path)
-        base_bpm = AudioProcessor.estimate_bpm(y, sr)
+    def process(input_path, output_path, params: ProcessParams, analysis=None, content_hash=None, checkpoints=None,
+                on_stage=None):
+        """Render input_path to output_path (a path or a writable binary file object).
 
-        # 1) Noise reduction
-        y = AudioProcessor.reduce_noise(y, sr, params.noise_reduction_strength)
+        `analysis` is a previous analyze() result for the same content; when given,
+        BPM estimation is skipped. With the upload's `content_hash`, audio is read from the
+        decoded-PCM cache (decoding into it on a miss). With `checkpoints`, analysis, denoise
+        and stretch outputs are saved as they finish and restored on a rerun (not for previews).
+        The returned meta carries the analysis used (None for previews, which only see part
+        of the track) and a per-stage `timings` breakdown (see StageTimer, which calls `on_stage`
+        with each stage's name as it starts).
+        """
+        timer = StageTimer(on_stage)
+        with timer.stage('decode'):
+            input_path = pcm_cache.source(input_path, content_hash)
+        if params.preview:
+            return AudioProcessor.process_preview(input_path, output_path, params, analysis=analysis, timer=timer)
+        if AudioProcessor.use_streaming(input_path, params):
+            return AudioProcessor.process_streaming(input_path, output_path, params, analysis=analysis, timer=timer,
+                                                    checkpoints=checkpoints)
 
-        # 2) BPM/Time stretch
-        y = AudioProcessor.time_stretch_to_bpm(y, sr, base_bpm, params.target_bpm)
-        final_bpm = params.target_bpm or base_bpm
+        with timer.stage('load'):
+            y, sr = AudioProcessor.load_audio(input_path)
+        if analysis is None:
+            analysis = lambda: AudioProcessor.analyze(
+                y, sr, tempo_mode=params.tempo_mode, tempo_max_seconds=params.tempo_max_seconds,
+                analysis_sr=params.analysis_sr)
+
+        # Denoise -> stretch -> drums, concurrently with analysis and drum-loop prep
+        y, analysis = AudioProcessor.render_stages(y, sr, params, analysis, timer, checkpoints)
+        final_bpm = params.target_bpm or analysis['bpm']
 
-        # 3) Optional drum overlay
+        # Export, plus the waveform peaks of what was exported
+        with timer.stage('encode'):
+            AudioProcessor.export_audio(y, sr, output_path, params.export_format)
+        with timer.stage('peaks'):
+            peaks = build_peaks(y, sr)
+
+        return {
+            'duration_seconds': len(y) / float(sr),
+            'bpm': float(final_bpm),
+            'sr': sr,
+            'analysis': analysis,
+            'peaks': peaks,
+            'timings': timer.as_list(),
+        }
+
+    @staticmethod
+    def render_stages(y, sr, params: ProcessParams, analysis, timer=None, checkpoints=None):
+        """Denoise, stretch and drum-mix a loaded signal as a stage graph; returns (y, analysis).
+
+        `analysis` is a dict, or a callable producing one that runs as the 'analyze' stage.
+        Analysis overlaps with denoising, and drum-loop prep with the track's own chain
+        (it only waits for analysis when the target tempo comes from the detected BPM).
+        Stages restored from `checkpoints` are skipped, along with whatever only fed them.
+        """
+        graph = StageGraph(timer, checkpoints)
+        if callable(analysis):
+            graph.add('analyze', analysis)
+        else:
+            graph.provide('analyze', analysis)
+        graph.add('denoise', lambda: AudioProcessor.reduce_noise(
+            y, sr, params.noise_reduction_strength, mode=params.denoise_mode,
+            noise_profile=AudioProcessor.stored_noise_profile(analysis, sr)))
+        graph.add('stretch', lambda denoised, a: AudioProcessor.time_stretch_to_bpm(
+            denoised, sr, a['bpm'], params.target_bpm, params.stretch_engine), after=('denoise', 'analyze'))
+        out = 'stretch'
         if params.add_drums:
-            y = AudioProcessor.add_drum_loop(y, sr, final_bpm, params.drum_mix)
+            if params.target_bpm:
+                graph.add('drum_loop', lambda: AudioProcessor.prepare_drum_loop(
+                    sr, params.target_bpm, style=params.drum_style, engine=params.stretch_engine))
+            else:
+                graph.add('drum_loop', lambda a: AudioProcessor.prepare_drum_loop(
+                    sr, a['bpm'], style=params.drum_style, engine=params.stretch_engine), after=('analyze',))
+            graph.add('drums', lambda stretched, drum_y: AudioProcessor.mix_drum_loop(
+                stretched, drum_y, params.drum_mix), after=('stretch', 'drum_loop'))
+            out = 'drums'
+        results = stage_executor.run(graph, targets=(out, 'analyze'))
+        return results[out], results['analyze']
 
-        # 4) Export
-        AudioProcessor.export_audio(y, sr, output_path, params.export_format)
+    @staticmethod
+    def find_loudest_window(input_path, window_seconds):
+        """Start time (s) of the loudest `window_seconds` span, scanned block-wise in bounded memory."""
+        try:
+            sr, _ = audio_info(input_path)
+            hop = max(1, int(PREVIEW_SCAN_HOP_SECONDS * sr))
+            energy = np.array([float(np.dot(b, b)) for b in iter_blocks(input_path, hop)])
+        except RuntimeError:
+            y, sr = librosa.load(input_path, sr=None, mono=True)
+            hop = max(1, int(PREVIEW_SCAN_HOP_SECONDS * sr))
+            n = len(y) // hop * hop
+            energy = np.square(y[:n]).reshape(-1, hop).sum(axis=1)
+        span = max(1, int(round(window_seconds / PREVIEW_SCAN_HOP_SECONDS)))
+        if len(energy) <= span:
+            return 0.0
+        totals = np.convolve(energy, np.ones(span), mode='valid')
+        return float(np.argmax(totals) * hop / sr)
 
+    @staticmethod
+    def process_preview(input_path, output_path, params: ProcessParams, analysis=None, timer=None):
+        """Render only `preview_seconds` around the loudest section at `preview_sr`, for quick auditioning."""
+        timer = timer or StageTimer()
+        with timer.stage('scan'):
+            start = AudioProcessor.find_loudest_window(input_path, params.preview_seconds)
+        with timer.stage('load'):
+            y, sr = AudioProcessor.load_window(input_path, params.preview_sr, start, params.preview_seconds)
+        if not analysis:
+            analysis = lambda: {'bpm': AudioProcessor.estimate_bpm(y, sr, mode='fast')}
+        y, analysis = AudioProcessor.render_stages(y, sr, params, analysis, timer)
+        final_bpm = params.target_bpm or analysis['bpm']
+
+        fade = min(len(y) // 2, int(PREVIEW_FADE_SECONDS * sr))
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=y.dtype)
+            y[:fade] *= ramp
+            y[-fade:] *= ramp[::-1]
+
+        with timer.stage('encode'):
+            AudioProcessor.export_audio(y, sr, output_path, params.export_format)
         return {
             'duration_seconds': len(y) / float(sr),
             'bpm': float(final_bpm),
-            'sr': sr
-        }
\ No newline at end of file
+            'sr': sr,
+            'analysis': None,
+            'preview_window': [start, start + params.preview_seconds],
+            'timings': timer.as_list(),
+        }
+
+    @staticmethod
+    def process_streaming(input_path, output_path, params: ProcessParams, analysis=None, timer=None,
+                          block_seconds=STREAM_BLOCK_SECONDS, overlap_seconds=STREAM_OVERLAP_SECONDS,
+                          checkpoints=None):
+        """Block-wise equivalent of process(); peak memory depends on block size, not track length.
+
+        Without a stored `analysis`, BPM is estimated on the first STREAM_ANALYSIS_SECONDS. Blocks overlap by `overlap_seconds`
+        and are crossfaded after denoise/stretch. With drums, the stretched signal is spilled to a
+        scratch file so the global peaks used by mix_drum_loop's normalisation can be found first.
+        With `checkpoints`, the stretched signal is spilled either way and kept as the 'stretch' checkpoint.
+        """
+        timer = timer or StageTimer()
+        with timer.stage('load'):
+            excerpt, sr = read_excerpt(input_path, STREAM_ANALYSIS_SECONDS)
+
+        # Analysis and drum-loop prep overlap unless the drum tempo comes from the analysis
+        graph = StageGraph(timer, checkpoints)
+        if analysis is None:
+            graph.add('analyze', lambda: AudioProcessor.analyze(
+                excerpt, sr, duration_seconds=audio_info(input_path)[1] / float(sr),
+                tempo_mode=params.tempo_mode, tempo_max_seconds=params.tempo_max_seconds,
+                analysis_sr=params.analysis_sr))
+        else:
+            graph.provide('analyze', analysis)
+        if params.add_drums:
+            if params.target_bpm:
+                graph.add('drum_loop', lambda: AudioProcessor.prepare_drum_loop(
+                    sr, params.target_bpm, style=params.drum_style, engine=params.stretch_engine))
+            else:
+                graph.add('drum_loop', lambda a: AudioProcessor.prepare_drum_loop(
+                    sr, a['bpm'], style=params.drum_style, engine=params.stretch_engine), after=('analyze',))
+        results = stage_executor.run(graph)
+        analysis = results['analyze']
+        drum_y = results.get('drum_loop')
+        base_bpm = analysis['bpm']
+        noise_clip = excerpt[:max(1, int(0.5 * sr))].copy()
+        noise_profile = AudioProcessor.stored_noise_profile(analysis, sr)
+        if noise_profile is None and params.denoise_mode == 'fast':
+            noise_profile = AudioProcessor.estimate_noise_profile(excerpt, sr)  # once, not per block
+        del excerpt
+
+        final_bpm = params.target_bpm or base_bpm
+        rate = stretch_rate(base_bpm, params.target_bpm)
+        block = max(1, int(block_seconds * sr))
+        overlap = min(block - 1, int(overlap_seconds * sr))
+        hold = int(round(overlap / rate))
+        out_length = int(round(audio_info(input_path)[1] / rate))  # what time_stretch gives the whole track
+
+        def render_blocks():
+            joiner = OverlapJoiner(splice=int(STREAM_SPLICE_SECONDS * sr) if rate != 1.0 else None)
+            blocks = iter_blocks(input_path, block, overlap)
+            emitted = 0
+            while True:
+                with timer.stage('load'):
+                    chunk = next(blocks, None)
+                if chunk is None:
+                    break
+                with timer.stage('denoise'):
+                    chunk = AudioProcessor.reduce_noise(
+                        chunk, sr, params.noise_reduction_strength, mode=params.denoise_mode,
+                        noise_clip=noise_clip, noise_profile=noise_profile)
+                if rate != 1.0:
+                    with timer.stage('stretch'):
+                        chunk = time_stretch(chunk, sr, rate, params.stretch_engine)
+                out = joiner.push(chunk, hold)
+                emitted += len(out)
+                yield out
+            # Each block's stretched length is rounded on its own; end where the whole-track stretch would
+            yield librosa.util.fix_length(joiner.flush(), size=max(0, out_length - emitted))
+
+        # A checkpointed stretch means only mixing and encoding are left
+        stretched = checkpoints.load('stretch') if checkpoints else None
+        if stretched is not None:
+            rendered = (np.asarray(stretched[i:i + block]) for i in range(0, len(stretched), block))
+        else:
+            rendered = render_blocks()
+        record = checkpoints is not None and stretched is None
+        if record:
+            os.makedirs(checkpoints.directory, exist_ok=True)
+            spill_dir = checkpoints.directory  # same filesystem, so keep_spill can hard-link
+        else:
+            spill_dir = os.path.dirname(output_path) if isinstance(output_path, str) else None
+        peaks = PeakBuilder(sr)
+
+        def emit(out):
+            with timer.stage('encode'):
+                writer.write(out)
+            with timer.stage('peaks'):
+                peaks.push(out)
+
+        def keep(spill):
+            if record:
+                with timer.stage('checkpoint'):
+                    checkpoints.keep_spill('stretch', spill)
+
+        with PCMEncoder(output_path, sr, params.export_format) as writer:
+            if drum_y is None:
+                with SpillBuffer(dir=spill_dir) if record else nullcontext() as spill:
+                    for out in rendered:
+                        if record:
+                            with timer.stage('checkpoint'):
+                                spill.write(out)
+                        emit(out)
+                    keep(spill)
+            else:
+                with SpillBuffer(dir=spill_dir or None) as spill:
+                    for out in rendered:
+                        with timer.stage('spill'):
+                            spill.write(out)
+                    keep(spill)
+                    mixer = LoopMixer(drum_y, params.drum_mix, spill.peak, peak(drum_y[:spill.length]))
+                    out = np.empty(block, dtype=np.float32)
+
+                    def mixed_blocks():
+                        for start, chunk in spill.blocks(block):
+                            with timer.stage('drums'):
+                                mixed = mixer.mix_into(out[:len(chunk)], chunk, start)
+                            yield mixed
+
+                    for _ in mixed_blocks():
+                        pass  # the first pass only finds the mix peak
+                    scale = np.float32(HEADROOM / (mixer.peak or 1.0))
+                    for mixed in mixed_blocks():
+                        mixed *= scale
+                        emit(mixed)
+            with timer.stage('encode'):
+                writer.close()  # waits for ffmpeg to drain
+            frames = writer.frames
+
+        return {
+            'duration_seconds': frames / float(sr),
+            'bpm': float(final_bpm),
+            'sr': sr,
+            'analysis': analysis,
+            'peaks': peaks.to_bytes(),
+            'timings': timer.as_list(),
+        }
+
+    @staticmethod
+    def compute_peaks(input_path, content_hash=None):
+        """Peak pyramid bytes for a stored file, read block-wise where possible (via the PCM cache when hashed)."""
+        source = pcm_cache.source(input_path, content_hash)
+        try:
+            sr, _ = audio_info(source)
+        except RuntimeError:
+            y, sr = AudioProcessor.load_audio(source)
+            return build_peaks(y, sr)
+        builder = PeakBuilder(sr)
+        for block in iter_blocks(source, int(STREAM_BLOCK_SECONDS * sr)):
+            builder.push(block)
+        return builder.to_bytes()
+
+
+drum_loop_cache = DrumLoopCache(AudioProcessor.render_drum_loop)
+stage_executor = StageExecutor()
+denoiser = DenoiseEngine()
+drum_bank = DrumBank()
+# Disabled until init_render_worker gives it a root
+pcm_cache = PCMCache(AudioProcessor.load_audio, block_decode_seconds=STREAM_MIN_SECONDS)
+
+
+def init_render_worker(max_entries, max_bytes, warm_specs=(), stage_mode=None, stage_threads=None,
+                       pcm_root=None, pcm_max_bytes=None, denoise_jobs=None, denoise_executor=None, drum_bank_dir=None):
+    """Initializer for render pool processes: size the caches, pre-render common loops, pick the stage mode."""
+    drum_loop_cache.configure(max_entries=max_entries, max_bytes=max_bytes)
+    stage_executor.configure(mode=stage_mode, max_workers=stage_threads)
+    denoiser.configure(jobs=denoise_jobs, executor=denoise_executor)
+    drum_bank.configure(root=drum_bank_dir)
+    pcm_cache.configure(root=pcm_root, max_bytes=pcm_max_bytes)
+    drum_loop_cache.warm(warm_specs, DEFAULT_DRUM_LOOP)
+
+
+def render(input_path, output_path, params: ProcessParams, analysis=None, capture_profile=False,
+           content_hash=None, checkpoint_dir=None, on_stage=None):
+    """AudioProcessor.process, optionally under cProfile; the stats come back as meta['profile_stats'].
+
+    With `checkpoint_dir`, finished stages are checkpointed there and a rerun resumes from them.
+    """
+    checkpoints = Checkpoints(checkpoint_dir) if checkpoint_dir and not params.preview else None
+    if not capture_profile:
+        return AudioProcessor.process(input_path, output_path, params, analysis=analysis, content_hash=content_hash,
+                                      checkpoints=checkpoints, on_stage=on_stage)
+    meta, stats = run_profiled(AudioProcessor.process, input_path, output_path, params, analysis=analysis,
+                               content_hash=content_hash, checkpoints=checkpoints, on_stage=on_stage)
+    meta['profile_stats'] = stats
+    return meta
+
+
+def render_file(input_path, output_path, params: dict, analysis=None, capture_profile=False, content_hash=None):
+    """Picklable pool entry point: pure render, no Django access."""
+    return render(input_path, output_path, ProcessParams(**params), analysis=analysis,
+                  capture_profile=capture_profile, content_hash=content_hash)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from music.models import Track
+from . import waveforms
+from .models import TrackAnalysis
+from .pcm import PCMCache
+
+
+def decoded_hash(track_id, content_hash):
+    """Content hash the PCM cache holds for a track's upload, if any is known.
+
+    Never hashes the file: these handlers run in web requests. A decode whose hash was never
+    recorded is left to the PCM cache's own size-based eviction.
+    """
+    if content_hash:
+        return content_hash
+    return TrackAnalysis.objects.filter(track_id=track_id).values_list('content_hash', flat=True).first()
+
+
+def discard_decoded(track_id, content_hash):
+    """Drop the cached decode of a track's upload, unless another track (or its analysis) has the same content."""
+    if not content_hash:
+        return
+    if Track.objects.filter(content_hash=content_hash).exclude(pk=track_id).exists() or \
+            TrackAnalysis.objects.filter(content_hash=content_hash).exclude(track_id=track_id).exists():
+        return
+    PCMCache(root=settings.AI_ENGINE_PCM_CACHE_DIR).discard(content_hash)
+
+
+@receiver(post_init, sender=Track)
+@receiver(post_save, sender=Track)
+def remember_upload(sender, instance, **kwargs):
+    """Note the upload the row holds, so saving can tell it is unchanged without reading the row again."""
+    name = instance.__dict__.get('original_file')  # not the attribute: reading a deferred field would query for it
+    instance._saved_upload = getattr(name, 'name', name)
+
+
+@receiver(pre_save, sender=Track)
+def invalidate_replaced_upload(sender, instance, update_fields=None, **kwargs):
+    instance._original_changed = False
+    if update_fields is not None and 'original_file' not in update_fields:
+        return
+    if instance._state.adding:
+        instance._original_changed = True
+        return
+    if getattr(instance, '_saved_upload', None) == instance.original_file.name:
+        return
+    # Replaced, or loaded without original_file or since refreshed: the row says which
+    previous = Track.objects.filter(pk=instance.pk).values_list('original_file', 'content_hash').first()
+    if previous is not None and previous[0] == instance.original_file.name:
+        return
+    instance._original_changed = True
+    if previous is None:
+        return
+    previous_name, previous_hash = previous
+    if instance.content_hash == previous_hash:
+        instance.content_hash = ''  # the new upload's hash isn't known yet
+    waveforms.discard([previous_name])
+    if settings.AI_ENGINE_PCM_CACHE_DIR:
+        discard_decoded(instance.pk, decoded_hash(instance.pk, previous_hash))
+
+
+@receiver(post_save, sender=Track)
+def queue_upload_peaks(sender, instance, **kwargs):
+    # Waveforms for tracks that are uploaded but never processed too (unless something else computes them)
+    if getattr(instance, '_original_changed', False) and instance.original_file \
+            and not getattr(instance, 'skip_upload_peaks', False):
+        waveforms.request_generation(instance, 'original')
+
+
+@receiver(pre_delete, sender=Track)
+def resolve_deleted_upload(sender, instance, **kwargs):
+    # While the track's analysis, deleted along with it, can still be read
+    if settings.AI_ENGINE_PCM_CACHE_DIR:
+        instance._decoded_hash = decoded_hash(instance.pk, instance.content_hash)
+
+
+@receiver(post_delete, sender=Track)
+def invalidate_deleted_upload(sender, instance, **kwargs):
+    waveforms.discard([instance.original_file.name])
+    if settings.AI_ENGINE_PCM_CACHE_DIR:
+        discard_decoded(instance.pk, getattr(instance, '_decoded_hash', instance.content_hash))
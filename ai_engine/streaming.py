@@ -0,0 +1,130 @@
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+from .mixing import peak
+from .pcm import is_pcm, load_pcm, pcm_info
+
+
+def to_mono(frames):
+    # Same reduction as librosa.to_mono on librosa.load's transposed read, so results match bit for bit
+    return frames.T.mean(axis=0) if frames.shape[1] > 1 else frames[:, 0]
+
+
+def audio_info(path):
+    """Return (sr, frames) without decoding; raises RuntimeError for formats libsndfile can't read."""
+    if is_pcm(path):
+        return pcm_info(path)
+    info = sf.info(path)
+    return info.samplerate, info.frames
+
+
+def iter_blocks(path, block_size, overlap=0, start=0, stop=None):
+    """Yield mono float32 blocks; each block repeats the last `overlap` samples of the previous one."""
+    if is_pcm(path):
+        y, _ = load_pcm(path)
+        stop = len(y) if stop is None else min(stop, len(y))
+        pos = start
+        while pos < stop:
+            yield np.array(y[pos:min(pos + block_size, stop)])
+            if pos + block_size >= stop:
+                break
+            pos += block_size - overlap
+        return
+    with sf.SoundFile(path) as f:
+        f.seek(start)
+        frames = -1 if stop is None else max(0, stop - start)
+        for block in f.blocks(blocksize=block_size, overlap=overlap, frames=frames,
+                              dtype='float32', always_2d=True):
+            yield to_mono(block)
+
+
+def read_excerpt(path, seconds):
+    """Read at most the first `seconds` of a file as mono float32."""
+    if is_pcm(path):
+        y, sr = load_pcm(path)
+        return np.array(y[:int(seconds * sr)]), sr
+    sr, frames = audio_info(path)
+    stop = min(frames, int(seconds * sr))
+    y, _ = sf.read(path, frames=stop, dtype='float32', always_2d=True)
+    return to_mono(y), sr
+
+
+class OverlapJoiner:
+    """Stitches processed blocks by crossfading each block's head into the tail held back from the previous one.
+
+    By default the crossfade spans the whole tail. With `splice` (in samples) it is that short and
+    centred in the tail: independently stretched blocks aren't phase-aligned, and across a long
+    crossfade their partials partly cancel, audibly dipping the level at every seam.
+    """
+
+    def __init__(self, splice=None):
+        self.splice = splice
+        self._tail = None
+
+    def push(self, y, hold):
+        y = np.asarray(y, dtype=np.float32)
+        if self._tail is not None and len(self._tail):
+            n = min(len(self._tail), len(y))
+            length = n if self.splice is None else min(int(self.splice), n)
+            start = (n - length) // 2
+            fade = np.linspace(0.0, 1.0, length, dtype=np.float32)
+            y = y.copy()
+            y[:start] = self._tail[:start]
+            y[start:start + length] = self._tail[start:start + length] * (1.0 - fade) + y[start:start + length] * fade
+        hold = max(0, min(int(hold), len(y)))
+        split = len(y) - hold
+        self._tail = y[split:].copy()
+        return y[:split]
+
+    def flush(self):
+        tail, self._tail = self._tail, None
+        return tail if tail is not None else np.zeros(0, dtype=np.float32)
+
+
+class SpillBuffer:
+    """Append-only float32 scratch file on disk, read back through a memory map."""
+
+    def __init__(self, dir=None):
+        fd, self.path = tempfile.mkstemp(suffix='.f32', dir=dir)
+        self._fh = os.fdopen(fd, 'wb')
+        self.length = 0
+        self.peak = 0.0
+
+    def write(self, y):
+        if not len(y):
+            return
+        y = np.asarray(y, dtype=np.float32)
+        self.peak = max(self.peak, peak(y))
+        self._fh.write(y.tobytes())
+        self.length += len(y)
+
+    def blocks(self, block_size):
+        self._fh.flush()
+        if not self.length:
+            return
+        data = np.memmap(self.path, dtype=np.float32, mode='r', shape=(self.length,))
+        for start in range(0, self.length, block_size):
+            yield start, np.asarray(data[start:start + block_size])
+        del data
+
+    def persist(self, path):
+        """Keep what has been written at `path` as well; a hard link, so the scratch file can still go on close."""
+        self._fh.flush()
+        tmp = f'{path}.part'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        os.link(self.path, tmp)
+        os.replace(tmp, path)
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,52 +1,319 @@
 from celery import shared_task
+from celery.signals import worker_process_init
 from django.utils import timezone
-from django.core.files.base import File
-from django.core.files import File as DjangoFile
 from django.conf import settings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+import logging
+import multiprocessing
 import os
-import uuid
-from .services import AudioProcessor, ProcessParams
-from music.models import ProcessingJob, Track
+from .jobs import JobEventLog, JobStageLog, JobStateBuffer, open_job_output, plan_job, publish_output, record_render, stage_path
+from . import checkpoints, events, metrics, results, scheduling, waveforms
+from .models import TrackAnalysis
+from .params import ProcessParams
+from music.models import JobEvent, ProcessingJob, Track
 
-@shared_task(bind=True)
+logger = logging.getLogger(__name__)
+
+# The audio engine (.services, .drums: numpy/librosa/numba/noisereduce) is imported inside the
+# task bodies and worker hooks, never at module level: web processes import this module to
+# enqueue tasks and must not pay for the scientific stack. See `benchmark_audio webimport`.
+
+
+def render_worker_settings(denoise_jobs=None):
+    """Arguments for services.init_render_worker."""
+    from .drums import parse_warm_specs
+    return (
+        settings.AI_ENGINE_DRUM_CACHE_SIZE,
+        settings.AI_ENGINE_DRUM_CACHE_MAX_MB * 1024 * 1024,
+        parse_warm_specs(settings.AI_ENGINE_DRUM_PREWARM),
+        settings.AI_ENGINE_STAGE_MODE,
+        settings.AI_ENGINE_STAGE_THREADS,
+        settings.AI_ENGINE_PCM_CACHE_DIR,
+        settings.AI_ENGINE_PCM_CACHE_MAX_MB * 1024 * 1024,
+        settings.AI_ENGINE_DENOISE_JOBS if denoise_jobs is None else denoise_jobs,
+        settings.AI_ENGINE_DENOISE_EXECUTOR,
+        settings.AI_ENGINE_DRUM_BANK_DIR,
+    )
+
+
+@worker_process_init.connect
+def prewarm_drum_loops(**kwargs):
+    from .services import init_render_worker
+    init_render_worker(*render_worker_settings())
+
+def checkpoint_dir(job, plan):
+    root = settings.AI_ENGINE_CHECKPOINT_DIR
+    if not root or job.is_preview or job.capture_profile:
+        return None
+    return checkpoints.job_dir(root, job.id, plan.cache_key)
+
+
+def discard_checkpoints(job):
+    root = settings.AI_ENGINE_CHECKPOINT_DIR
+    if root:
+        checkpoints.discard(root, job.id)
+        checkpoints.sweep(root, settings.AI_ENGINE_CHECKPOINT_TTL_HOURS * 3600)
+
+
+def release_slot(job):
+    """Let the owner's next held-back job go; the finished job's outcome stands even if that fails."""
+    try:
+        scheduling.release(job)
+    except Exception:
+        logger.warning('Could not dispatch held jobs of user %s', job.created_by_id, exc_info=True)
+
+
+# acks_late + reject_on_worker_lost: a job whose worker is killed (e.g. a preempted pod) is
+# redelivered, and like a retry after an error it resumes from the job's stage checkpoints.
+# The soft limit leaves time to retry instead of being killed at the hard one.
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None,
+             soft_time_limit=settings.CELERY_TASK_TIME_LIMIT - 5 * 60)
 def process_track_task(self, job_id: int):
+    from .services import render
+
     job = ProcessingJob.objects.select_related('track').get(id=job_id)
     track = job.track
+    log = JobEventLog()  # flushed at each stage boundary and however the attempt ends
 
     try:
+        job.attempts += 1
+        if job.attempts > 1 + settings.AI_ENGINE_JOB_RETRIES:
+            raise RuntimeError(f'Gave up after {job.attempts - 1} attempts')
         job.state = ProcessingJob.State.RUNNING
         job.progress = 5
-        job.save(update_fields=['state', 'progress'])
-
-        params = ProcessParams(**job.params)
-        export_ext = 'mp3' if params.export_format.lower() == 'mp3' else 'wav'
+        job.started_at = job.started_at or timezone.now()
+        job.save(update_fields=['state', 'progress', 'started_at', 'attempts'])
+        events.publish_job(job)
+        log.add(job, f'Attempt {job.attempts} started', metrics={'attempt': job.attempts})
+        log.flush()
 
-        output_dir = os.path.join(settings.MEDIA_ROOT, 'processed', str(track.owner_id))
-        os.makedirs(output_dir, exist_ok=True)
-        out_path = os.path.join(output_dir, f'{uuid.uuid4()}.{export_ext}')
+        plan = plan_job(job)
+        cached = None if job.capture_profile else results.lookup(plan.cache_key)
+        if cached is not None:
+            job.output_file.name = cached.output_file.name
+            job.mark_done(cached.meta, 'Reused cached result.')
+            log.add_status(job, metrics={'latency_seconds': job.latency_seconds})
+            log.flush()
+            events.publish_job(job)
+            record_latency(job, cached=True)
+            discard_checkpoints(job)
+            release_slot(job)
+            return {'ok': True, 'track_id': track.id, 'cached': True}
 
-        meta = AudioProcessor.process(track.original_file.path, out_path, params)
+        with open_job_output(job, plan.output_name) as out:
+            meta = render(plan.input_path, out, plan.params, analysis=plan.analysis_dict,
+                          capture_profile=job.capture_profile, content_hash=plan.content_hash,
+                          checkpoint_dir=checkpoint_dir(job, plan),
+                          on_stage=JobStageLog(job, log, then=events.JobProgress(job)))
+        record_render(plan, meta)
 
-        with open(out_path, 'rb') as f:
-            job.output_file.save(os.path.basename(out_path), DjangoFile(f), save=True)
-
-        # Update track
-        track.processed_file = job.output_file
-        track.duration_seconds = meta.get('duration_seconds')
-        track.bpm = meta.get('bpm')
-        track.status = Track.Status.PROCESSED
-        track.save(update_fields=['processed_file', 'duration_seconds', 'bpm', 'status'])
-
-        job.progress = 100
-        job.state = ProcessingJob.State.DONE
-        job.finished_at = timezone.now()
-        job.append_log('Processing completed successfully.')
-        job.save(update_fields=['progress', 'state', 'finished_at', 'log'])
+        job.mark_done(meta)
+        log.add_timings(job)
+        log.add_status(job, metrics={'latency_seconds': job.latency_seconds})
+        log.flush()
+        events.publish_job(job)
+        record_latency(job)
+        metrics.record_stages(job.timings, job=job.id, preview=job.is_preview)
+        discard_checkpoints(job)
+        release_slot(job)
         return {'ok': True, 'track_id': track.id}
     except Exception as e:
+        if job.attempts <= settings.AI_ENGINE_JOB_RETRIES:
+            job.set_message(f'Attempt {job.attempts} failed, retrying: {e}')
+            job.save(update_fields=['last_message'])
+            log.add_status(job, level=JobEvent.Level.WARNING, metrics={'attempt': job.attempts})
+            log.flush()
+            events.publish_job(job, message=job.last_message)
+            raise self.retry(exc=e, countdown=settings.AI_ENGINE_JOB_RETRY_DELAY)
         job.state = ProcessingJob.State.FAILED
-        job.append_log(f'ERROR: {e}')
+        job.set_message(f'ERROR: {e}')
         job.finished_at = timezone.now()
-        job.save(update_fields=['state', 'finished_at', 'log'])
-        Track.objects.filter(id=track.id).update(status=Track.Status.FAILED)
-        raise
\ No newline at end of file
+        job.save(update_fields=ProcessingJob.FAILED_FIELDS)  # with attempts: a give-up fails before saving them
+        log.add_status(job, level=JobEvent.Level.ERROR)
+        log.flush()
+        events.publish_job(job)
+        if not job.is_preview:
+            Track.objects.filter(id=track.id).update(status=Track.Status.FAILED)
+        discard_checkpoints(job)
+        release_slot(job)
+        raise
+    finally:
+        log.flush()  # whatever an error path above didn't get to write
+
+
+def record_latency(job, cached=False):
+    kind = 'preview' if job.is_preview else 'full'
+    metrics.record(f'{kind}_latency_seconds', job.latency_seconds, job=job.id, cached=cached, queue=job.queue)
+    if job.started_at:
+        # From submission, so time held back by fair share counts too (fair_share_wait_seconds has that alone)
+        metrics.record(f'{kind}_queue_wait_seconds', (job.started_at - job.created_at).total_seconds(),
+                       job=job.id, queue=job.queue)
+
+
+def batch_pool_size(workers, n_renders):
+    if workers is None:
+        workers = settings.AI_ENGINE_BATCH_WORKERS or os.cpu_count() or 1
+    if multiprocessing.current_process().daemon:
+        workers = 1  # daemonic processes can't have children; render in-process
+    return max(1, min(workers, n_renders))
+
+
+def render_batch(jobs, buffer, workers):
+    """The renders of process_tracks_batch_task; returns (jobs rendered, pool size)."""
+    from .services import init_render_worker, render, render_file
+
+    plans = []
+    for job in jobs:
+        try:
+            plan = plan_job(job)
+            cached = None if job.capture_profile else results.lookup(plan.cache_key)
+            if cached is not None:
+                job.output_file.name = cached.output_file.name
+                buffer.done(job, cached.meta, 'Reused cached result.')
+            else:
+                plans.append(plan)
+        except Exception as e:
+            buffer.failed(job, e)
+
+    def finish(plan, staged, meta):
+        publish_output(plan.job, plan.output_name, staged)
+        record_render(plan, meta)
+        buffer.done(plan.job, meta)
+        metrics.record_stages(plan.job.timings, job=plan.job.id, preview=plan.job.is_preview)
+
+    def fail(plan, staged, error):
+        if os.path.exists(staged):
+            os.remove(staged)
+        buffer.failed(plan.job, error)
+
+    rendered = 0
+    staged = {plan.job.id: stage_path(plan.job.output_file.storage, plan.output_name) for plan in plans}
+    workers = batch_pool_size(workers, len(plans))
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_render_worker,
+            initargs=render_worker_settings(denoise_jobs=1),  # the pool already fills the cores
+        ) as pool:
+            futures = {
+                pool.submit(render_file, plan.input_path, staged[plan.job.id],
+                            asdict(plan.params), plan.analysis_dict, plan.job.capture_profile,
+                            plan.content_hash): plan
+                for plan in plans
+            }
+            for future in as_completed(futures):
+                plan = futures[future]
+                try:
+                    finish(plan, staged[plan.job.id], future.result())
+                    rendered += 1
+                except Exception as e:
+                    fail(plan, staged[plan.job.id], e)
+    else:
+        for plan in plans:
+            try:
+                meta = render(plan.input_path, staged[plan.job.id], plan.params,
+                              analysis=plan.analysis_dict, capture_profile=plan.job.capture_profile,
+                              content_hash=plan.content_hash)
+                finish(plan, staged[plan.job.id], meta)
+                rendered += 1
+            except Exception as e:
+                fail(plan, staged[plan.job.id], e)
+
+    return rendered, workers
+
+
+def abandon_unfinished(jobs):
+    """Fail the jobs a batch left RUNNING (it raised, or was killed by its time limit), so they free their slots."""
+    ids = [job.id for job in jobs]
+    unfinished = ProcessingJob.objects.filter(id__in=ids, state=ProcessingJob.State.RUNNING)
+    track_ids = list(unfinished.filter(is_preview=False).values_list('track_id', flat=True))
+    if unfinished.update(state=ProcessingJob.State.FAILED, finished_at=timezone.now(),
+                         last_message='ERROR: the batch stopped before this job finished'):
+        Track.objects.filter(id__in=track_ids).update(status=Track.Status.FAILED)
+
+
+@shared_task(bind=True)
+def process_tracks_batch_task(self, job_ids: list, workers: int | None = None):
+    """Render many jobs in one invocation, sharing warmed state and writing job state in bulk.
+
+    Cache hits complete without rendering. With more than one worker the renders fan out
+    to a local process pool (one per core by default, AI_ENGINE_BATCH_WORKERS to override);
+    the DB is only touched from this process.
+    """
+    # Only jobs still waiting: one running or finished elsewhere must not be rendered again
+    jobs = list(ProcessingJob.objects.select_related('track').filter(id__in=job_ids, state=ProcessingJob.State.QUEUED))
+    ProcessingJob.objects.filter(id__in=[j.id for j in jobs]).update(
+        state=ProcessingJob.State.RUNNING, progress=5)
+    Track.objects.filter(id__in={j.track_id for j in jobs if not j.is_preview}).update(
+        status=Track.Status.PROCESSING)
+
+    buffer = JobStateBuffer(flush_every=settings.AI_ENGINE_BATCH_FLUSH_EVERY)
+    try:
+        rendered, workers = render_batch(jobs, buffer, workers)
+    finally:
+        buffer.flush()
+        abandon_unfinished(jobs)
+        # As after a single job: each owner's next held-back jobs may go
+        for job in {job.created_by_id: job for job in jobs}.values():
+            release_slot(job)
+    return {'ok': True, 'jobs': len(jobs), 'rendered': rendered, 'workers': workers}
+
+
+@shared_task
+def evict_results_task():
+    """Trim the result cache to its size and age limits; scheduled by CELERY_BEAT_SCHEDULE['evict-results']."""
+    return {'ok': True, 'evicted': len(results.evict())}
+
+
+@shared_task
+def dispatch_held_jobs_task():
+    """Safety net for a lost release (e.g. a worker killed between finishing and dispatching).
+
+    Scheduled by CELERY_BEAT_SCHEDULE['dispatch-held-jobs'].
+    """
+    return {'ok': True, 'dispatched': scheduling.dispatch_all()}
+
+
+@shared_task
+def generate_peaks_task(track_id: int, source: str = 'original'):
+    """Compute waveform peaks for a track's original or processed file, if not already stored."""
+    from .hashing import track_content_hash
+    from .services import AudioProcessor
+
+    track = Track.objects.filter(id=track_id).first()
+    if track is None:
+        return {'ok': False, 'reason': 'missing track'}
+    field = waveforms.source_file(track, source)
+    if not field:
+        return {'ok': False, 'reason': f'no {source} file'}
+    if waveforms.lookup(field.name) is None:
+        # Hashing the upload lets the decode land in the PCM cache for the first processing job
+        content_hash = track_content_hash(track) if source == 'original' else None
+        waveforms.store(field.name, AudioProcessor.compute_peaks(field.path, content_hash))
+    return {'ok': True, 'track_id': track.id, 'source': source}
+
+
+@shared_task
+def analyze_track_task(track_id: int):
+    """Analyse a new upload ahead of its first job: tempo and noise profile, decoded PCM and waveform peaks.
+
+    The analysis is the one a job with default parameters looks up, so that job skips the stage.
+    """
+    from .hashing import track_content_hash
+    from .services import AudioProcessor
+
+    track = Track.objects.filter(id=track_id).first()
+    if track is None:
+        return {'ok': False, 'reason': 'missing track'}
+    content_hash = track_content_hash(track)
+    params = ProcessParams(analysis_sr=settings.AI_ENGINE_ANALYSIS_SR or None)
+    analysis = TrackAnalysis.lookup(track, content_hash, params.tempo_mode, params.analysis_sr)
+    if analysis is None:
+        analysis = TrackAnalysis.store(track, content_hash, AudioProcessor.analyze_file(
+            track.original_file.path, params, content_hash))
+    Track.objects.filter(id=track.id, bpm__isnull=True).update(bpm=analysis.bpm, duration_seconds=analysis.duration_seconds)
+    if waveforms.lookup(track.original_file.name) is None:
+        waveforms.store(track.original_file.name, AudioProcessor.compute_peaks(track.original_file.path, content_hash))
+    return {'ok': True, 'track_id': track.id, 'bpm': analysis.bpm}
@@ -0,0 +1,52 @@
+import io
+import os
+import shutil
+import tempfile
+from dataclasses import asdict
+from unittest import mock
+import soundfile as sf
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from music.models import ProcessingJob, Track
+from ..graph import StageExecutor
+from ..params import ProcessParams
+from .fixtures import SR, synth_groove
+
+
+class TrackTestCase(TestCase):
+    """A user with one short synthetic track; media, checkpoints and events stay inside the test."""
+
+    SECONDS = 4.0
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(
+            MEDIA_ROOT=cls.media_root,
+            AI_ENGINE_CHECKPOINT_DIR=os.path.join(cls.media_root, 'checkpoints'),
+            AI_ENGINE_EVENTS_BACKEND='ai_engine.events.LocalBroker',
+        ))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='engine', password='x')
+        cls.track = Track(owner=cls.user, title='groove')
+        cls.track.original_file.save('groove.wav', ContentFile(cls.wav_bytes()), save=True)
+
+    @classmethod
+    def wav_bytes(cls, bpm=120, seed=0):
+        buffer = io.BytesIO()
+        sf.write(buffer, synth_groove(bpm, SR, cls.SECONDS, seed=seed)[0], SR, format='WAV')
+        return buffer.getvalue()
+
+    def setUp(self):
+        # Stage threads would log through connections of their own, outside the test's transaction
+        self.enterContext(mock.patch('ai_engine.services.stage_executor', StageExecutor(mode='serial')))
+
+    def job(self, track=None, **params):
+        params = ProcessParams(**{'export_format': 'wav', 'streaming': False, **params})
+        return ProcessingJob.objects.create(track=track or self.track, created_by=self.user, params=asdict(params),
+                                            state=ProcessingJob.State.QUEUED)
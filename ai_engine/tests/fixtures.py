@@ -0,0 +1,73 @@
+"""Synthetic signals and agreement thresholds shared by these tests and the benchmark_audio command."""
+import numpy as np
+
+SR = 22050  # test fixtures: half the usual rate keeps them fast
+
+TEMPO_TOLERANCE = 0.04  # relative
+OCTAVE_FACTORS = (1.0, 2.0, 0.5)
+
+DENOISE_AGREEMENT_DB = 25.0  # chunked 'accurate' vs the single noisereduce call
+DENOISE_FAST_MAX_LOSS_DB = 3.0  # 'fast' output SNR may trail the single call by at most this
+MIXER_AGREEMENT_DB = 100.0  # float32 mixer vs the float64 tile-and-normalise reference
+
+
+def tempo_agrees(estimate, reference, factors=(1.0,)):
+    return any(abs(estimate * f - reference) <= TEMPO_TOLERANCE * reference for f in factors)
+
+
+def synth_groove(bpm, sr=44100, seconds=30.0, seed=0):
+    """Four-on-the-floor kick, backbeat snare and 8th-note hats over a sustained chord and noise floor, at a known tempo."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    y = 0.05 * sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6))
+    y += 0.01 * rng.standard_normal(n)
+    beat = 60.0 / bpm
+    hit = np.arange(int(0.15 * sr)) / sr
+    kick = np.sin(2 * np.pi * 55 * hit) * np.exp(-hit * 30)
+    snare = rng.standard_normal(len(hit)) * np.exp(-hit * 40) * 0.5
+    hat = rng.standard_normal(len(hit)) * np.exp(-hit * 120) * 0.1
+    for i, start in enumerate(np.arange(0, seconds - 0.2, beat / 2)):
+        s = int(start * sr)
+        y[s:s + len(hit)] += hat
+        if i % 2 == 0:
+            y[s:s + len(hit)] += kick
+        if i % 4 == 2:
+            y[s:s + len(hit)] += snare
+    return (y / np.max(np.abs(y))).astype(np.float32), sr
+
+
+def noisy_fixture(kind, sr=44100, seconds=30.0, seed=0):
+    """(clean, noisy) pair: a groove plus white hiss, mains hum with harmonics, or hiss that swells and fades."""
+    clean, sr = synth_groove(120 + 10 * seed, sr, seconds, seed=seed)
+    rng = np.random.default_rng(seed + 100)
+    t = np.arange(len(clean)) / sr
+    if kind == 'white':
+        noise = rng.standard_normal(len(t))
+    elif kind == 'hum':
+        noise = sum(np.sin(2 * np.pi * 50.0 * h * t) / h for h in (1, 2, 3, 5)) + 0.2 * rng.standard_normal(len(t))
+    else:
+        noise = rng.standard_normal(len(t)) * (0.6 + 0.4 * np.sin(2 * np.pi * t / 7.0))
+    noise *= 0.1 * np.sqrt(np.mean(clean ** 2) / np.mean(noise ** 2))  # -20 dB
+    return clean, (clean + noise).astype(np.float32), sr
+
+
+def snr_db(reference, estimate):
+    n = min(len(reference), len(estimate))
+    err = np.sum((reference[:n] - estimate[:n]) ** 2)
+    return float(10 * np.log10(np.sum(reference[:n] ** 2) / err)) if err else float('inf')
+
+
+def tiled_mix(y, drum_y, mix=0.4):
+    """The drum mix as it was before LoopMixer: tile the loop, normalise and mix full-length float64 arrays."""
+    drum_tiled = np.tile(drum_y, int(np.ceil(len(y) / len(drum_y))))[:len(y)]
+    y_norm = y / (np.max(np.abs(y)) or 1.0)
+    drum_norm = drum_tiled / (np.max(np.abs(drum_tiled)) or 1.0)
+    mixed = (1 - mix) * y_norm + mix * drum_norm
+    return mixed / (np.max(np.abs(mixed)) or 1.0) * 0.9
+
+
+def loudness_db(y, window=SR // 10):
+    """Level of each `window` samples in dB: unlike a waveform comparison, blind to phase."""
+    n = len(y) // window
+    return 10 * np.log10(np.mean(np.square(y[:n * window].reshape(n, window)), axis=1) + 1e-10)
@@ -0,0 +1,50 @@
+from unittest import mock
+from django.core.files.base import ContentFile
+from music.models import ProcessingJob, Track
+from ..hashing import track_content_hash
+from ..models import TrackAnalysis
+from ..services import AudioProcessor
+from ..tasks import analyze_track_task, process_track_task
+from .base import TrackTestCase
+
+
+class AnalysisReuseTests(TrackTestCase):
+    def run_job(self, **params):
+        job = self.job(add_drums=False, **params)
+        with mock.patch.object(AudioProcessor, 'analyze', side_effect=AudioProcessor.analyze) as analyzed:
+            process_track_task.apply(args=[job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.State.DONE)
+        return analyzed.call_count
+
+    def test_second_job_reuses_the_analysis(self):
+        self.assertEqual(self.run_job(target_bpm=126), 1)
+        analysis = TrackAnalysis.objects.get(track=self.track)
+        self.assertEqual(analysis.content_hash, track_content_hash(self.track))
+        self.assertEqual(self.run_job(target_bpm=132), 0)  # a new render, same content
+
+    def test_upload_analysis_serves_the_first_job(self):
+        analyze_track_task.apply(args=[self.track.id])
+        self.assertEqual(self.run_job(target_bpm=126), 0)
+
+    def test_lookup(self):
+        content_hash = track_content_hash(self.track)
+        analysis = {'bpm': 120.0, 'beat_frames': [], 'duration_seconds': 4.0, 'sr': 22050, 'noise_profile': [],
+                    'tempo_mode': 'fast', 'analysis_sr': 22050}
+        TrackAnalysis.store(self.track, content_hash, analysis)
+        self.assertIsNotNone(TrackAnalysis.lookup(self.track, content_hash, 'fast', 22050))
+        self.assertIsNone(TrackAnalysis.lookup(self.track, content_hash, 'accurate', 22050))  # fast can't serve accurate
+        self.assertIsNone(TrackAnalysis.lookup(self.track, 'other', 'fast', 22050))
+        self.assertIsNone(TrackAnalysis.lookup(self.track, content_hash, 'fast', 11025))
+
+        TrackAnalysis.store(self.track, content_hash, {**analysis, 'tempo_mode': 'accurate'})
+        self.assertEqual(TrackAnalysis.objects.filter(track=self.track).count(), 1)  # one row per track, replaced
+        self.assertIsNotNone(TrackAnalysis.lookup(self.track, content_hash, 'fast', 22050))
+
+    def test_new_content_is_analysed_again(self):
+        track = Track(owner=self.user, title='other')
+        track.original_file.save('other.wav', ContentFile(self.wav_bytes()), save=True)
+        self.run_job(track=track, target_bpm=126)
+        track.original_file.save('other.wav', ContentFile(self.wav_bytes(bpm=100, seed=3)), save=True)
+        self.assertEqual(self.run_job(track=track, target_bpm=126), 1)
+        self.assertEqual(TrackAnalysis.objects.get(track=track).content_hash, track_content_hash(track))
@@ -0,0 +1,39 @@
+import os
+from unittest import mock
+from django.test import override_settings
+from music.models import ProcessingJob
+from ..services import AudioProcessor
+from ..tasks import process_track_task
+from .base import TrackTestCase
+
+
+@override_settings(AI_ENGINE_JOB_RETRIES=2, AI_ENGINE_JOB_RETRY_DELAY=0)
+class CheckpointResumeTests(TrackTestCase):
+    def test_retry_resumes_after_the_last_finished_stage(self):
+        job = self.job(add_drums=False, target_bpm=126)
+        reduce_noise, stretch = AudioProcessor.reduce_noise, AudioProcessor.time_stretch_to_bpm
+
+        def preempted_once(*args, **kwargs):
+            if stretched.call_count == 1:
+                raise RuntimeError('worker preempted')
+            return stretch(*args, **kwargs)
+
+        with mock.patch.object(AudioProcessor, 'reduce_noise', side_effect=reduce_noise) as denoised, \
+                mock.patch.object(AudioProcessor, 'time_stretch_to_bpm', side_effect=preempted_once) as stretched:
+            process_track_task.apply(args=[job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.State.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(denoised.call_count, 1)  # the retry starts from the denoise checkpoint
+        self.assertEqual(stretched.call_count, 2)
+        self.assertIn('Attempt 1 failed, retrying: worker preempted', job.events.values_list('message', flat=True))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'checkpoints')), [])  # cleared once done
+
+    def test_giving_up_records_the_attempt(self):
+        job = self.job(add_drums=False)
+        ProcessingJob.objects.filter(id=job.id).update(attempts=3)
+        process_track_task.apply(args=[job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.State.FAILED)
+        self.assertEqual(job.attempts, 4)
+        self.assertEqual(job.last_message, 'ERROR: Gave up after 3 attempts')
@@ -0,0 +1,41 @@
+import noisereduce as nr
+import numpy as np
+from django.test import SimpleTestCase
+from ..denoise import DenoiseEngine
+from ..services import AudioProcessor
+from .fixtures import DENOISE_AGREEMENT_DB, DENOISE_FAST_MAX_LOSS_DB, SR, noisy_fixture, snr_db
+
+
+class ChunkedDenoiseTests(SimpleTestCase):
+    """DenoiseEngine splits anything past DENOISE_CHUNK_SECONDS; 40 s makes three chunks."""
+
+    STRENGTH = 0.6
+
+    def test_matches_single_call(self):
+        for seed, kind in enumerate(('white', 'hum', 'swell')):
+            with self.subTest(fixture=kind):
+                _, noisy, sr = noisy_fixture(kind, SR, 40.0, seed)
+                single = nr.reduce_noise(y=noisy, y_noise=noisy[:int(0.5 * sr)], sr=sr,
+                                         prop_decrease=self.STRENGTH, stationary=False)
+                chunked = DenoiseEngine().reduce_noise(noisy, sr, self.STRENGTH, noise_clip=noisy[:int(0.5 * sr)])
+                self.assertEqual(len(chunked), len(noisy))
+                self.assertGreater(snr_db(single, chunked), DENOISE_AGREEMENT_DB)
+
+    def test_fast_mode_quality(self):
+        clean, noisy, sr = noisy_fixture('white', SR, 40.0)
+        single = nr.reduce_noise(y=noisy, y_noise=noisy[:int(0.5 * sr)], sr=sr,
+                                 prop_decrease=self.STRENGTH, stationary=False)
+        fast = DenoiseEngine().reduce_noise(noisy, sr, self.STRENGTH, mode='fast',
+                                            noise_profile=AudioProcessor.estimate_noise_profile(noisy, sr))
+        self.assertGreater(snr_db(clean, fast), snr_db(clean, single) - DENOISE_FAST_MAX_LOSS_DB)
+
+    def test_output_does_not_depend_on_jobs(self):
+        _, noisy, sr = noisy_fixture('white', SR, 40.0)
+        clip = noisy[:int(0.5 * sr)]
+        serial = DenoiseEngine(jobs=1).reduce_noise(noisy, sr, self.STRENGTH, noise_clip=clip)
+        engine = DenoiseEngine(jobs=3)
+        try:
+            parallel = engine.reduce_noise(noisy, sr, self.STRENGTH, noise_clip=clip)
+        finally:
+            engine.close()
+        np.testing.assert_array_equal(serial, parallel)
@@ -0,0 +1,41 @@
+import numpy as np
+from django.test import SimpleTestCase
+from ..mixing import HEADROOM, LoopMixer, mix_loop, peak
+from .fixtures import MIXER_AGREEMENT_DB, SR, snr_db, synth_groove, tiled_mix
+
+
+class LoopMixerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.y = synth_groove(120, SR, 30.0)[0]
+        cls.drums = synth_groove(120, SR, 8.0, seed=1)[0]  # a 4-bar loop
+
+    def test_matches_tiled_mix(self):
+        for mix in (0.25, 0.4, 0.6):
+            with self.subTest(mix=mix):
+                mixed = mix_loop(self.y, self.drums, mix)
+                self.assertEqual(mixed.dtype, np.float32)
+                self.assertEqual(len(mixed), len(self.y))
+                self.assertGreater(snr_db(tiled_mix(self.y, self.drums, mix), mixed), MIXER_AGREEMENT_DB)
+
+    def test_loop_longer_than_signal(self):
+        y = self.y[:len(self.drums) // 3]
+        self.assertGreater(snr_db(tiled_mix(y, self.drums), mix_loop(y, self.drums)), MIXER_AGREEMENT_DB)
+
+    def test_blocks_match_whole_mix(self):
+        # As process_streaming mixes: block by block at their offsets, then normalised by the running peak
+        mixer = LoopMixer(self.drums, 0.4, peak(self.y), peak(self.drums))
+        out = np.empty(len(self.y), dtype=np.float32)
+        for start in range(0, len(self.y), 7919):  # not a divisor of the loop length
+            mixer.mix_into(out[start:start + 7919], self.y[start:start + 7919], start)
+        out *= np.float32(HEADROOM / mixer.peak)
+        np.testing.assert_allclose(out, mix_loop(self.y, self.drums, 0.4), rtol=0, atol=1e-6)
+
+    def test_empty_loop_leaves_the_signal(self):
+        mixer = LoopMixer(np.zeros(0, dtype=np.float32), 0.4, peak(self.y), 0.0)
+        out = mixer.mix_into(np.empty(len(self.y), dtype=np.float32), self.y)
+        np.testing.assert_allclose(out, self.y * np.float32(0.6 / peak(self.y)), rtol=0, atol=1e-6)
+        self.assertAlmostEqual(mixer.peak, 0.6, places=5)
+        mixed = mix_loop(self.y, np.zeros(0, dtype=np.float32))
+        np.testing.assert_allclose(mixed, self.y * np.float32(HEADROOM / peak(self.y)), rtol=0, atol=1e-6)
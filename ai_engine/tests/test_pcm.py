@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from music.models import Track
+from ..models import TrackAnalysis
+from ..pcm import PCMCache, load_pcm
+from .base import TrackTestCase
+
+HASH = 'c' * 64
+
+
+class PCMCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.decoder = mock.Mock(side_effect=lambda path: (np.full(1000, 0.5, dtype=np.float32), 22050))
+        self.cache = PCMCache(self.decoder, root=self.root)
+
+    def test_a_miss_decodes_once_then_hits(self):
+        path = self.cache.source('upload.mp3', HASH)
+        self.assertEqual(self.cache.source('upload.mp3', HASH), path)
+        self.assertEqual(self.decoder.call_count, 1)
+        y, sr = load_pcm(path)
+        self.assertEqual((len(y), sr, y.dtype), (1000, 22050, np.float32))
+
+    def test_bypassed_without_a_hash_or_for_uncompressed_uploads(self):
+        self.assertEqual(self.cache.source('upload.mp3', ''), 'upload.mp3')
+        self.assertEqual(self.cache.source('upload.wav', HASH), 'upload.wav')
+        self.assertEqual(PCMCache(self.decoder, root=None).source('upload.mp3', HASH), 'upload.mp3')
+        self.decoder.assert_not_called()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_bytes = 2 * (4000 + 128)  # two entries, headers included
+        for i, content_hash in enumerate(('a' * 64, 'b' * 64)):
+            os.utime(self.cache.source(f'{i}.mp3', content_hash), (i, i))  # a used first, then b
+        self.cache.lookup('a' * 64)  # a used again: now b is the oldest
+        self.cache.source('c.mp3', 'd' * 64)
+        self.assertIsNotNone(self.cache.lookup('a' * 64))
+        self.assertIsNone(self.cache.lookup('b' * 64))
+        self.assertIsNotNone(self.cache.lookup('d' * 64))
+
+
+class PCMInvalidationTests(TrackTestCase):
+    def setUp(self):
+        super().setUp()
+        root = os.path.join(self.media_root, 'pcm')
+        self.enterContext(override_settings(AI_ENGINE_PCM_CACHE_DIR=root))
+        self.cache = PCMCache(lambda path: (np.zeros(100, dtype=np.float32), 22050), root=root)
+        Track.objects.filter(id=self.track.id).update(content_hash=HASH)
+        self.track.refresh_from_db()
+        self.cache.source('upload.mp3', HASH)
+
+    def test_replaced_upload_drops_its_decode(self):
+        self.track.original_file = 'tracks/replaced.mp3'
+        self.track.save()
+        self.assertIsNone(self.cache.lookup(HASH))
+        self.assertEqual(self.track.content_hash, '')  # the replacement gets hashed by the next job
+
+    def test_decode_shared_with_another_track_is_kept(self):
+        duplicate = Track.objects.create(owner=self.user, title='same file', original_file='tracks/dup.mp3',
+                                         content_hash=HASH)
+        self.track.delete()
+        self.assertIsNotNone(self.cache.lookup(HASH))
+        duplicate.delete()
+        self.assertIsNone(self.cache.lookup(HASH))
+
+    def test_decode_known_only_to_an_analysis(self):
+        other = Track.objects.create(owner=self.user, title='other', original_file='tracks/other.mp3')
+        TrackAnalysis.objects.create(track=other, content_hash=HASH, bpm=120, duration_seconds=4, sr=22050)
+        self.track.delete()
+        self.assertIsNotNone(self.cache.lookup(HASH))  # other's analysis still refers to it
+        other.delete()  # its hash comes from the analysis, deleted along with it
+        self.assertIsNone(self.cache.lookup(HASH))
+
+    def test_saving_without_a_new_upload_reads_nothing(self):
+        track = Track.objects.get(id=self.track.id)
+        with self.assertNumQueries(1):  # the UPDATE
+            track.title = 'renamed'
+            track.save()
+        self.assertIsNotNone(self.cache.lookup(HASH))
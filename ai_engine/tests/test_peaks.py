@@ -0,0 +1,75 @@
+import io
+import numpy as np
+from django.test import SimpleTestCase
+from ..peaks import (
+    BASE_SAMPLES_PER_PEAK, LEVEL_FACTOR, MAX_LEVELS, SLICE_HEADER, SLICE_MAGIC, PeakBuilder, build_peaks, pick_level,
+    read_header, read_slice,
+)
+from .fixtures import SR, synth_groove
+
+
+class PeakPyramidTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.y = synth_groove(120, SR, 10.0)[0][:SR * 10 - 100]  # not a whole number of peaks
+        cls.data = build_peaks(cls.y, SR)
+        cls.header = read_header(io.BytesIO(cls.data))
+
+    def level(self, level):
+        """(mins, maxs) of one level as stored, int8."""
+        counts = self.header['level_counts']
+        start = self.header['data_offset'] + 2 * sum(counts[:level])
+        pairs = np.frombuffer(self.data, dtype=np.int8, count=2 * counts[level], offset=start).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def test_header(self):
+        self.assertEqual(self.header['sr'], SR)
+        self.assertEqual(self.header['samples'], len(self.y))
+        spp = [BASE_SAMPLES_PER_PEAK * LEVEL_FACTOR ** i for i in range(MAX_LEVELS)]
+        self.assertEqual(self.header['level_spp'], spp)
+        for level, spp in enumerate(self.header['level_spp']):
+            self.assertEqual(self.header['level_counts'][level], -(-len(self.y) // spp))
+        self.assertEqual(len(self.data), self.header['data_offset'] + 2 * sum(self.header['level_counts']))
+
+    def test_levels(self):
+        frames = np.pad(self.y, (0, -len(self.y) % BASE_SAMPLES_PER_PEAK), mode='edge')
+        frames = frames.reshape(-1, BASE_SAMPLES_PER_PEAK)
+        mins, maxs = self.level(0)
+        np.testing.assert_array_equal(mins, np.round(frames.min(axis=1) * 127).astype(np.int8))
+        np.testing.assert_array_equal(maxs, np.round(frames.max(axis=1) * 127).astype(np.int8))
+        for level in range(1, MAX_LEVELS):
+            finer, coarser = self.level(level - 1), self.level(level)
+            pad = -len(finer[0]) % LEVEL_FACTOR
+            np.testing.assert_array_equal(
+                coarser[0], np.pad(finer[0], (0, pad), constant_values=127).reshape(-1, LEVEL_FACTOR).min(axis=1))
+            np.testing.assert_array_equal(
+                coarser[1], np.pad(finer[1], (0, pad), constant_values=-128).reshape(-1, LEVEL_FACTOR).max(axis=1))
+
+    def test_blocks_of_any_size_build_the_same_file(self):
+        builder = PeakBuilder(SR)
+        for start in range(0, len(self.y), 10007):
+            builder.push(self.y[start:start + 10007])
+        self.assertEqual(builder.to_bytes(), self.data)
+
+    def test_slice(self):
+        level = 2
+        spp = self.header['level_spp'][level]
+        blob = read_slice(io.BytesIO(self.data), self.header, level, start=2.0, end=3.0)
+        magic, sr, slice_spp, first, n = SLICE_HEADER.unpack(blob[:SLICE_HEADER.size])
+        self.assertEqual((magic, sr, slice_spp), (SLICE_MAGIC, SR, spp))
+        self.assertEqual((first, n), (2 * SR // spp, -(-3 * SR // spp) - 2 * SR // spp))
+        mins, maxs = self.level(level)
+        pairs = np.frombuffer(blob, dtype=np.int8, offset=SLICE_HEADER.size).reshape(-1, 2)
+        np.testing.assert_array_equal(pairs[:, 0], mins[first:first + n])
+        np.testing.assert_array_equal(pairs[:, 1], maxs[first:first + n])
+
+    def test_pick_level(self):
+        seconds = len(self.y) / SR
+        for width in (10, 100, 500):
+            with self.subTest(width=width):
+                level = pick_level(self.header, 0.0, seconds, width)
+                self.assertGreaterEqual(seconds * SR / self.header['level_spp'][level], width)
+                if level + 1 < MAX_LEVELS:  # the next level would be too coarse
+                    self.assertLess(seconds * SR / self.header['level_spp'][level + 1], width)
+        self.assertEqual(pick_level(self.header, 0.0, seconds, 10000), 0)  # wider than the finest level
@@ -0,0 +1,100 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from django.utils import timezone
+from music.models import ProcessingJob, Track
+from .. import results
+from ..models import ProcessedResult
+from ..params import ProcessParams
+from ..services import AudioProcessor
+from ..tasks import process_track_task
+from .base import TrackTestCase
+
+HASH = 'a' * 64
+
+
+class CacheKeyTests(SimpleTestCase):
+    def test_params_that_cannot_change_the_render_share_a_key(self):
+        same = [
+            (ProcessParams(noise_reduction_strength=0, denoise_mode='fast'), ProcessParams(noise_reduction_strength=0)),
+            (ProcessParams(add_drums=False, drum_mix=0.6, drum_style='house'), ProcessParams(add_drums=False)),
+            (ProcessParams(add_drums=False, stretch_engine='wsola'), ProcessParams(add_drums=False)),
+            (ProcessParams(export_format='WAV'), ProcessParams(export_format='wav')),
+            (ProcessParams(drum_mix=0.40000001), ProcessParams(drum_mix=0.4)),
+            (ProcessParams(preview_seconds=10.0), ProcessParams()),
+        ]
+        for a, b in same:
+            with self.subTest(a=a):
+                self.assertEqual(a.cache_key(HASH), b.cache_key(HASH))
+
+    def test_key_changes_with_content_params_and_version(self):
+        key = ProcessParams(target_bpm=126).cache_key(HASH)
+        self.assertNotEqual(ProcessParams(target_bpm=127).cache_key(HASH), key)
+        self.assertNotEqual(ProcessParams(target_bpm=126, stretch_engine='wsola').cache_key(HASH), key)
+        self.assertNotEqual(ProcessParams(target_bpm=126).cache_key('b' * 64), key)
+        self.assertNotEqual(ProcessParams(target_bpm=126).cache_key(HASH, version='next'), key)
+
+    def test_normalized(self):
+        data = ProcessParams(noise_reduction_strength=0.0, add_drums=False, export_format='OGG').normalized()
+        self.assertEqual(data['export_format'], 'ogg')
+        self.assertIsNone(data['denoise_mode'])
+        self.assertIsNone(data['stretch_engine'])
+        self.assertIsNone(data['drum_mix'])
+        self.assertIsNone(data['preview_seconds'])
+
+
+class ResultCacheTests(TrackTestCase):
+    def render(self, **params):
+        job = self.job(add_drums=False, **params)
+        process_track_task.apply(args=[job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.state, ProcessingJob.State.DONE)
+        return job
+
+    def test_identical_request_reuses_the_render(self):
+        with mock.patch.object(AudioProcessor, 'process', side_effect=AudioProcessor.process) as process:
+            first = self.render(target_bpm=126)
+            second = self.render(target_bpm=126)
+            self.assertEqual(process.call_count, 1)
+            self.assertEqual(second.output_file.name, first.output_file.name)
+            self.assertEqual(second.last_message, 'Reused cached result.')
+            self.assertEqual(ProcessedResult.objects.get().hits, 1)
+
+            self.render(target_bpm=127)  # other params
+            self.assertEqual(process.call_count, 2)
+            with mock.patch.object(results, 'PROCESSOR_VERSION', 'next'):  # a changed processing chain
+                self.render(target_bpm=126)
+            self.assertEqual(process.call_count, 3)
+
+    def test_result_whose_file_is_gone_is_a_miss(self):
+        job = self.render()
+        key = ProcessedResult.objects.get().cache_key
+        job.output_file.storage.delete(job.output_file.name)
+        self.assertIsNone(results.lookup(key))
+        self.assertFalse(ProcessedResult.objects.exists())
+
+
+class EvictionTests(TrackTestCase):
+    def result(self, key, size, age_days):
+        storage = ProcessedResult._meta.get_field('output_file').storage
+        name = storage.save(results.result_name(key * 64, 'wav'), ContentFile(b'x' * size))
+        return ProcessedResult.objects.create(cache_key=key * 64, content_hash=HASH, output_file=name, size_bytes=size,
+                                              last_used_at=timezone.now() - timedelta(days=age_days))
+
+    def test_least_recently_used_go_first(self):
+        oldest, old, recent = self.result('a', 100, 3), self.result('b', 100, 2), self.result('c', 100, 1)
+        self.assertEqual(results.evict(max_bytes=150, max_age=timedelta(days=30)),
+                         [oldest.output_file.name, old.output_file.name])
+        self.assertEqual(list(ProcessedResult.objects.values_list('cache_key', flat=True)), [recent.cache_key])
+        self.assertFalse(oldest.output_file.storage.exists(oldest.output_file.name))
+
+    def test_expired_results_go_and_pinned_ones_stay(self):
+        pinned, stale = self.result('a', 100, 40), self.result('b', 100, 40)
+        Track.objects.filter(id=self.track.id).update(processed_file=pinned.output_file.name)
+        job = self.job()
+        ProcessingJob.objects.filter(id=job.id).update(output_file=stale.output_file.name)
+        self.assertEqual(results.evict(max_bytes=10 ** 6, max_age=timedelta(days=30)), [stale.output_file.name])
+        self.assertTrue(ProcessedResult.objects.filter(id=pinned.id).exists())
+        job.refresh_from_db()
+        self.assertFalse(job.output_file)  # no longer points at a deleted file
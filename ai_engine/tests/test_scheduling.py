@@ -0,0 +1,73 @@
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from music.models import ProcessingJob
+from .. import scheduling
+from .base import TrackTestCase
+
+
+@override_settings(AI_ENGINE_USER_MAX_ACTIVE=2, AI_ENGINE_USER_MAX_ACTIVE_PREVIEWS=1)
+class FairShareTests(TrackTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sent = self.enterContext(mock.patch('ai_engine.tasks.process_track_task.apply_async'))
+        self.sent.return_value.id = 'task-id'
+
+    def held(self, count, user=None, preview=False):
+        """`count` queued jobs, a minute apart and oldest first."""
+        user = user or self.user
+        start = timezone.now() - timedelta(hours=1)
+        jobs = []
+        for i in range(count):
+            job = ProcessingJob.objects.create(track=self.track, created_by=user, is_preview=preview,
+                                               queue=scheduling.route(user, preview))
+            ProcessingJob.objects.filter(id=job.id).update(created_at=start + timedelta(minutes=i))
+            jobs.append(job.id)
+        return jobs
+
+    def test_oldest_first_up_to_the_limit(self):
+        jobs = self.held(3)
+        self.assertEqual(scheduling.dispatch(self.user.id), jobs[:2])
+        self.assertEqual(scheduling.dispatch(self.user.id), [])  # no free slot
+        self.assertFalse(ProcessingJob.objects.get(id=jobs[2]).dispatched_at)
+
+        finished = ProcessingJob.objects.get(id=jobs[0])
+        ProcessingJob.objects.filter(id=finished.id).update(state=ProcessingJob.State.DONE)
+        scheduling.release(finished)
+        self.assertIsNotNone(ProcessingJob.objects.get(id=jobs[2]).dispatched_at)
+        self.assertEqual([c.args[0] for c in self.sent.call_args_list], [(jobs[0],), (jobs[1],), (jobs[2],)])
+
+    def test_previews_and_other_users_are_not_held_behind_a_backlog(self):
+        self.held(5)
+        scheduling.dispatch(self.user.id)
+        preview = self.held(1, preview=True)
+        self.assertEqual(scheduling.dispatch(self.user.id), preview)
+        self.assertEqual(self.sent.call_args.kwargs['queue'], settings.AI_ENGINE_PREVIEW_QUEUE)
+
+        other = get_user_model().objects.create_user(username='other', password='x', plan=get_user_model().Plan.PAID)
+        theirs = self.held(1, user=other)
+        self.assertEqual(scheduling.dispatch_all(), 1)  # just theirs: this user's slots are still full
+        self.assertEqual(self.sent.call_args.kwargs['queue'], settings.AI_ENGINE_PAID_QUEUE)
+        self.assertIsNotNone(ProcessingJob.objects.get(id=theirs[0]).dispatched_at)
+
+    def test_slots_are_counted_under_the_user_lock(self):
+        self.held(1)
+        with CaptureQueriesContext(connection) as queries:
+            scheduling.dispatch(self.user.id)
+        sql = [query['sql'] for query in queries]
+        lock = next(i for i, statement in enumerate(sql) if 'users_user' in statement)
+        self.assertLess(lock, next(i for i, statement in enumerate(sql) if 'music_processingjob' in statement))
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', sql[lock])
+
+    def test_broker_failure_holds_the_job_again(self):
+        jobs = self.held(1)
+        self.sent.side_effect = ConnectionError('broker down')
+        with self.assertRaises(ConnectionError):
+            scheduling.dispatch(self.user.id)
+        self.assertIsNone(ProcessingJob.objects.get(id=jobs[0]).dispatched_at)
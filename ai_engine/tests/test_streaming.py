@@ -0,0 +1,95 @@
+import os
+import tempfile
+from unittest import mock
+import numpy as np
+import librosa
+import soundfile as sf
+from django.test import SimpleTestCase
+from ..params import ProcessParams
+from ..services import AudioProcessor
+from ..stretch import STRETCH_ENGINES, stretch_rate
+from .fixtures import SR, loudness_db, noisy_fixture, snr_db, synth_groove
+
+
+class StreamingEquivalenceTests(SimpleTestCase):
+    """process_streaming against the whole-array process() on the same file and analysis."""
+
+    # Several blocks over a short file; the seams are what differ from the whole-array render
+    BLOCK_SECONDS = 10.0
+    OVERLAP_SECONDS = 2.0
+    SEAM_MAX_DIP_DB = 1.5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.clean, cls.noisy, _ = noisy_fixture('white', SR, 40.0)
+        cls.input_path = os.path.join(cls.tmp.name, 'in.wav')
+        sf.write(cls.input_path, cls.noisy, SR)
+        # Both paths get the same analysis, so they stretch by the same rate (120 -> target bpm)
+        cls.analysis = {**AudioProcessor.analyze(cls.noisy, SR), 'bpm': 120.0}
+        cls.drums = synth_groove(120, SR, 8.0, seed=1)[0]  # what prepare_drum_loop gives both paths
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def render_both(self, **params):
+        params = ProcessParams(**{'add_drums': False, **params}, export_format='wav', streaming=False)
+        whole = os.path.join(self.tmp.name, 'whole.wav')
+        streamed = os.path.join(self.tmp.name, 'streamed.wav')
+        with mock.patch.object(AudioProcessor, 'prepare_drum_loop', return_value=self.drums):
+            AudioProcessor.process(self.input_path, whole, params, analysis=self.analysis)
+            AudioProcessor.process_streaming(self.input_path, streamed, params, analysis=self.analysis,
+                                             block_seconds=self.BLOCK_SECONDS, overlap_seconds=self.OVERLAP_SECONDS)
+        return sf.read(whole, dtype='float32')[0], sf.read(streamed, dtype='float32')[0]
+
+    def test_without_stretch(self):
+        for mode, floor_db in (('accurate', 30.0), ('fast', 40.0)):
+            with self.subTest(denoise_mode=mode):
+                whole, streamed = self.render_both(denoise_mode=mode)
+                self.assertEqual(len(streamed), len(whole))
+                self.assertGreater(snr_db(whole, streamed), floor_db)
+
+    def test_with_stretch(self):
+        # Stretch engines' output phase depends on where they start, so the blocks can't match the
+        # whole-array render sample for sample. Instead both are held against the input resampled
+        # to the new length: streaming may not move the level further from it, e.g. at the seams.
+        for target_bpm in (126.0, 125.3, 111.6):
+            rate = stretch_rate(120.0, target_bpm)
+            reference = loudness_db(librosa.resample(self.noisy, orig_sr=SR, target_sr=SR / rate))
+            for engine in STRETCH_ENGINES:
+                for mode in ('accurate', 'fast'):
+                    with self.subTest(target_bpm=target_bpm, engine=engine, denoise_mode=mode):
+                        whole, streamed = self.render_both(target_bpm=target_bpm, stretch_engine=engine,
+                                                           denoise_mode=mode)
+                        self.assertEqual(len(whole), int(round(len(self.noisy) / rate)))
+                        self.assertEqual(len(streamed), len(whole))
+                        n = min(len(reference), len(loudness_db(whole)))
+                        whole_error = np.mean(np.abs(loudness_db(whole)[:n] - reference[:n]))
+                        streamed_error = np.mean(np.abs(loudness_db(streamed)[:n] - reference[:n]))
+                        self.assertLess(streamed_error, whole_error + 0.1)
+
+    def test_with_drums(self):
+        for mode, floor_db in (('accurate', 30.0), ('fast', 40.0)):
+            with self.subTest(denoise_mode=mode):
+                whole, streamed = self.render_both(add_drums=True, denoise_mode=mode)
+                self.assertEqual(len(streamed), len(whole))
+                self.assertGreater(snr_db(whole, streamed), floor_db)
+
+    def test_level_holds_across_stretch_seams(self):
+        # Around each splice (mid-overlap of blocks k-1 and k), the streamed level against the whole
+        # render's may not drop below what it is over the whole track, as a long crossfade made it
+        hop = self.BLOCK_SECONDS - self.OVERLAP_SECONDS
+        for target_bpm in (126.0, 125.3, 111.6):
+            rate = stretch_rate(120.0, target_bpm)
+            for add_drums in (False, True):
+                with self.subTest(target_bpm=target_bpm, add_drums=add_drums):
+                    whole, streamed = self.render_both(target_bpm=target_bpm, add_drums=add_drums)
+                    self.assertEqual(len(streamed), len(whole))
+                    difference = loudness_db(streamed) - loudness_db(whole)
+                    for k in range(1, int(np.ceil((len(self.noisy) / SR - self.BLOCK_SECONDS) / hop)) + 1):
+                        seam = int((k * hop + self.OVERLAP_SECONDS / 2) / rate * 10)  # in 0.1 s windows
+                        dip = np.mean(difference[seam - 5:seam + 5]) - np.mean(difference)
+                        self.assertGreater(dip, -self.SEAM_MAX_DIP_DB, f'seam {k}')
@@ -0,0 +1,26 @@
+from django.test import SimpleTestCase
+from ..services import AudioProcessor
+from ..stretch import STRETCH_ENGINES, stretch_rate, time_stretch
+from .fixtures import OCTAVE_FACTORS, SR, synth_groove, tempo_agrees
+
+
+class StretchTests(SimpleTestCase):
+    def test_output_length(self):
+        y = synth_groove(120, SR, 12.0)[0]
+        for engine in STRETCH_ENGINES:
+            for rate in (0.8, 0.93, 1.0441, 1.05, 1.3):
+                for n in (len(y), len(y) - 1, 1501):  # 1501 samples: shorter than two WSOLA frames
+                    with self.subTest(engine=engine, rate=rate, n=n):
+                        self.assertEqual(len(time_stretch(y[:n], SR, rate, engine)), int(round(n / rate)))
+
+    def test_wsola_tempo(self):
+        y = synth_groove(120, SR, 30.0)[0]
+        for rate in (0.8, 1.05, 1.25):
+            with self.subTest(rate=rate):
+                out = time_stretch(y, SR, rate, 'wsola')
+                self.assertTrue(tempo_agrees(AudioProcessor.estimate_bpm(out, SR), 120 * rate, OCTAVE_FACTORS))
+
+    def test_rates_near_one_are_skipped(self):
+        self.assertEqual(stretch_rate(120, 120.2), 1.0)
+        self.assertEqual(stretch_rate(None, 126), 1.0)
+        self.assertAlmostEqual(stretch_rate(120, 126), 1.05)
@@ -0,0 +1,103 @@
+import io
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SR = 22050
+WARMUP_SECONDS = 4.0
+
+
+def warmup_signal(sr=WARMUP_SR, seconds=WARMUP_SECONDS):
+    """Clicks at 120 bpm over a tone and a little noise: enough onsets for the beat tracker to do real work."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.1 * np.sin(2 * np.pi * 220.0 * t) + 0.01 * rng.standard_normal(len(t))
+    y[::sr // 2] += 0.9
+    return y.astype(np.float32), sr
+
+
+def warm_audio_stack(sr=WARMUP_SR):
+    """Import the audio stack and push a tiny signal through every pipeline stage.
+
+    librosa/numba compile their kernels on first call; doing it here, before the worker
+    consumes anything, keeps that cost off the first real job. Covers analysis, both denoise
+    and stretch engines, drum-loop prep and mixing, WAV and MP3 encoding and waveform peaks.
+    Returns the StageTimer breakdown.
+    """
+    from .encoders import encode_pcm
+    from .mixing import mix_loop
+    from .profiling import StageTimer
+    from .services import AudioProcessor
+
+    timer = StageTimer()
+    y, sr = warmup_signal(sr)
+    with timer.stage('analyze'):
+        AudioProcessor.analyze(y, sr)
+        AudioProcessor.estimate_bpm(y, sr, mode='fast')
+    with timer.stage('denoise'):
+        AudioProcessor.reduce_noise(y, sr, 0.5, mode='fast')
+        y = AudioProcessor.reduce_noise(y, sr, 0.5)
+    with timer.stage('stretch'):
+        AudioProcessor.time_stretch_to_bpm(y, sr, 120.0, 126.0, 'wsola')
+        y = AudioProcessor.time_stretch_to_bpm(y, sr, 120.0, 126.0)
+    with timer.stage('drums'):
+        # Rendered directly rather than through drum_loop_cache: no job asked for this tempo
+        drum_y = AudioProcessor.render_drum_loop(sr, 126.0)
+        if drum_y is None:  # no loop installed; the mixer still gets its run on the warm-up clicks
+            drum_y = y[:sr // 2]
+        y = mix_loop(y, drum_y)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'warmup.wav')
+        with timer.stage('encode'):
+            encode_pcm(y, sr, path, 'wav')
+            try:
+                encode_pcm(y, sr, io.BytesIO(), 'mp3')
+            except OSError:  # MP3 jobs will fail with the same error; WAV ones don't need ffmpeg
+                logger.warning('ffmpeg not found, MP3 encoder not warmed')
+        with timer.stage('peaks'):
+            AudioProcessor.compute_peaks(path)
+    return timer.as_list()
+
+
+def ready_file():
+    from django.conf import settings
+    return settings.AI_ENGINE_WORKER_READY_FILE
+
+
+def mark_ready():
+    """Touch AI_ENGINE_WORKER_READY_FILE (if set) so a readiness probe can see the worker is warm."""
+    path = ready_file()
+    if path:
+        with open(path, 'w') as fh:
+            fh.write(f'{os.getpid()} {time.time():.0f}\n')
+
+
+def clear_ready():
+    path = ready_file()
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def warm_worker():
+    """Celery worker boot hook: warm in the parent so every forked pool process inherits it."""
+    from django.conf import settings
+    from . import metrics
+
+    clear_ready()
+    if not settings.AI_ENGINE_WARMUP:
+        return
+    start = time.perf_counter()
+    try:
+        timings = warm_audio_stack()
+    except Exception:
+        # A broken warm-up shouldn't keep the worker down; the first job just pays the cost
+        logger.exception('Audio stack warm-up failed')
+        return
+    elapsed = time.perf_counter() - start
+    metrics.record('worker_warmup_seconds', elapsed, pid=os.getpid())
+    metrics.record_stages(timings, phase='warmup')
+    logger.info('Audio stack warm in %.2fs', elapsed)
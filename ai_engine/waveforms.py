@@ -0,0 +1,60 @@
+import hashlib
+import io
+from django.core.files.base import ContentFile
+from django.db import transaction
+from . import peaks
+from .models import WaveformPeaks
+
+SOURCES = ('original', 'processed')
+
+
+def peaks_name(source_name):
+    digest = hashlib.sha1(source_name.encode()).hexdigest()
+    return f'peaks/{digest[:2]}/{digest}.wpk'
+
+
+def source_file(track, source):
+    return track.processed_file if source == 'processed' else track.original_file
+
+
+def lookup(source_name):
+    """Stored peaks for a storage name, or None if missing or their file is gone."""
+    entry = WaveformPeaks.objects.filter(source_name=source_name).first()
+    if entry is None:
+        return None
+    if not entry.peaks_file.storage.exists(entry.peaks_file.name):
+        entry.delete()
+        return None
+    return entry
+
+
+def store(source_name, data):
+    header = peaks.read_header(io.BytesIO(data))
+    storage = WaveformPeaks._meta.get_field('peaks_file').storage
+    name = peaks_name(source_name)
+    if storage.exists(name):
+        storage.delete(name)
+    name = storage.save(name, ContentFile(data))
+    entry, _ = WaveformPeaks.objects.update_or_create(
+        source_name=source_name,
+        defaults={
+            'peaks_file': name,
+            'sr': header['sr'],
+            'samples': header['samples'],
+            'level_spp': header['level_spp'],
+            'size_bytes': len(data),
+        },
+    )
+    return entry
+
+
+def discard(source_names):
+    for entry in WaveformPeaks.objects.filter(source_name__in=list(source_names)):
+        entry.peaks_file.storage.delete(entry.peaks_file.name)
+        entry.delete()
+
+
+def request_generation(track, source):
+    """Queue peak generation for one of a track's files once the current transaction commits."""
+    from .tasks import generate_peaks_task
+    transaction.on_commit(lambda: generate_peaks_task.delay(track.id, source))
@@ -1,8 +1,29 @@
 import os
 from celery import Celery
+from celery.signals import celeryd_after_setup, worker_ready, worker_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 app = Celery('backend')
 app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+# Audio imports stay inside the hooks: this module is also loaded by web processes.
+# celeryd_after_setup runs in the parent once logging is configured, before the pool forks.
+@celeryd_after_setup.connect
+def warm_audio_stack(**kwargs):
+    from ai_engine.warmup import warm_worker
+    warm_worker()
+
+
+@worker_ready.connect
+def report_ready(**kwargs):
+    from ai_engine.warmup import mark_ready
+    mark_ready()
+
+
+@worker_shutdown.connect
+def report_not_ready(**kwargs):
+    from ai_engine.warmup import clear_ready
+    clear_ready()
@@ -106,7 +106,7 @@ CORS_ALLOWED_ORIGINS = (
 CORS_ALLOW_CREDENTIALS = False
 CORS_ALLOW_HEADERS = list(default_headers) + ['authorization']
 
-DEBUG = os.getenv('DEBUG', 'False') == 'False'
+DEBUG = os.getenv('DEBUG', 'False') == 'True'  # static() only serves MEDIA_ROOT under /media/ when on
 SECRET_KEY = os.getenv('SECRET_KEY', 'unsafe-dev-key')
 ALLOWED_HOSTS = ['*']
 
@@ -123,6 +123,13 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 MEDIA_ROOT = BASE_DIR / os.getenv('MEDIA_ROOT', 'media')
+# Track audio (GET /api/music/tracks/<id>/audio/, music.delivery): '' streams it from Django;
+# 'x-accel-redirect' hands it to nginx via an internal location serving MEDIA_ROOT at
+# MEDIA_ACCEL_PREFIX; 'x-sendfile' to Apache/lighttpd by absolute path.
+MEDIA_ACCEL_MODE = os.getenv('MEDIA_ACCEL_MODE', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_CACHE_SECONDS = int(os.getenv('MEDIA_CACHE_SECONDS', '3600'))
+MEDIA_AUDIO_URL_SECONDS = int(os.getenv('MEDIA_AUDIO_URL_SECONDS', str(6 * 3600)))  # lifetime of a track's signed audio_url
 
 # Database (postgresql)
 DATABASES = {
@@ -144,7 +151,81 @@ CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'django-db')
 CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 60 * 60  # 1 hour
+# Periodic tasks, run by `celery -A backend beat` (one beat process per deployment)
+CELERY_BEAT_SCHEDULE = {
+    # Held-back jobs whose release was lost (e.g. a worker killed between finishing and dispatching)
+    'dispatch-held-jobs': {
+        'task': 'ai_engine.tasks.dispatch_held_jobs_task',
+        'schedule': float(os.getenv('AI_ENGINE_DISPATCH_INTERVAL_SECONDS', '60')),
+    },
+    # Result cache (ai_engine.results) back under AI_ENGINE_RESULT_CACHE_MAX_MB / _MAX_AGE_DAYS
+    'evict-results': {
+        'task': 'ai_engine.tasks.evict_results_task',
+        'schedule': float(os.getenv('AI_ENGINE_RESULT_EVICT_INTERVAL_SECONDS', '600')),
+    },
+    # Partial files of chunked uploads idle past TRACK_UPLOAD_TTL_HOURS
+    'expire-uploads': {
+        'task': 'music.tasks.expire_uploads_task',
+        'schedule': float(os.getenv('TRACK_UPLOAD_EXPIRE_INTERVAL_SECONDS', '3600')),
+    },
+}
+
+# AI engine
+AI_ENGINE_DRUM_CACHE_SIZE = int(os.getenv('AI_ENGINE_DRUM_CACHE_SIZE', '16'))
+AI_ENGINE_DRUM_CACHE_MAX_MB = int(os.getenv('AI_ENGINE_DRUM_CACHE_MAX_MB', '256'))
+AI_ENGINE_DRUM_PREWARM = os.getenv('AI_ENGINE_DRUM_PREWARM', '')  # e.g. "44100:120,48000:120"
+# Per-style loops pre-rendered by `manage.py build_drum_bank`; read by web and workers. '' disables
+AI_ENGINE_DRUM_BANK_DIR = os.getenv('AI_ENGINE_DRUM_BANK_DIR', str(MEDIA_ROOT / 'drum_bank'))
+AI_ENGINE_RESULT_CACHE_MAX_MB = int(os.getenv('AI_ENGINE_RESULT_CACHE_MAX_MB', '10240'))
+AI_ENGINE_RESULT_CACHE_MAX_AGE_DAYS = int(os.getenv('AI_ENGINE_RESULT_CACHE_MAX_AGE_DAYS', '30'))
+# Decoded PCM of compressed uploads, memory-mapped by later jobs; '' disables
+AI_ENGINE_PCM_CACHE_DIR = os.getenv('AI_ENGINE_PCM_CACHE_DIR', str(MEDIA_ROOT / 'pcm_cache'))
+AI_ENGINE_PCM_CACHE_MAX_MB = int(os.getenv('AI_ENGINE_PCM_CACHE_MAX_MB', '20480'))
+# Finished stages of running jobs, so retries resume; must be shared by all workers. '' disables
+AI_ENGINE_CHECKPOINT_DIR = os.getenv('AI_ENGINE_CHECKPOINT_DIR', str(MEDIA_ROOT / 'checkpoints'))
+AI_ENGINE_CHECKPOINT_TTL_HOURS = int(os.getenv('AI_ENGINE_CHECKPOINT_TTL_HOURS', '24'))
+AI_ENGINE_JOB_RETRIES = int(os.getenv('AI_ENGINE_JOB_RETRIES', '2'))  # after a failure or a lost worker
+AI_ENGINE_JOB_RETRY_DELAY = int(os.getenv('AI_ENGINE_JOB_RETRY_DELAY', '30'))  # seconds
+AI_ENGINE_ANALYSIS_SR = int(os.getenv('AI_ENGINE_ANALYSIS_SR', '22050'))  # tempo analysis rate; 0 = native
+AI_ENGINE_STAGE_MODE = os.getenv('AI_ENGINE_STAGE_MODE', 'threads')  # or 'serial': one stage at a time, in order
+AI_ENGINE_STAGE_THREADS = int(os.getenv('AI_ENGINE_STAGE_THREADS', '2'))
+AI_ENGINE_DENOISE_JOBS = int(os.getenv('AI_ENGINE_DENOISE_JOBS', '0'))  # parallel denoise chunks; 0 = one per core
+AI_ENGINE_DENOISE_EXECUTOR = os.getenv('AI_ENGINE_DENOISE_EXECUTOR', 'threads')  # or 'processes' (outside prefork children)
+AI_ENGINE_PREVIEW_QUEUE = os.getenv('AI_ENGINE_PREVIEW_QUEUE', 'preview')  # run a worker with -Q preview
+AI_ENGINE_PAID_QUEUE = os.getenv('AI_ENGINE_PAID_QUEUE', 'priority')  # full renders of paid users
+AI_ENGINE_FULL_QUEUE = os.getenv('AI_ENGINE_FULL_QUEUE', 'celery')  # full renders of free users (Celery's default)
+# Fair share: jobs one user may have in Celery at once, beyond which they wait in the DB; 0 = no limit
+AI_ENGINE_USER_MAX_ACTIVE = int(os.getenv('AI_ENGINE_USER_MAX_ACTIVE', '2'))
+AI_ENGINE_USER_MAX_ACTIVE_PREVIEWS = int(os.getenv('AI_ENGINE_USER_MAX_ACTIVE_PREVIEWS', '2'))
+AI_ENGINE_BATCH_SIZE = int(os.getenv('AI_ENGINE_BATCH_SIZE', '50'))  # jobs per batch task
+AI_ENGINE_BATCH_WORKERS = int(os.getenv('AI_ENGINE_BATCH_WORKERS', '0'))  # 0 = one per core
+AI_ENGINE_BATCH_FLUSH_EVERY = int(os.getenv('AI_ENGINE_BATCH_FLUSH_EVERY', '20'))
+# Job progress pub/sub behind /jobs/<id>/events/; must be shared by web and workers
+# ('ai_engine.events.LocalBroker' only works within one process, e.g. tests with eager Celery)
+AI_ENGINE_EVENTS_BACKEND = os.getenv('AI_ENGINE_EVENTS_BACKEND', 'ai_engine.events.RedisBroker')
+AI_ENGINE_EVENTS_REDIS_URL = os.getenv('AI_ENGINE_EVENTS_REDIS_URL', CELERY_BROKER_URL)
+AI_ENGINE_EVENTS_STREAM_SECONDS = int(os.getenv('AI_ENGINE_EVENTS_STREAM_SECONDS', '300'))  # then the client reconnects
+AI_ENGINE_EVENTS_KEEPALIVE_SECONDS = int(os.getenv('AI_ENGINE_EVENTS_KEEPALIVE_SECONDS', '15'))
+# Under ASGI (backend.asgi, e.g. gunicorn with uvicorn workers) streams wait on the event loop. Under
+# WSGI each open stream holds a worker, so it only streams with gevent workers (gunicorn -k gevent):
+# set this to 1 there. Otherwise /events/ sends the current state and EventSource reconnects every
+# AI_ENGINE_EVENTS_POLL_SECONDS, i.e. it polls, as clients of GET /jobs/<id>/ do. Polls skip the DB
+# for AI_ENGINE_EVENTS_STREAM_SECONDS after the first (a signed token in the event id).
+AI_ENGINE_EVENTS_WSGI_STREAMS = os.getenv('AI_ENGINE_EVENTS_WSGI_STREAMS', '0') == '1'
+AI_ENGINE_EVENTS_POLL_SECONDS = int(os.getenv('AI_ENGINE_EVENTS_POLL_SECONDS', '3'))
+# Comma-separated sink classes, e.g. "ai_engine.metrics.LogSink,ai_engine.metrics.StatsdSink"
+AI_ENGINE_METRICS_SINKS = [s for s in os.getenv('AI_ENGINE_METRICS_SINKS', 'ai_engine.metrics.LogSink').split(',') if s]
+AI_ENGINE_STATSD_ADDR = os.getenv('AI_ENGINE_STATSD_ADDR', 'localhost:8125')
+AI_ENGINE_WARMUP = os.getenv('AI_ENGINE_WARMUP', '1') == '1'  # JIT-compile the audio stack at worker boot
+AI_ENGINE_WORKER_READY_FILE = os.getenv('AI_ENGINE_WORKER_READY_FILE', '')  # touched once warm, for readiness probes
 
 # File limits
 DATA_UPLOAD_MAX_MEMORY_SIZE = 26214400  # 25MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 26214400
+
+# Chunked track uploads (music.uploads) for files past those limits. Partial files live in
+# TRACK_UPLOAD_DIR; keep it on the MEDIA_ROOT filesystem so finalising an upload is a hard link.
+TRACK_UPLOAD_DIR = os.getenv('TRACK_UPLOAD_DIR', str(MEDIA_ROOT / 'uploads'))
+TRACK_UPLOAD_MAX_MB = int(os.getenv('TRACK_UPLOAD_MAX_MB', '4096'))
+TRACK_UPLOAD_CHUNK_MB = int(os.getenv('TRACK_UPLOAD_CHUNK_MB', '16'))  # largest chunk per request
+TRACK_UPLOAD_TTL_HOURS = int(os.getenv('TRACK_UPLOAD_TTL_HOURS', '24'))  # since the last chunk
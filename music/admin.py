@@ -1,12 +1,24 @@
 from django.contrib import admin
-from .models import Track, ProcessingJob
+from .models import Track, TrackUpload, ProcessingJob, JobEvent
 
 @admin.register(Track)
 class TrackAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'owner', 'status', 'bpm', 'created_at')
     list_filter = ('status',)
 
+@admin.register(TrackUpload)
+class TrackUploadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'filename', 'size', 'received', 'state', 'track', 'updated_at')
+    list_filter = ('state',)
+
 @admin.register(ProcessingJob)
 class ProcessingJobAdmin(admin.ModelAdmin):
-    list_display = ('id', 'track', 'state', 'progress', 'created_at', 'finished_at')
-    list_filter = ('state',)
\ No newline at end of file
+    list_display = ('id', 'track', 'state', 'queue', 'progress', 'attempts', 'created_at', 'dispatched_at',
+                    'finished_at')
+    list_filter = ('state', 'queue')
+
+@admin.register(JobEvent)
+class JobEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job', 'created_at', 'level', 'stage', 'message')
+    list_filter = ('level',)
+    raw_id_fields = ('job',)
@@ -0,0 +1,161 @@
+import hashlib
+import mimetypes
+import os
+from urllib.parse import quote
+from django.conf import settings
+from django.core import signing
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+# Audio delivery for the web player: byte ranges (so seeking fetches only what it plays),
+# ETag/Last-Modified revalidation, and, with MEDIA_ACCEL_MODE set, the transfer itself handed
+# to the front server so no Python worker is held for it.
+
+AUDIO_TYPES = {'.mp3': 'audio/mpeg', '.wav': 'audio/wav', '.ogg': 'audio/ogg', '.opus': 'audio/ogg',
+               '.flac': 'audio/flac', '.m4a': 'audio/mp4', '.aif': 'audio/aiff', '.aiff': 'audio/aiff'}
+
+
+AUDIO_TOKEN_SALT = 'music.delivery.audio'
+
+
+def audio_token(track_id):
+    """Signed, expiring grant to GET one track's audio (see MEDIA_AUDIO_URL_SECONDS).
+
+    For <audio src>, which can't send an Authorization header; only ever issue it to the track's
+    owner or staff, since whoever holds the URL can play the track until it expires.
+    """
+    return signing.TimestampSigner(salt=AUDIO_TOKEN_SALT).sign(str(track_id))
+
+
+def check_audio_token(token, track_id):
+    try:
+        signed = signing.TimestampSigner(salt=AUDIO_TOKEN_SALT).unsign(
+            token, max_age=settings.MEDIA_AUDIO_URL_SECONDS)
+    except signing.BadSignature:  # SignatureExpired included
+        return False
+    return signed == str(track_id)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """(start, end), inclusive, of a single `bytes=` range; None to send the whole file.
+
+    Malformed and multi-range headers are ignored (the whole file is a valid answer to both);
+    a range starting past the end raises RangeNotSatisfiable.
+    """
+    units, _, spec = (header or '').partition('=')
+    if units.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep or not (first + last).isdigit():
+        return None
+    if not first:  # suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - int(last)), size - 1
+    start, end = int(first), int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def file_etag(name, size, modified):
+    digest = hashlib.sha1(f'{name}:{size}:{modified.timestamp()}'.encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def if_range_matches(request, etag, last_modified):
+    """Whether a Range request may be honoured: no If-Range, or one naming the current version."""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+class FileRange:
+    """`length` bytes of an open file from `start`, for FileResponse.
+
+    Keeps fileno(), so a WSGI server's file_wrapper can still sendfile() it: gunicorn sends
+    Content-Length bytes from the descriptor's offset. Other servers iterate read().
+    """
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def accel_response(field, content_type):
+    """Empty response telling the front server to send the file itself (it handles Range too), or None."""
+    mode = settings.MEDIA_ACCEL_MODE
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(field.name)
+    elif mode == 'x-sendfile':
+        try:
+            response['X-Sendfile'] = field.storage.path(field.name)
+        except NotImplementedError:
+            return None  # not on local disk: stream it ourselves
+    else:
+        return None
+    return response
+
+
+def audio_response(request, field):
+    """GET/HEAD response for a stored audio file: 304, 412, 416, a 206 range, or the whole file (200)."""
+    storage, name = field.storage, field.name
+    size = storage.size(name)
+    modified = storage.get_modified_time(name)
+    etag, last_modified = file_etag(name, size, modified), int(modified.timestamp())
+    content_type = AUDIO_TYPES.get(os.path.splitext(name)[1].lower()) or \
+        mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = accel_response(field, content_type)
+    if response is None:
+        try:
+            span = None
+            if request.META.get('HTTP_RANGE') and if_range_matches(request, etag, last_modified):
+                span = parse_range(request.META['HTTP_RANGE'], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        else:
+            fh = storage.open(name, 'rb')
+            if span is None:
+                response = FileResponse(fh, content_type=content_type)
+                response['Content-Length'] = str(size)
+            else:
+                start, end = span
+                response = FileResponse(FileRange(fh, start, end - start + 1), status=206, content_type=content_type)
+                response['Content-Length'] = str(end - start + 1)
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Stored names are never reused for new content (uuid / content-addressed), but originals are private
+    patch_cache_control(response, private=True, max_age=settings.MEDIA_CACHE_SECONDS)
+    return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='is_preview',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='source_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='follow_ups', to='music.processingjob'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0003_processingjob_preview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='capture_profile',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='profile_file',
+            field=models.FileField(blank=True, null=True, upload_to='profiles/'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='timings',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0004_processingjob_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def log_level(line):
+    if line.startswith('ERROR:'):
+        return 'ERROR'
+    return 'WARNING' if 'retrying:' in line else 'INFO'
+
+
+def log_to_events(apps, schema_editor):
+    # One event per old log line; the lines carried no time, so they get the job's last timestamp
+    ProcessingJob = apps.get_model('music', 'ProcessingJob')
+    JobEvent = apps.get_model('music', 'JobEvent')
+    batch = []
+    for job in ProcessingJob.objects.exclude(log='').iterator(chunk_size=500):
+        lines = [line for line in job.log.splitlines() if line.strip()]
+        if not lines:
+            continue
+        at = job.finished_at or job.started_at or job.created_at
+        batch += [JobEvent(job_id=job.id, created_at=at, level=log_level(line), message=line) for line in lines]
+        ProcessingJob.objects.filter(id=job.id).update(last_message=lines[-1][:500])
+        if len(batch) >= 1000:
+            JobEvent.objects.bulk_create(batch)
+            batch = []
+    JobEvent.objects.bulk_create(batch)
+
+
+def events_to_log(apps, schema_editor):
+    ProcessingJob = apps.get_model('music', 'ProcessingJob')
+    JobEvent = apps.get_model('music', 'JobEvent')
+    for job_id in JobEvent.objects.values_list('job_id', flat=True).distinct():
+        messages = JobEvent.objects.filter(job_id=job_id, stage='').order_by('id').values_list('message', flat=True)
+        ProcessingJob.objects.filter(id=job_id).update(log=''.join(f'\n{message}' for message in messages))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0006_processingjob_queue_dispatched_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='last_message',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.CreateModel(
+            name='JobEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('stage', models.CharField(blank=True, max_length=50)),
+                ('level', models.CharField(choices=[('INFO', 'Info'), ('WARNING', 'Warning'), ('ERROR', 'Error')], default='INFO', max_length=10)),
+                ('message', models.TextField(blank=True)),
+                ('metrics', models.JSONField(blank=True, default=dict)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='music.processingjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'id'], name='music_jobev_job_id_f8c68c_idx')],
+            },
+        ),
+        migrations.RunPython(log_to_events, events_to_log),
+        migrations.RemoveField(
+            model_name='processingjob',
+            name='log',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0008_trackupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
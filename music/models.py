@@ -1,6 +1,8 @@
 import uuid
+from datetime import timedelta
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 def track_upload_path(instance, filename):
     return f"tracks/{instance.owner_id}/{uuid.uuid4()}_{filename}"
@@ -18,6 +20,7 @@ class Track(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tracks')
     title = models.CharField(max_length=200)
     original_file = models.FileField(upload_to=track_upload_path)
+    content_hash = models.CharField(max_length=64, blank=True)  # sha256 of original_file; blank until hashed
     processed_file = models.FileField(upload_to=track_upload_path, blank=True, null=True)
     duration_seconds = models.FloatField(null=True, blank=True)
     bpm = models.FloatField(null=True, blank=True)
@@ -27,6 +30,36 @@ class Track(models.Model):
     def __str__(self):
         return f'{self.title} ({self.owner})'
 
+class TrackUpload(models.Model):
+    """A chunked, resumable upload of a Track's original_file (see music.uploads).
+
+    Chunks are appended to a partial file on local disk at `received`; finalising links it into
+    storage as a new Track. The row outlives that briefly, so a retried finalise gets the same track.
+    """
+
+    class State(models.TextChoices):
+        UPLOADING = 'UPLOADING'
+        COMPLETE = 'COMPLETE'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads')
+    title = models.CharField(max_length=200)
+    filename = models.CharField(max_length=200)
+    size = models.BigIntegerField()  # declared up front; finalising needs exactly this many bytes
+    received = models.BigIntegerField(default=0)  # bytes written, i.e. the offset the next chunk must start at
+    sha256 = models.CharField(max_length=64, blank=True)  # declared by the client, else filled in on finalising
+    state = models.CharField(max_length=20, choices=State.choices, default=State.UPLOADING)
+    track = models.OneToOneField(Track, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def expires_at(self):
+        return self.updated_at + timedelta(hours=settings.TRACK_UPLOAD_TTL_HOURS)
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.size})'
+
 class ProcessingJob(models.Model):
     class State(models.TextChoices):
         QUEUED = 'QUEUED'
@@ -39,12 +72,101 @@ class ProcessingJob(models.Model):
     params = models.JSONField(default=dict)
     state = models.CharField(max_length=20, choices=State.choices, default=State.QUEUED)
     progress = models.PositiveSmallIntegerField(default=0)  
-    log = models.TextField(blank=True)
+    last_message = models.CharField(max_length=500, blank=True)  # latest status line; the full history is in JobEvent
     output_file = models.FileField(upload_to=processed_upload_path, null=True, blank=True)
     celery_task_id = models.CharField(max_length=200, blank=True)
+    queue = models.CharField(max_length=50, blank=True)  # Celery queue it is routed to, see ai_engine.scheduling
+    dispatched_at = models.DateTimeField(null=True, blank=True)  # sent to Celery; null while held back by fair share
+    attempts = models.PositiveSmallIntegerField(default=0)  # task runs, counting retries and redeliveries
+    is_preview = models.BooleanField(default=False)
+    source_job = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='follow_ups')
+    timings = models.JSONField(default=list, blank=True)  # per-stage wall/cpu/peak-RSS, see ai_engine.profiling
+    capture_profile = models.BooleanField(default=False)  # render under cProfile, bypassing the result cache
+    profile_file = models.FileField(upload_to='profiles/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
 
-    def append_log(self, text):
-        self.log = (self.log or '') + f'\n{text}'
-        self.save(update_fields=['log'])
\ No newline at end of file
+    class Meta:
+        indexes = [models.Index(fields=['created_by', 'state'])]
+
+    ACTIVE_STATES = (State.QUEUED, State.RUNNING)
+
+    TRACK_DONE_FIELDS = ['processed_file', 'duration_seconds', 'bpm', 'status']
+    DONE_FIELDS = ['output_file', 'profile_file', 'timings', 'progress', 'state', 'finished_at',
+                   'last_message']
+    FAILED_FIELDS = ['state', 'finished_at', 'last_message', 'attempts']
+
+    API_STATUS = {State.QUEUED: 'queued', State.RUNNING: 'running', State.DONE: 'succeeded', State.FAILED: 'failed'}
+
+    @property
+    def api_status(self):
+        return self.API_STATUS[self.state]
+
+    @property
+    def latency_seconds(self):
+        """Submission to completion, including queue wait."""
+        if not self.finished_at:
+            return None
+        return (self.finished_at - self.created_at).total_seconds()
+
+    def set_message(self, message):
+        self.last_message = str(message)[:self._meta.get_field('last_message').max_length]
+
+    def apply_done(self, meta, message='Processing completed successfully.'):
+        """Set the finished state on the job and its track without saving (see mark_done).
+
+        Previews only fill output_file; the track keeps its current processed_file.
+        """
+        if not self.is_preview:
+            track = self.track
+            track.processed_file = self.output_file.name
+            track.duration_seconds = meta.get('duration_seconds')
+            track.bpm = meta.get('bpm')
+            track.status = Track.Status.PROCESSED
+
+        self.timings = meta.get('timings') or []
+        self.progress = 100
+        self.state = self.State.DONE
+        self.finished_at = timezone.now()
+        self.set_message(message)
+
+    def apply_failed(self, error):
+        if not self.is_preview:
+            self.track.status = Track.Status.FAILED
+        self.state = self.State.FAILED
+        self.finished_at = timezone.now()
+        self.set_message(f'ERROR: {error}')
+
+    def mark_done(self, meta, message='Processing completed successfully.'):
+        """Publish output_file on the track and close the job."""
+        self.apply_done(meta, message)
+        if not self.is_preview:
+            self.track.save(update_fields=self.TRACK_DONE_FIELDS)
+        self.save(update_fields=self.DONE_FIELDS)
+
+
+class JobEvent(models.Model):
+    """One line of a job's log, append-only: writing an event never rewrites earlier ones.
+
+    Workers buffer events and insert them in batches (see ai_engine.jobs.JobEventLog), so
+    logging costs the same however long the job has been running.
+    """
+
+    class Level(models.TextChoices):
+        INFO = 'INFO'
+        WARNING = 'WARNING'
+        ERROR = 'ERROR'
+
+    job = models.ForeignKey(ProcessingJob, on_delete=models.CASCADE, related_name='events')
+    created_at = models.DateTimeField(default=timezone.now)  # when it happened, not when the batch was written
+    stage = models.CharField(max_length=50, blank=True)  # pipeline stage, for per-stage timings
+    level = models.CharField(max_length=10, choices=Level.choices, default=Level.INFO)
+    message = models.TextField(blank=True)
+    metrics = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['job', 'id'])]
+
+    def __str__(self):
+        return f'{self.job_id} {self.level}: {self.message}'
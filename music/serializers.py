@@ -1,13 +1,71 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
+from . import delivery
 from .models import Track
 
 class TrackSerializer(serializers.ModelSerializer):
+    audio_url = serializers.SerializerMethodField(
+        help_text="Ranged, cacheable stream of the track for players (usable as <audio src>; it expires). "
+                  "Only for the track's owner, null for anyone else."
+    )
+
     class Meta:
         model = Track
         fields = "__all__"
+        read_only_fields = ["content_hash"]
+
+    def get_audio_url(self, obj) -> str | None:
+        request = self.context.get("request")
+        user = request.user if request else None
+        if user is None or not (user.is_staff or obj.owner_id == user.id):
+            return None  # TrackViewSet.audio would 404 for them
+        url = reverse("track-audio", args=[obj.pk]) + "?token=" + delivery.audio_token(obj.pk)
+        return request.build_absolute_uri(url)
+
+class TrackUploadStartSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=200)
+    filename = serializers.CharField(max_length=200)
+    size = serializers.IntegerField(min_value=1, help_text="Total bytes to upload")
+    sha256 = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False, allow_blank=True,
+                                    help_text="Of the whole file; checked when the upload is finalised")
+
+    def validate_size(self, value):
+        if value > settings.TRACK_UPLOAD_MAX_MB * 1024 * 1024:
+            raise serializers.ValidationError(f"Uploads are limited to {settings.TRACK_UPLOAD_MAX_MB} MB.")
+        return value
+
+class TrackUploadSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    title = serializers.CharField()
+    filename = serializers.CharField()
+    size = serializers.IntegerField()
+    offset = serializers.IntegerField(source="received", help_text="Bytes received; the next chunk starts here")
+    state = serializers.ChoiceField(choices=["UPLOADING", "COMPLETE"])
+    track = serializers.IntegerField(source="track_id", allow_null=True)
+    max_chunk_size = serializers.SerializerMethodField()
+    expires_at = serializers.DateTimeField()
+
+    def get_max_chunk_size(self, obj) -> int:
+        return settings.TRACK_UPLOAD_CHUNK_MB * 1024 * 1024
+
+class TrackUploadChunkQuerySerializer(serializers.Serializer):
+    offset = serializers.IntegerField(min_value=0, help_text="Where this chunk starts; must equal the upload's offset")
+    sha256 = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False, allow_blank=True,
+                                    help_text="Of this chunk; a mismatch rejects it")
+
+class TrackUploadConflictSerializer(serializers.Serializer):
+    detail = serializers.CharField()
+    offset = serializers.IntegerField()
+
+class TrackUploadFinalizeSerializer(serializers.Serializer):
+    analyze = serializers.BooleanField(required=False, default=False,
+                                       help_text="Queue tempo analysis and waveform peaks for the new track")
 
 class ProcessTrackRequestSerializer(serializers.Serializer):
     denoise = serializers.BooleanField(required=False, default=True)
+    denoise_mode = serializers.ChoiceField(choices=["accurate", "fast"], required=False, default="accurate")
+    stretch_engine = serializers.ChoiceField(choices=["phase_vocoder", "wsola"], required=False, default="phase_vocoder")
     add_beats = serializers.BooleanField(required=False, default=True)
     style = serializers.ChoiceField(
         choices=["afrobeats", "hiphop", "house", "pop", "none"],
@@ -15,6 +73,8 @@ class ProcessTrackRequestSerializer(serializers.Serializer):
     )
     tempo = serializers.IntegerField(required=False, min_value=60, max_value=200)
     intensity = serializers.ChoiceField(choices=["soft", "medium", "hard"], required=False, default="medium")
+    preview = serializers.BooleanField(required=False, default=False)
+    profile = serializers.BooleanField(required=False, default=False)  # staff only: cProfile the render
 
 class TrackProcessingStatusSerializer(serializers.Serializer):
     job_id = serializers.CharField()
@@ -22,10 +82,90 @@ class TrackProcessingStatusSerializer(serializers.Serializer):
     message = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     processed_file = serializers.CharField(required=False, allow_blank=True, allow_null=True)
 
+class JobStageTimingSerializer(serializers.Serializer):
+    stage = serializers.CharField()
+    calls = serializers.IntegerField()
+    wall_seconds = serializers.FloatField()
+    cpu_seconds = serializers.FloatField()
+    peak_rss_delta_mb = serializers.FloatField()
+
 # NEW
 class JobSerializer(serializers.Serializer):
     id = serializers.CharField()
-    status = serializers.ChoiceField(choices=["queued", "running", "succeeded", "failed"])
+    track = serializers.IntegerField(source="track_id", read_only=True)
+    status = serializers.ChoiceField(choices=["queued", "running", "succeeded", "failed"], source="api_status")
     progress = serializers.IntegerField(required=False, min_value=0, max_value=100)
-    message = serializers.CharField(required=False, allow_blank=True, allow_null=True)
-    result_url = serializers.URLField(required=False, allow_blank=True, allow_null=True)
\ No newline at end of file
+    message = serializers.CharField(required=False, allow_blank=True, allow_null=True, source="last_message")
+    result_url = serializers.FileField(source="output_file", read_only=True)
+    is_preview = serializers.BooleanField(read_only=True)
+    timings = JobStageTimingSerializer(many=True, read_only=True)
+    profile_url = serializers.FileField(source="profile_file", read_only=True)
+    queue = serializers.CharField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    started_at = serializers.DateTimeField(read_only=True, allow_null=True)
+    finished_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+class JobListQuerySerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=["queued", "running", "succeeded", "failed"], required=False)
+    track = serializers.IntegerField(required=False)
+    preview = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+class JobEventSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    created_at = serializers.DateTimeField()
+    stage = serializers.CharField(allow_blank=True)
+    level = serializers.ChoiceField(choices=["INFO", "WARNING", "ERROR"])
+    message = serializers.CharField(allow_blank=True)
+    metrics = serializers.DictField()
+
+class JobEventQuerySerializer(serializers.Serializer):
+    after = serializers.IntegerField(required=False, min_value=0, default=0, help_text="Return events after this id")
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=500, default=100)
+    level = serializers.ChoiceField(choices=["INFO", "WARNING", "ERROR"], required=False)
+    stage = serializers.CharField(required=False, allow_blank=True, help_text="Empty for status events")
+
+class JobEventPageSerializer(serializers.Serializer):
+    events = JobEventSerializer(many=True)
+    next_after = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+
+class QueueStatsSerializer(serializers.Serializer):
+    queue = serializers.CharField()
+    held = serializers.IntegerField(help_text="Jobs waiting for a fair-share slot, not yet sent to Celery")
+    waiting = serializers.IntegerField(help_text="Jobs in the broker, not started")
+    running = serializers.IntegerField()
+    users = serializers.IntegerField(help_text="Users with active jobs on this queue")
+    oldest_wait_seconds = serializers.FloatField(help_text="Age of the oldest job not started yet")
+
+class TrackAudioQuerySerializer(serializers.Serializer):
+    source = serializers.ChoiceField(choices=["original", "processed"], required=False)
+    token = serializers.CharField(required=False, help_text="From the track's audio_url; stands in for authentication")
+
+class WaveformPeaksQuerySerializer(serializers.Serializer):
+    source = serializers.ChoiceField(choices=["original", "processed"], required=False)
+    level = serializers.IntegerField(required=False, min_value=0)
+    width = serializers.IntegerField(required=False, min_value=1, max_value=65536)
+    start = serializers.FloatField(required=False, min_value=0, default=0)
+    end = serializers.FloatField(required=False, min_value=0, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if attrs["end"] is not None and attrs["end"] <= attrs["start"]:
+            raise serializers.ValidationError("end must be after start.")
+        return attrs
+
+class BatchProcessRequestSerializer(ProcessTrackRequestSerializer):
+    job_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    track_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    workers = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if bool(attrs.get("job_ids")) == bool(attrs.get("track_ids")):
+            raise serializers.ValidationError("Provide either job_ids or track_ids.")
+        return attrs
+
+class BatchProcessResponseSerializer(serializers.Serializer):
+    job_ids = serializers.ListField(child=serializers.IntegerField())
+    task_ids = serializers.ListField(child=serializers.CharField())
+    skipped_job_ids = serializers.ListField(
+        child=serializers.IntegerField(), help_text="Jobs not re-queued: queued in Celery, running or done"
+    )
\ No newline at end of file
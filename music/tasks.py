@@ -0,0 +1,8 @@
+from celery import shared_task
+from . import uploads
+
+
+@shared_task
+def expire_uploads_task():
+    """Clean up abandoned chunked uploads; scheduled by CELERY_BEAT_SCHEDULE['expire-uploads']."""
+    return {'ok': True, 'expired': uploads.expire()}
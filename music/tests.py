@@ -1,3 +1,409 @@
-from django.test import TestCase
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from ai_engine import events
+from . import delivery, uploads
+from .models import JobEvent, ProcessingJob, Track, TrackUpload
 
-# Create your tests here.
+
+def parse_event(chunk):
+    """The JSON of one `event: progress` SSE message."""
+    lines = chunk.decode().splitlines()
+    return json.loads(next(line for line in lines if line.startswith("data: "))[len("data: "):])
+
+
+@override_settings(AI_ENGINE_EVENTS_BACKEND="ai_engine.events.LocalBroker")
+class JobEventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="listener", password="x")
+        track = Track.objects.create(owner=cls.user, title="t", original_file="tracks/t.wav")
+        cls.job = ProcessingJob.objects.create(track=track, created_by=cls.user, state=ProcessingJob.State.RUNNING,
+                                               progress=5)
+        cls.url = f"/api/music/jobs/{cls.job.id}/events/"
+
+    def setUp(self):
+        events.broker.cache_clear()
+        self.addCleanup(events.broker.cache_clear)
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def publish(self, **event):
+        events.publish(self.job.id, {"job_id": self.job.id, **event})
+
+    async def test_asgi_stream_relays_published_events(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        self.assertEqual(parse_event(await anext(stream))["progress"], 5)  # the DB state: nothing published yet
+
+        self.publish(status="running", progress=55, stage="stretch")
+        self.assertEqual(parse_event(await anext(stream))["stage"], "stretch")
+        self.publish(status="succeeded", progress=100)
+        self.assertEqual(parse_event(await anext(stream))["status"], "succeeded")
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)  # a terminal event ends the stream
+
+    @override_settings(AI_ENGINE_EVENTS_POLL_SECONDS=7)
+    def test_wsgi_falls_back_to_polling(self):
+        self.publish(status="running", progress=30, stage="denoise")
+        response = self.client.get(self.url)
+        chunks = list(response.streaming_content)
+        self.assertEqual(chunks[0], b"retry: 7000\n\n")
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(parse_event(chunks[1])["stage"], "denoise")
+
+    def test_polls_after_the_first_skip_the_db(self):
+        chunks = list(self.client.get(self.url).streaming_content)
+        token = chunks[1].decode().splitlines()[0][len("id: "):]
+        self.publish(status="running", progress=60, stage="stretch")
+        with self.assertNumQueries(0):
+            chunks = list(self.client.get(self.url, HTTP_LAST_EVENT_ID=token).streaming_content)
+        self.assertEqual(parse_event(chunks[1])["stage"], "stretch")
+        self.assertIn(f"id: {token}\n".encode(), chunks[1])  # the same token: ownership is re-checked when it expires
+
+        self.publish(status="succeeded", progress=100)  # maybe stale, so a terminal event sends it back to the DB
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(self.client.get(self.url, HTTP_LAST_EVENT_ID=token).streaming_content)
+        self.assertEqual(parse_event(chunks[1])["status"], "succeeded")
+        self.assertTrue(any("music_processingjob" in query["sql"] for query in queries))
+
+    def test_poll_token_is_bound_to_its_job(self):
+        chunks = list(self.client.get(self.url).streaming_content)
+        token = chunks[1].decode().splitlines()[0][len("id: "):]
+        other = ProcessingJob.objects.create(track=self.job.track, created_by=self.user)
+        self.client.logout()
+        self.assertEqual(self.client.get(f"/api/music/jobs/{other.id}/events/", HTTP_LAST_EVENT_ID=token).status_code,
+                         401)
+        with override_settings(AI_ENGINE_EVENTS_STREAM_SECONDS=-1):
+            self.assertEqual(self.client.get(self.url, HTTP_LAST_EVENT_ID=token).status_code, 401)
+
+    @override_settings(AI_ENGINE_EVENTS_WSGI_STREAMS=True)
+    def test_wsgi_stream_with_gevent_workers(self):
+        response = self.client.get(self.url)
+        stream = iter(response.streaming_content)
+        next(stream)
+        self.assertEqual(parse_event(next(stream))["status"], "running")
+        self.publish(status="failed", progress=5, message="ERROR: boom")
+        self.assertEqual(parse_event(next(stream))["message"], "ERROR: boom")
+        self.assertEqual(list(stream), [])
+
+    def test_finished_job_sends_its_final_state(self):
+        ProcessingJob.objects.filter(id=self.job.id).update(state=ProcessingJob.State.FAILED, last_message="ERROR: x")
+        chunks = list(self.client.get(self.url).streaming_content)
+        self.assertEqual([parse_event(chunk)["status"] for chunk in chunks], ["failed"])
+
+
+class MediaTestCase(TestCase):
+    """Files go to a throwaway MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        super().setUpClass()
+
+
+class TrackAudioUrlTests(MediaTestCase):
+    AUDIO = bytes(range(256)) * 16
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner", password="x")
+        cls.other = User.objects.create_user(username="other", password="x")
+        cls.track = Track(owner=cls.owner, title="t")
+        cls.track.original_file.save("t.wav", ContentFile(cls.AUDIO), save=True)
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def audio_url(self, user):
+        return self.client_for(user).get(f"/api/music/tracks/{self.track.id}/").json()["audio_url"]
+
+    def test_only_the_owner_gets_a_url(self):
+        self.assertIn("?token=", self.audio_url(self.owner))
+        self.assertIsNone(self.audio_url(self.other))
+        self.assertIsNone(self.audio_url(None))
+
+    def test_token_stands_in_for_authentication(self):
+        url = self.audio_url(self.owner)
+        response = self.client_for().get(url, HTTP_RANGE="bytes=0-9")  # as an <audio> element would
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.AUDIO[:10])
+        self.assertEqual(self.client_for().get(f"/api/music/tracks/{self.track.id}/audio/").status_code, 401)
+
+    def test_token_is_bound_to_track_and_action(self):
+        token = self.audio_url(self.owner).split("token=")[1]
+        other_track = Track.objects.create(owner=self.other, title="o", original_file=self.track.original_file.name)
+        anonymous = self.client_for()
+        self.assertEqual(anonymous.get(f"/api/music/tracks/{other_track.id}/audio/?token={token}").status_code, 401)
+        self.assertEqual(anonymous.get(f"/api/music/tracks/{self.track.id}/peaks/?token={token}").status_code, 401)
+        self.assertEqual(anonymous.get(f"/api/music/tracks/{self.track.id}/audio/?token=1:x:y").status_code, 401)
+
+    def test_token_expires(self):
+        url = self.audio_url(self.owner)
+        with override_settings(MEDIA_AUDIO_URL_SECONDS=-1):
+            self.assertEqual(self.client_for().get(url).status_code, 401)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        cases = {
+            "bytes=0-9": (0, 9),
+            "bytes=10-": (10, 99),
+            "bytes=90-200": (90, 99),  # clamped to the end
+            "bytes=-10": (90, 99),  # suffix
+            "bytes=-500": (0, 99),
+            "BYTES = 5-5": (5, 5),
+        }
+        for header, span in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(delivery.parse_range(header, 100), span)
+
+    def test_ignored_headers_send_the_whole_file(self):
+        for header in ("", "items=0-9", "bytes=0-9,20-29", "bytes=9-0", "bytes=a-b", "bytes=5"):
+            with self.subTest(header=header):
+                self.assertIsNone(delivery.parse_range(header, 100))
+
+    def test_unsatisfiable(self):
+        for header, size in (("bytes=100-", 100), ("bytes=-0", 100), ("bytes=-5", 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(delivery.RangeNotSatisfiable):
+                delivery.parse_range(header, size)
+
+
+@override_settings(MEDIA_ACCEL_MODE="")
+class AudioDeliveryTests(MediaTestCase):
+    AUDIO = bytes(range(256)) * 16
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="player", password="x")
+        cls.track = Track(owner=cls.user, title="t")
+        cls.track.original_file.save("t.wav", ContentFile(cls.AUDIO), save=True)
+        cls.url = f"/api/music/tracks/{cls.track.id}/audio/"
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.validators = self.client.get(self.url)
+        self.addCleanup(self.validators.close)
+
+    def test_whole_file(self):
+        response = self.validators
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], str(len(self.AUDIO)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(response.streaming_content), self.AUDIO)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.AUDIO)}")
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(b"".join(response.streaming_content), self.AUDIO[100:200])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.AUDIO)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.AUDIO)}")
+
+    def test_revalidation(self):
+        etag, last_modified = self.validators["ETag"], self.validators["Last-Modified"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_if_range(self):
+        etag, last_modified = self.validators["ETag"], self.validators["Last-Modified"]
+        for if_range, status in ((etag, 206), (last_modified, 206), ('"stale"', 200),
+                                 ("Sat, 01 Jan 2000 00:00:00 GMT", 200)):
+            with self.subTest(if_range=if_range):
+                response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, status)  # a stale If-Range gets the whole new file
+        stale = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.AUDIO)}-", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)  # the range isn't even looked at
+
+
+class UploadProtocolTests(MediaTestCase):
+    DATA = os.urandom(3000)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="uploader", password="x")
+
+    def setUp(self):
+        self.enterContext(override_settings(TRACK_UPLOAD_DIR=os.path.join(self.media_root, "uploads")))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, **extra):
+        response = self.client.post("/api/music/uploads/", {"title": "t", "filename": "t.wav", "size": len(self.DATA),
+                                                            **extra}, format="json")
+        self.assertEqual(response.status_code, 201)
+        return TrackUpload.objects.get(id=response.json()["id"])
+
+    def put(self, upload, offset, data, **query):
+        query = "".join(f"&{key}={value}" for key, value in query.items())
+        return self.client.put(f"/api/music/uploads/{upload.id}/chunk/?offset={offset}{query}", data,
+                               content_type="application/octet-stream")
+
+    def finalize(self, upload, analyze=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/api/music/uploads/{upload.id}/finalize/", {"analyze": analyze}, format="json")
+
+    def test_chunks_must_start_at_the_offset(self):
+        upload = self.start()
+        self.assertEqual(self.put(upload, 0, self.DATA[:1000]).json()["offset"], 1000)
+        for offset in (0, 1500):  # a resent chunk, a gap
+            response = self.put(upload, offset, self.DATA[offset:offset + 1000])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()["offset"], 1000)
+        self.assertEqual(self.finalize(upload).status_code, 409)  # bytes missing
+
+        self.assertEqual(self.put(upload, 1000, self.DATA[1000:]).json()["offset"], len(self.DATA))
+        response = self.finalize(upload)
+        self.assertEqual(response.status_code, 201)
+        track = Track.objects.get(id=response.json()["id"])
+        self.assertEqual(track.original_file.read(), self.DATA)
+        self.assertEqual(track.content_hash, hashlib.sha256(self.DATA).hexdigest())
+        self.assertFalse(os.path.exists(uploads.partial_path(upload)))
+        self.assertEqual(self.finalize(upload).json()["id"], track.id)  # a retry gets the same track
+
+    def test_chunk_is_refused_while_another_is_written(self):
+        upload = self.start()
+        with open(uploads.partial_path(upload), "r+b") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)  # as append() holds it
+            response = self.put(upload, 0, self.DATA)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("Another chunk", response.json()["detail"])
+        self.assertEqual(self.put(upload, 0, self.DATA).status_code, 200)
+
+    def test_digests_are_verified(self):
+        upload = self.start(sha256=hashlib.sha256(b"something else").hexdigest())
+        response = self.put(upload, 0, self.DATA, sha256=hashlib.sha256(b"not this chunk").hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/api/music/uploads/{upload.id}/").json()["offset"], 0)
+
+        self.assertEqual(self.put(upload, 0, self.DATA, sha256=hashlib.sha256(self.DATA).hexdigest()).status_code, 200)
+        self.assertEqual(self.finalize(upload).status_code, 400)  # the whole file isn't what was declared
+        self.assertFalse(TrackUpload.objects.filter(id=upload.id).exists())
+        self.assertFalse(Track.objects.exists())
+
+    def test_discard_and_expiry(self):
+        discarded, stale, fresh = self.start(), self.start(), self.start()
+        self.assertEqual(self.client.delete(f"/api/music/uploads/{discarded.id}/").status_code, 204)
+        self.assertFalse(os.path.exists(uploads.partial_path(discarded)))
+        self.assertEqual(self.client.get(f"/api/music/uploads/{discarded.id}/").status_code, 404)
+
+        TrackUpload.objects.filter(id=stale.id).update(updated_at=timezone.now() - timedelta(hours=25))
+        self.assertEqual(uploads.expire(), 1)
+        self.assertFalse(TrackUpload.objects.filter(id=stale.id).exists())
+        self.assertFalse(os.path.exists(uploads.partial_path(stale)))
+        self.assertTrue(os.path.exists(uploads.partial_path(fresh)))
+
+    def test_failed_save_leaves_the_upload_to_retry(self):
+        upload = self.start()
+        self.put(upload, 0, self.DATA)
+        tracks_dir = os.path.join(self.media_root, "tracks", str(self.user.id))
+        os.makedirs(tracks_dir, exist_ok=True)
+        stored = os.listdir(tracks_dir)
+        with mock.patch.object(Track, "save", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                uploads.finalize(upload)
+        self.assertEqual(os.listdir(tracks_dir), stored)  # no orphaned file
+        self.assertTrue(os.path.exists(uploads.partial_path(upload)))
+        self.assertEqual(self.finalize(upload).status_code, 201)
+
+    def test_peaks_are_queued_once(self):
+        for analyze in (False, True):
+            with self.subTest(analyze=analyze), mock.patch("ai_engine.tasks.generate_peaks_task.delay") as peaks, \
+                    mock.patch("music.uploads.analyze_track_task.delay") as analysis:
+                upload = self.start()
+                self.put(upload, 0, self.DATA)
+                self.assertEqual(self.finalize(upload, analyze=analyze).status_code, 201)
+                self.assertEqual((peaks.call_count, analysis.call_count), (0, 1) if analyze else (1, 0))
+
+
+class SubmitJobTests(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="artist", password="x")
+        cls.track = Track(owner=cls.user, title="t")
+        cls.track.original_file.save("t.wav", ContentFile(b"RIFF"), save=True)
+
+    def test_dispatch_failure_leaves_the_job_queued(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch("ai_engine.scheduling.dispatch", side_effect=ConnectionError("broker down")), \
+                self.assertLogs("music.views", "WARNING"), self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f"/api/music/tracks/{self.track.id}/process/", {"tempo": 126}, format="json")
+        self.assertEqual(response.status_code, 202)
+        job = ProcessingJob.objects.get(id=response.json()["job_id"])
+        self.assertEqual(job.state, ProcessingJob.State.QUEUED)
+        self.assertIsNone(job.dispatched_at)  # dispatch_held_jobs_task picks it up
+
+
+class JobEventLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="reader", password="x")
+        track = Track.objects.create(owner=cls.user, title="t", original_file="tracks/t.wav")
+        cls.job = ProcessingJob.objects.create(track=track, created_by=cls.user)
+        JobEvent.objects.bulk_create([
+            JobEvent(job=cls.job, message=f"event {i}", stage="stretch" if i % 2 else "",
+                     level=JobEvent.Level.WARNING if i == 3 else JobEvent.Level.INFO)
+            for i in range(5)
+        ])
+        other = ProcessingJob.objects.create(track=track, created_by=cls.user)
+        JobEvent.objects.create(job=other, message="another job's")
+        cls.url = f"/api/music/jobs/{cls.job.id}/log/"
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def page(self, **query):
+        return self.client.get(self.url, query).json()
+
+    def test_pages_follow_next_after(self):
+        messages, after = [], 0
+        while True:
+            page = self.page(after=after, limit=2)
+            messages += [event["message"] for event in page["events"]]
+            after = page["next_after"]
+            if not page["has_more"]:
+                break
+        self.assertEqual(messages, [f"event {i}" for i in range(5)])
+
+        self.assertEqual(self.page(after=after), {"events": [], "next_after": after, "has_more": False})
+        JobEvent.objects.create(job=self.job, message="later")
+        self.assertEqual([event["message"] for event in self.page(after=after)["events"]], ["later"])
+
+    def test_filters(self):
+        self.assertEqual([event["message"] for event in self.page(level="WARNING")["events"]], ["event 3"])
+        self.assertEqual([event["message"] for event in self.page(stage="stretch")["events"]], ["event 1", "event 3"])
+        self.assertEqual(len(self.page(stage="")["events"]), 3)
+
+    def test_page_cost_does_not_grow_with_the_log(self):
+        last = self.page()["next_after"]
+        with CaptureQueriesContext(connection) as queries:
+            self.page(after=last - 1)
+        event_queries = [query["sql"] for query in queries if "music_jobevent" in query["sql"]]
+        self.assertEqual(len(event_queries), 1)
+        self.assertNotIn("OFFSET", event_queries[0])
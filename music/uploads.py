@@ -0,0 +1,226 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from ai_engine.tasks import analyze_track_task
+from .models import Track, TrackUpload
+
+# Chunked uploads: init declares the size, each chunk is streamed from the request straight into
+# a partial file at the offset the server has confirmed so far, and finalise turns the file into a
+# Track. Nothing holds more than READ_BLOCK bytes of it in memory. A client that loses its
+# connection asks for the upload's offset and carries on from there.
+
+READ_BLOCK = 1024 * 1024
+
+# Running SHA-256 of each upload's bytes so far, kept by the process that received its chunks.
+# hashlib state can't be stored, so if a chunk lands elsewhere (another worker, a restart) the
+# chain breaks and finalise re-reads the file instead.
+MAX_DIGESTS = 256
+_digests = OrderedDict()  # upload id -> (offset, sha256 object)
+_digests_lock = threading.Lock()
+
+
+class UploadConflict(Exception):
+    """The chunk doesn't start at the upload's offset, or the upload is busy or no longer open."""
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+def partial_path(upload):
+    return os.path.join(settings.TRACK_UPLOAD_DIR, f'{upload.id}.part')
+
+
+def start(owner, title, filename, size, sha256=''):
+    upload = TrackUpload.objects.create(
+        owner=owner, title=title, filename=get_valid_filename(os.path.basename(filename)) or 'upload',
+        size=size, sha256=(sha256 or '').lower(),
+    )
+    os.makedirs(settings.TRACK_UPLOAD_DIR, exist_ok=True)
+    open(partial_path(upload), 'wb').close()
+    return upload
+
+
+def _running_digest(upload_id, offset):
+    """A copy of the running digest if it covers exactly `offset` bytes, else None."""
+    if offset == 0:
+        return hashlib.sha256()
+    with _digests_lock:
+        entry = _digests.get(upload_id)
+        return entry[1].copy() if entry and entry[0] == offset else None
+
+
+def _remember_digest(upload_id, offset, digest):
+    with _digests_lock:
+        _digests.pop(upload_id, None)
+        if digest is not None:
+            _digests[upload_id] = (offset, digest)
+            while len(_digests) > MAX_DIGESTS:
+                _digests.popitem(last=False)
+
+
+def _forget_digest(upload_id):
+    with _digests_lock:
+        _digests.pop(upload_id, None)
+
+
+def append(upload, offset, stream, length, chunk_sha256=''):
+    """Write `length` bytes read from `stream` at `offset`; returns the new offset.
+
+    Raises UploadConflict unless `offset` is where the upload stands (the response carries
+    where that is), and ValueError for a short, oversized or corrupt chunk, which leaves the
+    offset where it was so the chunk can simply be sent again.
+    """
+    try:
+        fh = open(partial_path(upload), 'r+b')
+    except FileNotFoundError:
+        raise UploadConflict('Upload is no longer open.', upload.received)
+    with fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict('Another chunk of this upload is being written.', upload.received)
+        upload.refresh_from_db(fields=['received', 'state'])
+        if upload.state != TrackUpload.State.UPLOADING:
+            raise UploadConflict('Upload is already complete.', upload.received)
+        if offset != upload.received:
+            raise UploadConflict(f'Expected a chunk at offset {upload.received}.', upload.received)
+        if offset + length > upload.size:
+            raise ValueError(f'Chunk ends past the declared size of {upload.size} bytes.')
+
+        running, chunk = _running_digest(upload.id, offset), hashlib.sha256()
+        fh.seek(offset)
+        remaining = length
+        while remaining:
+            block = stream.read(min(READ_BLOCK, remaining))
+            if not block:
+                raise ValueError(f'Chunk ended after {length - remaining} of {length} bytes.')
+            fh.write(block)
+            chunk.update(block)
+            if running is not None:
+                running.update(block)
+            remaining -= len(block)
+        if chunk_sha256 and chunk.hexdigest() != chunk_sha256.lower():
+            raise ValueError('Chunk does not match its sha256.')
+
+        fh.flush()
+        upload.received = offset + length
+        upload.save(update_fields=['received', 'updated_at'])
+        _remember_digest(upload.id, upload.received, running)
+    return upload.received
+
+
+def file_digest(path, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        while size > 0:
+            block = fh.read(min(READ_BLOCK, size))
+            if not block:
+                break
+            digest.update(block)
+            size -= len(block)
+    return digest.hexdigest()
+
+
+def _store(storage, name, path):
+    """Put a copy of the finished partial file into storage as `name`; a hard link on local storage, else streamed.
+
+    The partial file stays until the Track is committed, so a failed finalise can be retried.
+    """
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        with open(path, 'rb') as fh:
+            return storage.save(name, File(fh))
+    name = storage.get_available_name(name)
+    target = storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except OSError:  # e.g. TRACK_UPLOAD_DIR on another filesystem
+        shutil.copyfile(path, target)
+    return name
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def finalize(upload, analyze=False):
+    """Turn a fully received upload into a Track; finalising again returns the same track.
+
+    With `analyze`, analyze_track_task runs once it commits (and computes the waveform peaks too).
+    Raises UploadConflict while bytes are missing, and ValueError (discarding the upload) when
+    the file doesn't match the sha256 declared at init.
+    """
+    path = partial_path(upload)
+    try:
+        fh = open(path, 'r+b')
+    except FileNotFoundError:
+        fh = None  # finalised (or discarded) under us
+    if fh is None:
+        upload.refresh_from_db()
+        if upload.track_id:
+            return upload.track
+        raise UploadConflict('Upload is no longer open.', upload.received)
+
+    with fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        upload.refresh_from_db()
+        if upload.track_id:
+            return upload.track
+        if upload.received != upload.size:
+            raise UploadConflict(f'{upload.size - upload.received} bytes still to upload.', upload.received)
+        fh.truncate(upload.size)  # drop anything a failed chunk wrote past the offset
+
+        running = _running_digest(upload.id, upload.size)
+        digest = running.hexdigest() if running is not None else file_digest(path, upload.size)
+        _forget_digest(upload.id)
+        if upload.sha256 and digest != upload.sha256:
+            discard(upload)
+            raise ValueError('Uploaded file does not match its sha256; start a new upload.')
+
+        track = Track(owner_id=upload.owner_id, title=upload.title, content_hash=digest)
+        track.skip_upload_peaks = analyze  # one job for them, not two
+        storage = track.original_file.storage
+        track.original_file.name = _store(storage, track.original_file.field.generate_filename(track, upload.filename),
+                                          path)
+        try:
+            with transaction.atomic():
+                track.save()
+                upload.track, upload.sha256, upload.state = track, digest, TrackUpload.State.COMPLETE
+                upload.save(update_fields=['track', 'sha256', 'state', 'updated_at'])
+        except BaseException:
+            storage.delete(track.original_file.name)
+            raise
+        transaction.on_commit(lambda: _remove(path))
+        if analyze:
+            transaction.on_commit(lambda: analyze_track_task.delay(track.id))
+    return track
+
+
+def discard(upload):
+    _forget_digest(upload.id)
+    _remove(partial_path(upload))
+    upload.delete()
+
+
+def expire():
+    """Discard uploads untouched for TRACK_UPLOAD_TTL_HOURS (finished ones just lose their row); returns how many."""
+    cutoff = timezone.now() - timedelta(hours=settings.TRACK_UPLOAD_TTL_HOURS)
+    stale = list(TrackUpload.objects.filter(updated_at__lt=cutoff))
+    for upload in stale:
+        discard(upload)
+    return len(stale)
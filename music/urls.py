@@ -1,8 +1,9 @@
 from rest_framework.routers import DefaultRouter
-from .views import TrackViewSet, JobViewSet
+from .views import TrackViewSet, TrackUploadViewSet, JobViewSet
 
 router = DefaultRouter()
 router.register(r"tracks", TrackViewSet, basename="track")
+router.register(r"uploads", TrackUploadViewSet, basename="upload")
 router.register(r"jobs", JobViewSet, basename="job") 
 
 urlpatterns = router.urls
\ No newline at end of file
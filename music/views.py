@@ -1,54 +1,630 @@
-import uuid
+import json
+import logging
+import time
+from dataclasses import asdict
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiTypes
-from .models import Track
+from ai_engine import events, results, scheduling, waveforms
+from ai_engine.peaks import pick_level, read_header, read_slice
+from ai_engine.params import ProcessParams
+from django.conf import settings
+from ai_engine.tasks import process_tracks_batch_task
+from . import delivery, uploads
+from .models import Track, TrackUpload, ProcessingJob, JobEvent
 from .serializers import (
     TrackSerializer,
+    TrackUploadStartSerializer,
+    TrackUploadSerializer,
+    TrackUploadChunkQuerySerializer,
+    TrackUploadConflictSerializer,
+    TrackUploadFinalizeSerializer,
     ProcessTrackRequestSerializer,
     TrackProcessingStatusSerializer,
     JobSerializer,  
+    JobListQuerySerializer,
+    JobEventSerializer,
+    JobEventQuerySerializer,
+    JobEventPageSerializer,
+    QueueStatsSerializer,
+    BatchProcessRequestSerializer,
+    BatchProcessResponseSerializer,
+    WaveformPeaksQuerySerializer,
+    TrackAudioQuerySerializer,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def submit_job(track, user, params, source_job=None, capture_profile=False):
+    """Create a ProcessingJob and either complete it from the result cache or enqueue it.
+
+    The job is routed by priority (preview, paid, free; see ai_engine.scheduling) and goes to
+    Celery once the user has a free fair-share slot. Previews leave the track's status alone.
+    Profiled jobs always render, so the profile reflects the current code.
+    """
+    job = ProcessingJob.objects.create(
+        track=track, created_by=user, params=asdict(params), is_preview=params.preview, source_job=source_job,
+        capture_profile=capture_profile, queue=scheduling.route(user, params.preview),
+    )
+
+    # Identical content + params already rendered: hand back that output, skip the queue. Only with
+    # the upload's hash already known: hashing it here would hold the request for a whole-file read
+    # (the worker hashes it and checks the cache again)
+    cached = None
+    if not capture_profile and track.content_hash:
+        cached = results.lookup(results.cache_key_for(params, track.content_hash))
+    if cached is not None:
+        job.output_file.name = cached.output_file.name
+        job.mark_done(cached.meta, "Reused cached result.")
+        JobEvent.objects.create(job=job, message=job.last_message)
+        return Response(
+            {"job_id": str(job.id), "status": "succeeded", "processed_file": job.output_file.url},
+            status=status.HTTP_200_OK,
+        )
+
+    if not params.preview:
+        Track.objects.filter(id=track.id).update(status=Track.Status.PROCESSING)
+    transaction.on_commit(lambda: dispatch_held(user.id))  # the job must be visible to the worker
+    return Response({"job_id": str(job.id), "status": "queued"}, status=status.HTTP_202_ACCEPTED)
+
+
+def dispatch_held(user_id):
+    """The job is saved: if Celery can't take it now, it stays queued for dispatch_held_jobs_task."""
+    try:
+        scheduling.dispatch(user_id)
+    except Exception:
+        logger.warning("Could not dispatch jobs of user %s; left for the periodic dispatch", user_id, exc_info=True)
+
+
 class TrackViewSet(viewsets.ModelViewSet):
     queryset = Track.objects.all()
     serializer_class = TrackSerializer
 
+    # Rendering and the track's audio are its owner's (and staff's): anyone else gets a 404
+    OWNER_ACTIONS = ("process", "audio", "peaks")
+
+    def get_permissions(self):
+        if self.has_audio_token():
+            return [AllowAny()]
+        if self.action in self.OWNER_ACTIONS:
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        tracks = super().get_queryset()
+        if self.action in self.OWNER_ACTIONS and not self.request.user.is_staff and not self.has_audio_token():
+            tracks = tracks.filter(owner=self.request.user)
+        return tracks
+
+    def has_audio_token(self):
+        """A valid `token` from audio_url (issued to the owner) grants the audio action, e.g. for <audio src>."""
+        token = self.request.query_params.get("token")
+        return self.action == "audio" and bool(token) and delivery.check_audio_token(token, self.kwargs.get("pk"))
+
     @extend_schema(
         tags=["Tracks", "AI Processing"],
-        summary="Start AI processing for a track (denoise, add beats)",
+        summary="Start AI processing for a track (denoise, add beats); preview=true renders a short excerpt",
         request=ProcessTrackRequestSerializer,
-        responses={202: TrackProcessingStatusSerializer},
+        responses={200: TrackProcessingStatusSerializer, 202: TrackProcessingStatusSerializer},
     )
     @action(detail=True, methods=["post"], url_path="process")
     def process(self, request, pk=None):
+        track = self.get_object()
         payload = ProcessTrackRequestSerializer(data=request.data)
         payload.is_valid(raise_exception=True)
-        job_id = str(uuid.uuid4())
-        return Response({"job_id": job_id, "status": "queued"}, status=status.HTTP_202_ACCEPTED)
+        params = ProcessParams.from_request(payload.validated_data, analysis_sr=settings.AI_ENGINE_ANALYSIS_SR or None)
+        capture_profile = payload.validated_data["profile"] and request.user.is_staff
+        return submit_job(track, request.user, params, capture_profile=capture_profile)
+
+    @extend_schema(
+        tags=["Tracks"],
+        summary="Stream a track's audio, with byte ranges for seeking",
+        description=(
+            "Defaults to the processed file when there is one. Supports a single `Range: bytes=` range "
+            "(206), `If-Range`, and revalidation with `If-None-Match`/`If-Modified-Since` (304). "
+            "Authenticate as the owner, or pass the `token` of the track's `audio_url`."
+        ),
+        parameters=[TrackAudioQuerySerializer],
+        responses={
+            (200, "audio/*"): OpenApiTypes.BINARY, (206, "audio/*"): OpenApiTypes.BINARY,
+            304: None, 404: None, 416: None,
+        },
+    )
+    @action(detail=True, methods=["get"], url_path="audio")
+    def audio(self, request, pk=None):
+        track = self.get_object()
+        query = TrackAudioQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        source = query.validated_data.get("source") or ("processed" if track.processed_file else "original")
+        field = waveforms.source_file(track, source)
+        if not field or not field.storage.exists(field.name):
+            return Response({"detail": f"Track has no {source} file."}, status=status.HTTP_404_NOT_FOUND)
+        return delivery.audio_response(request, field)
+
+    @extend_schema(
+        tags=["Tracks"],
+        summary="Waveform min/max peaks for drawing (binary)",
+        description=(
+            "Without level/width the whole pyramid file is returned. With `level` (0 = finest, 256 samples "
+            "per peak, each level 4x coarser) or `width` (pixels to fill; picks the coarsest adequate level) "
+            "returns that level between `start` and `end` seconds: a 28-byte little-endian header "
+            "(b'WPKS', uint32 sr, uint32 samples per peak, uint64 first peak index, uint64 count) "
+            "followed by int8 (min, max) pairs scaled by 127. 202 while peaks are still being generated."
+        ),
+        parameters=[WaveformPeaksQuerySerializer],
+        responses={(200, "application/octet-stream"): OpenApiTypes.BINARY, 202: None},
+    )
+    @action(detail=True, methods=["get"], url_path="peaks")
+    def peaks(self, request, pk=None):
+        track = self.get_object()
+        query = WaveformPeaksQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        opts = query.validated_data
+        source = opts.get("source") or ("processed" if track.processed_file else "original")
+        field = waveforms.source_file(track, source)
+        if not field:
+            return Response({"detail": f"Track has no {source} file."}, status=status.HTTP_404_NOT_FOUND)
+
+        entry = waveforms.lookup(field.name)
+        if entry is None:
+            waveforms.request_generation(track, source)
+            return Response({"detail": "Peaks are being generated."}, status=status.HTTP_202_ACCEPTED)
+
+        if opts.get("level") is None and opts.get("width") is None:
+            return FileResponse(entry.peaks_file.open("rb"), content_type="application/octet-stream")
+        with entry.peaks_file.open("rb") as fh:
+            header = read_header(fh)
+            end = opts["end"] if opts["end"] is not None else header["samples"] / header["sr"]
+            level = opts.get("level")
+            if level is None:
+                level = pick_level(header, opts["start"], end, opts["width"])
+            level = min(level, len(header["level_spp"]) - 1)
+            data = read_slice(fh, header, level, opts["start"], end)
+        return HttpResponse(data, content_type="application/octet-stream")
+
+def upload_conflict(error):
+    return Response({"detail": str(error), "offset": error.offset}, status=status.HTTP_409_CONFLICT)
+
+
+class TrackUploadViewSet(viewsets.GenericViewSet):
+    """Chunked, resumable track uploads: start, PUT chunks in order, finalise into a Track.
+
+    For files past the plain upload limit (25 MB): chunks are streamed to disk as they arrive.
+    After a dropped connection, GET the upload and resume from its `offset`.
+    """
+    serializer_class = TrackUploadSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = "id"
+    lookup_url_kwarg = "id"
+
+    def get_queryset(self):
+        return TrackUpload.objects.filter(owner=self.request.user)
+
+    @extend_schema(tags=["Uploads"], summary="Start a chunked upload", request=TrackUploadStartSerializer,
+                   responses={201: TrackUploadSerializer})
+    def create(self, request):
+        payload = TrackUploadStartSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        upload = uploads.start(request.user, **payload.validated_data)
+        return Response(TrackUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(tags=["Uploads"], summary="Get an upload's offset (where to resume)",
+                   parameters=[OpenApiParameter("id", OpenApiTypes.UUID, OpenApiParameter.PATH)],
+                   responses=TrackUploadSerializer)
+    def retrieve(self, request, id=None):
+        return Response(TrackUploadSerializer(self.get_object()).data)
+
+    @extend_schema(tags=["Uploads"], summary="Abandon an upload",
+                   parameters=[OpenApiParameter("id", OpenApiTypes.UUID, OpenApiParameter.PATH)],
+                   responses={204: None})
+    def destroy(self, request, id=None):
+        upload = self.get_object()
+        if upload.state == TrackUpload.State.UPLOADING:
+            uploads.discard(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @extend_schema(
+        tags=["Uploads"],
+        summary="Append a chunk (raw bytes) at the upload's offset",
+        description=(
+            "The body is the chunk itself (Content-Length required, at most `max_chunk_size` bytes). "
+            "409 means `offset` isn't where the upload stands; its `offset` says where to continue."
+        ),
+        parameters=[OpenApiParameter("id", OpenApiTypes.UUID, OpenApiParameter.PATH), TrackUploadChunkQuerySerializer],
+        request={"application/octet-stream": OpenApiTypes.BINARY},
+        responses={200: TrackUploadSerializer, 409: TrackUploadConflictSerializer},
+    )
+    @action(detail=True, methods=["put"], url_path="chunk")
+    def chunk(self, request, id=None):
+        upload = self.get_object()
+        query = TrackUploadChunkQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or "")
+        except ValueError:
+            return Response({"detail": "Content-Length is required."}, status=status.HTTP_411_LENGTH_REQUIRED)
+        if not 0 < length <= settings.TRACK_UPLOAD_CHUNK_MB * 1024 * 1024:
+            return Response({"detail": f"Chunks must be 1 byte to {settings.TRACK_UPLOAD_CHUNK_MB} MB."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # The raw request stream: request.data would read the whole body into memory
+            uploads.append(upload, query.validated_data["offset"], request.stream, length,
+                           query.validated_data.get("sha256", ""))
+        except uploads.UploadConflict as e:
+            return upload_conflict(e)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(TrackUploadSerializer(upload).data)
+
+    @extend_schema(
+        tags=["Uploads"],
+        summary="Finish an upload: create the Track (optionally queueing its analysis)",
+        description="Safe to retry: finalising a completed upload returns its track again (200).",
+        parameters=[OpenApiParameter("id", OpenApiTypes.UUID, OpenApiParameter.PATH)],
+        request=TrackUploadFinalizeSerializer,
+        responses={200: TrackSerializer, 201: TrackSerializer, 409: TrackUploadConflictSerializer},
+    )
+    @action(detail=True, methods=["post"], url_path="finalize")
+    def finalize(self, request, id=None):
+        upload = self.get_object()
+        payload = TrackUploadFinalizeSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        if upload.track_id:
+            return Response(TrackSerializer(upload.track, context={"request": request}).data)
+        try:
+            track = uploads.finalize(upload, analyze=payload.validated_data["analyze"])
+        except uploads.UploadConflict as e:
+            return upload_conflict(e)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(TrackSerializer(track, context={"request": request}).data, status=status.HTTP_201_CREATED)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients ask for text/event-stream; the stream is a StreamingHttpResponse, so this only renders errors."""
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse(data, "error").encode()
+
+
+def sse(data, event="progress", id=None):
+    return (f"id: {id}\n" if id else "") + f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+JOB_STREAM_TOKEN_SALT = "music.views.job_events"
+
+
+def job_stream_token(job_id):
+    """Signed job id sent as a polled event's id; EventSource returns it as Last-Event-ID when it reconnects."""
+    return signing.TimestampSigner(salt=JOB_STREAM_TOKEN_SALT).sign(str(job_id))
+
+
+def check_job_stream_token(token, job_id):
+    # Expires after AI_ENGINE_EVENTS_STREAM_SECONDS, so a poller's access is re-checked in the DB that often
+    try:
+        signed = signing.TimestampSigner(salt=JOB_STREAM_TOKEN_SALT).unsign(
+            token, max_age=settings.AI_ENGINE_EVENTS_STREAM_SECONDS)
+    except signing.BadSignature:
+        return False
+    return signed == str(job_id)
+
+
+def first_event(current, latest):
+    """The event a stream starts with: the broker's latest, unless there is none or it is stale."""
+    # A terminal event for a job the DB has queued is from before it was resubmitted
+    stale = latest is not None and latest["status"] in events.TERMINAL_STATUSES and current["status"] == "queued"
+    return current if latest is None or stale else latest
+
+
+def job_event_stream(subscription, first):
+    """Relay a job's events until it finishes or AI_ENGINE_EVENTS_STREAM_SECONDS pass (EventSource then reconnects).
+
+    Comment lines every AI_ENGINE_EVENTS_KEEPALIVE_SECONDS keep proxies from closing a quiet stream.
+    """
+    deadline = time.monotonic() + settings.AI_ENGINE_EVENTS_STREAM_SECONDS
+    event = first
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse(event)
+                if event["status"] in events.TERMINAL_STATUSES:
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = subscription.get(min(settings.AI_ENGINE_EVENTS_KEEPALIVE_SECONDS, remaining))
+    finally:
+        subscription.close()
+
+
+async def async_job_event_stream(job_id, current):
+    """job_event_stream for ASGI servers: it waits on the event loop, so an open stream holds no worker."""
+    deadline = time.monotonic() + settings.AI_ENGINE_EVENTS_STREAM_SECONDS
+    yield "retry: 3000\n\n"
+    try:
+        subscription = await events.broker().asubscribe(job_id)  # before reading the latest event
+    except Exception:
+        yield sse(current)  # EventSource reconnects, so without a broker this degrades to polling
+        return
+    try:
+        try:
+            latest = await subscription.latest()
+        except Exception:
+            latest = None
+        event = first_event(current, latest)
+        while True:
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse(event)
+                if event["status"] in events.TERMINAL_STATUSES:
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = await subscription.get(min(settings.AI_ENGINE_EVENTS_KEEPALIVE_SECONDS, remaining))
+    finally:
+        await subscription.close()
+
+
+def job_event_poll(event, token):
+    """One event and a retry delay, for WSGI workers that can't hold a stream open: EventSource polls.
+
+    The event's id is `token`, so the next poll is answered from the broker alone (see JobViewSet.has_poll_token).
+    """
+    yield f"retry: {settings.AI_ENGINE_EVENTS_POLL_SECONDS * 1000}\n\n"
+    yield sse(event, id=token)
+
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx would otherwise hold events back
+    return response
+
+
+class JobPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 200
 
 
 class JobViewSet(viewsets.GenericViewSet):
     serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = JobPagination
     lookup_field = "id"       
     lookup_url_kwarg = "id"
 
+    def get_queryset(self):
+        return ProcessingJob.objects.filter(created_by=self.request.user).order_by("-created_at", "-id")
+
+    def has_poll_token(self):
+        """An events poll whose Last-Event-ID is a live job_stream_token for this job."""
+        if not hasattr(self, "_poll_token"):
+            token = self.request.META.get("HTTP_LAST_EVENT_ID")
+            self._poll_token = (self.action == "progress_events" and bool(token)
+                                and check_job_stream_token(token, self.kwargs.get("id")))
+        return self._poll_token
+
+    def perform_authentication(self, request):
+        if not self.has_poll_token():  # the token stands in for it, and authenticating reads the DB
+            super().perform_authentication(request)
+
+    def get_permissions(self):
+        if self.has_poll_token():
+            return [AllowAny()]
+        return super().get_permissions()
+
     @extend_schema(
         tags=["AI Jobs"],
-        summary="List processing jobs",
+        summary="List your processing jobs, newest first",
+        parameters=[JobListQuerySerializer],
         responses=JobSerializer(many=True),
     )
     def list(self, request):
-    
-        data = [{"id": "sample-job-1", "status": "queued"}]
-        return Response(data)
+        query = JobListQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        jobs = self.get_queryset()
+        if query.validated_data.get("status"):
+            states = [state for state, api in ProcessingJob.API_STATUS.items() if api == query.validated_data["status"]]
+            jobs = jobs.filter(state__in=states)
+        if query.validated_data.get("track") is not None:
+            jobs = jobs.filter(track_id=query.validated_data["track"])
+        if query.validated_data.get("preview") is not None:
+            jobs = jobs.filter(is_preview=query.validated_data["preview"])
+        page = self.paginate_queryset(jobs)
+        data = JobSerializer(page, many=True, context={"request": request}).data
+        return self.get_paginated_response(data)
 
     @extend_schema(
         tags=["AI Jobs"],
-        summary="Get a job by id",
+        summary="Get a job by id, with its per-stage timing breakdown",
         parameters=[OpenApiParameter("id", OpenApiTypes.STR, OpenApiParameter.PATH)],
         responses=JobSerializer,
     )
     def retrieve(self, request, id=None):
-        return Response({"id": id or "unknown", "status": "queued"})
\ No newline at end of file
+        job = get_object_or_404(self.get_queryset(), id=id)
+        return Response(JobSerializer(job, context={"request": request}).data)
+
+    @extend_schema(
+        tags=["AI Jobs"],
+        summary="Stream a job's progress as server-sent events",
+        description=(
+            "`progress` events carry JSON like the job's status: `job_id`, `status`, `progress`, and `stage`, "
+            "`message` or `result_url` when known. The first event is the current state; the stream ends after "
+            "a `succeeded` or `failed` event, or after a few minutes, when EventSource reconnects by itself. "
+            "Use this instead of polling GET /jobs/{id}/. Servers that can't hold streams open send one event "
+            "and a `retry` delay instead, so EventSource polls."
+        ),
+        parameters=[OpenApiParameter("id", OpenApiTypes.STR, OpenApiParameter.PATH)],
+        responses={(200, "text/event-stream"): OpenApiTypes.STR},
+    )
+    @action(detail=True, methods=["get"], url_path="events", renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def progress_events(self, request, id=None):
+        polling = not isinstance(request._request, ASGIRequest) and not settings.AI_ENGINE_EVENTS_WSGI_STREAMS
+        if polling and self.has_poll_token():
+            # A reconnecting poller already checked out: no authentication, no DB, unless the job may have
+            # finished (a terminal event can also be stale, from before the job was requeued)
+            try:
+                latest = events.broker().latest(int(id))
+            except Exception:
+                latest = None
+            if latest is not None and latest["status"] not in events.TERMINAL_STATUSES:
+                return event_stream_response(job_event_poll(latest, request.META["HTTP_LAST_EVENT_ID"]))
+            self._poll_token = False
+            self.perform_authentication(request)
+            self.check_permissions(request)
+
+        job = get_object_or_404(self.get_queryset(), id=id)  # once per stream, or per poll token
+        current = events.job_event(job)
+        if current["status"] in events.TERMINAL_STATUSES:
+            return event_stream_response(iter([sse(current)]))
+        if isinstance(request._request, ASGIRequest):
+            return event_stream_response(async_job_event_stream(job.id, current))
+        if polling:  # a sync worker per open stream would run out
+            try:
+                latest = events.broker().latest(job.id)
+            except Exception:
+                latest = None
+            return event_stream_response(job_event_poll(first_event(current, latest), job_stream_token(job.id)))
+        try:
+            subscription = events.broker().subscribe(job.id)  # before reading the latest event, so none is missed
+        except Exception:
+            return Response({"detail": "Progress stream unavailable; poll the job instead."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        try:
+            latest = events.broker().latest(job.id)
+        except Exception:
+            latest = None
+        return event_stream_response(job_event_stream(subscription, first_event(current, latest)))
+
+    @extend_schema(
+        tags=["AI Jobs"],
+        summary="Page through a job's event log, oldest first",
+        description=(
+            "Pass the returned `next_after` as `after` to get the following page; while the job runs, "
+            "polling with the last `next_after` returns only the events logged since."
+        ),
+        parameters=[OpenApiParameter("id", OpenApiTypes.STR, OpenApiParameter.PATH), JobEventQuerySerializer],
+        responses=JobEventPageSerializer,
+    )
+    @action(detail=True, methods=["get"], url_path="log")
+    def log(self, request, id=None):
+        job = get_object_or_404(self.get_queryset(), id=id)
+        query = JobEventQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        # Keyset paging on the (job, id) index: any page costs the same as the first
+        job_events = JobEvent.objects.filter(job=job, id__gt=params["after"]).order_by("id")
+        if params.get("level"):
+            job_events = job_events.filter(level=params["level"])
+        if params.get("stage") is not None:
+            job_events = job_events.filter(stage=params["stage"])
+        page = list(job_events[:params["limit"] + 1])
+        has_more, page = len(page) > params["limit"], page[:params["limit"]]
+        return Response({
+            "events": JobEventSerializer(page, many=True).data,
+            "next_after": page[-1].id if page else params["after"],
+            "has_more": has_more,
+        })
+
+    @extend_schema(
+        tags=["AI Jobs"],
+        summary="Confirm a finished preview and queue the full render",
+        description="Safe to retry: once a preview is confirmed, confirming it again returns the same full job.",
+        request=None,
+        parameters=[OpenApiParameter("id", OpenApiTypes.STR, OpenApiParameter.PATH)],
+        responses={200: TrackProcessingStatusSerializer, 202: TrackProcessingStatusSerializer, 409: None},
+    )
+    @action(detail=True, methods=["post"], url_path="confirm")
+    def confirm(self, request, id=None):
+        with transaction.atomic():
+            # Locked so concurrent confirms of one preview can't both queue a render
+            preview = get_object_or_404(
+                ProcessingJob.objects.select_for_update().select_related("track"),
+                id=id, created_by=request.user, is_preview=True,
+            )
+            if preview.state != ProcessingJob.State.DONE:
+                return Response({"detail": f"Preview is {preview.api_status}; only a finished preview can be confirmed."},
+                                status=status.HTTP_409_CONFLICT)
+            full = preview.follow_ups.filter(is_preview=False).order_by("id").first()
+            if full is not None:
+                data = {"job_id": str(full.id), "status": full.api_status, "message": full.last_message}
+                if full.api_status == "succeeded" and full.output_file:
+                    data["processed_file"] = full.output_file.url
+                return Response(data, status=status.HTTP_200_OK)
+            params = ProcessParams(**{**preview.params, "preview": False})
+            return submit_job(preview.track, request.user, params, source_job=preview)
+
+    @extend_schema(
+        tags=["AI Jobs"],
+        summary="Queue many jobs as batch renders (catalogue reprocessing)",
+        request=BatchProcessRequestSerializer,
+        responses={202: BatchProcessResponseSerializer},
+    )
+    @action(detail=False, methods=["post"], url_path="batch", permission_classes=[IsAdminUser])
+    def batch(self, request):
+        payload = BatchProcessRequestSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        data = payload.validated_data
+
+        # Batch renders are catalogue work: the free queue, dispatched at once rather than by fair share
+        queue, now = settings.AI_ENGINE_FULL_QUEUE, timezone.now()
+        if data.get("track_ids"):
+            params = asdict(ProcessParams.from_request(data, analysis_sr=settings.AI_ENGINE_ANALYSIS_SR or None))
+            tracks = Track.objects.filter(id__in=data["track_ids"])
+            jobs = ProcessingJob.objects.bulk_create([
+                ProcessingJob(
+                    track=track, created_by=request.user, params=params, is_preview=params["preview"],
+                    capture_profile=data["profile"], queue=queue, dispatched_at=now,
+                )
+                for track in tracks
+            ])
+            job_ids = [job.id for job in jobs]
+        else:
+            # Failed jobs and ones still held back by fair share; anything already sent to Celery,
+            # running or done would otherwise be rendered twice
+            requeueable = Q(state=ProcessingJob.State.FAILED) | Q(state=ProcessingJob.State.QUEUED, dispatched_at=None)
+            with transaction.atomic():
+                job_ids = list(ProcessingJob.objects.select_for_update().filter(requeueable, id__in=data["job_ids"])
+                               .order_by("id").values_list("id", flat=True))
+                ProcessingJob.objects.filter(id__in=job_ids).update(
+                    state=ProcessingJob.State.QUEUED, progress=0, finished_at=None, queue=queue, dispatched_at=now
+                )
+
+        size = settings.AI_ENGINE_BATCH_SIZE
+        task_ids = []
+        for start in range(0, len(job_ids), size):
+            chunk = job_ids[start:start + size]
+            task = process_tracks_batch_task.apply_async((chunk, data.get("workers")), queue=queue)
+            ProcessingJob.objects.filter(id__in=chunk).update(celery_task_id=task.id or "")
+            task_ids.append(task.id)
+        skipped = sorted(set(data.get("job_ids") or []) - set(job_ids))
+        return Response({"job_ids": job_ids, "task_ids": task_ids, "skipped_job_ids": skipped},
+                        status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        tags=["AI Jobs"],
+        summary="Queue depth and wait per Celery queue (for sizing workers)",
+        responses=QueueStatsSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"], url_path="queues", permission_classes=[IsAdminUser])
+    def queues(self, request):
+        return Response(QueueStatsSerializer(scheduling.queue_stats(), many=True).data)
@@ -5,6 +5,6 @@ User = get_user_model()
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'role', 'promoter_type', 'is_promoter_approved')
-    list_filter = ('role', 'promoter_type', 'is_promoter_approved')
+    list_display = ('id', 'username', 'email', 'role', 'plan', 'promoter_type', 'is_promoter_approved')
+    list_filter = ('role', 'plan', 'promoter_type', 'is_promoter_approved')
     search_fields = ('username', 'email')
\ No newline at end of file
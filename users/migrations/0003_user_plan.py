@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_avatar_user_bio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='plan',
+            field=models.CharField(choices=[('FREE', 'Free'), ('PAID', 'Paid')], default='FREE', max_length=20),
+        ),
+    ]
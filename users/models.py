@@ -6,6 +6,10 @@ class User(AbstractUser):
         ARTIST = 'ARTIST', 'Artist'
         PROMOTER = 'PROMOTER', 'Promoter'
 
+    class Plan(models.TextChoices):
+        FREE = 'FREE', 'Free'
+        PAID = 'PAID', 'Paid'
+
     class PromoterType(models.TextChoices):
         DJ = 'DJ', 'DJ'
         TAXI = 'TAXI', 'Taxi Driver'
@@ -13,6 +17,7 @@ class User(AbstractUser):
         OTHER = 'OTHER', 'Other'
 
     role = models.CharField(max_length=20, choices=Roles.choices, default=Roles.ARTIST)
+    plan = models.CharField(max_length=20, choices=Plan.choices, default=Plan.FREE)  # paid renders get their own queue
     display_name = models.CharField(max_length=120, blank=True)
     promoter_type = models.CharField(max_length=20, choices=PromoterType.choices, blank=True)
     is_promoter_approved = models.BooleanField(default=False)
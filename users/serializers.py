@@ -13,10 +13,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = (
             "id", "username", "email", "first_name", "last_name",
-            "display_name", "role", "promoter_type", "is_promoter_approved",
+            "display_name", "role", "plan", "promoter_type", "is_promoter_approved",
             "city", "country", "bio", "avatar",
         )
-        read_only_fields = ("username", "role", "is_promoter_approved")
+        read_only_fields = ("username", "role", "plan", "is_promoter_approved")
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):